@@ -16,7 +16,11 @@
 from zope.interface import implements
 from twisted.application import service
 from twisted.internet import defer, task, reactor
-from twisted.python import log
+from twisted.python import log, threadpool, failure
+# time.strptime imports this module lazily, and that import is not
+# thread-safe (Python issue 7980), so import it before any parser runs
+import _strptime
+assert _strptime
 
 from buildbot.interfaces import IChangeSource
 from buildbot import util
@@ -30,6 +34,69 @@ class ChangeSource(service.Service, util.ComparableMixin):
     def describe(self):
         pass
 
+    def submitChanges(self, chdicts):
+        """
+        Add a batch of changes to the master, in order, using
+        L{BuildMaster.addChanges}.  Each element of C{chdicts} is a
+        dictionary of keyword arguments for L{BuildMaster.addChange}.
+
+        @returns: list of L{Change} instances via Deferred
+        """
+        if not chdicts:
+            return defer.succeed([])
+        return self.master.addChanges(chdicts)
+
+class ParserPool(threadpool.ThreadPool):
+    """
+    A small pool of threads, shared by all change sources, in which they can
+    parse the output of their version-control tools and build change
+    dictionaries without blocking the reactor.
+
+    Functions run in the pool must not touch the reactor or the master; they
+    should take the output to be parsed and return their results, which the
+    change source then hands to L{ChangeSource.submitChanges}.  The threads
+    are started on first use, and stopped when the reactor shuts down.
+    """
+
+    def __init__(self, maxthreads=2):
+        threadpool.ThreadPool.__init__(self, minthreads=0,
+                maxthreads=maxthreads, name='ChangeSourceParserPool')
+        self._stop_evt = None
+
+    def _start(self):
+        self.start()
+        self._stop_evt = reactor.addSystemEventTrigger('during', 'shutdown',
+                                                       self._stop)
+
+    def _stop(self):
+        self._stop_evt = None
+        self.stop()
+
+    def deferToPool(self, callable, *args, **kwargs):
+        """
+        Call C{callable} in one of the pool's threads.
+
+        @returns: the result of the call via Deferred
+        """
+        if not self.started:
+            self._start()
+        d = defer.Deferred()
+        def thd():
+            try:
+                rv = callable(*args, **kwargs)
+            except:
+                reactor.callFromThread(d.errback, failure.Failure())
+            else:
+                reactor.callFromThread(d.callback, rv)
+        self.callInThread(thd)
+        return d
+
+parser_pool = ParserPool()
+
+def deferToParser(callable, *args, **kwargs):
+    """Call C{callable} in the shared L{ParserPool}, returning a Deferred"""
+    return parser_pool.deferToPool(callable, *args, **kwargs)
+
 class PollingChangeSource(ChangeSource):
     """
     Utility subclass for ChangeSources that use some kind of periodic polling
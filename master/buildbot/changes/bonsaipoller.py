@@ -17,7 +17,6 @@ import time
 from xml.dom import minidom
 
 from twisted.python import log
-from twisted.internet import defer
 from twisted.web import client
 
 from buildbot.changes import base
@@ -253,26 +252,33 @@ class BonsaiPoller(base.PollingChangeSource):
         # get the page, in XML format
         return client.getPage(url, timeout=self.pollInterval)
 
-    @defer.deferredGenerator
     def _process_changes(self, query):
+        d = base.deferToParser(self._parse_changes, query)
+        def submit(chdicts):
+            if chdicts:
+                self.lastChange = self.lastPoll
+            return self.submitChanges(chdicts)
+        d.addCallback(submit)
+        return d
+
+    def _parse_changes(self, query):
+        # this runs in the change source parser pool
         try:
             bp = BonsaiParser(query)
             result = bp.getData()
         except InvalidResultError, e:
             log.msg("Could not process Bonsai query: " + e.value)
-            return
+            return []
         except EmptyResult:
-            return
+            return []
 
+        chdicts = []
         for cinode in result.nodes:
             files = [file.filename + ' (revision '+file.revision+')'
                      for file in cinode.files]
-            self.lastChange = self.lastPoll
-            w = defer.waitForDeferred(
-                    self.master.addChange(author = cinode.who,
+            chdicts.append(dict(author = cinode.who,
                                files = files,
                                comments = cinode.log,
                                when_timestamp = epoch2datetime(cinode.date),
                                branch = self.branch))
-            yield w
-            w.getResult()
+        return chdicts
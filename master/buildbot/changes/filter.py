@@ -73,6 +73,21 @@ class ChangeFilter(ComparableMixin):
                 return False
         return True
 
+    def getExactMatches(self):
+        """
+        Return a dictionary mapping change attributes (C{project},
+        C{repository}, C{branch} and C{category}) to the list of values which
+        this filter requires that attribute to be among.  A change must match
+        all of these, and may have to pass further checks, too.  This is used
+        to index filters; subclasses which override L{filter_change} have no
+        exact matches.
+        """
+        if self.filter_change.im_func is not ChangeFilter.filter_change.im_func:
+            return {}
+        return dict((chg_attr, filt_list)
+                    for (filt_list, filt_re, filt_fn, chg_attr) in self.checks
+                    if filt_list is not None)
+
     def __repr__(self):
         checks = []
         for (filt_list, filt_re, filt_fn, chg_attr) in self.checks:
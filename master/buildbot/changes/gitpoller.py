@@ -27,7 +27,7 @@ class GitPoller(base.PollingChangeSource):
     """This source will poll a remote git repo for changes and submit
     them to the change master."""
     
-    compare_attrs = ["repourl", "branch", "workdir",
+    compare_attrs = ["repourl", "branch", "branches", "workdir",
                      "pollInterval", "gitbin", "usetimestamps",
                      "category", "project"]
                      
@@ -36,7 +36,7 @@ class GitPoller(base.PollingChangeSource):
                  gitbin='git', usetimestamps=True,
                  category=None, project=None,
                  pollinterval=-2, fetch_refspec=None,
-                 encoding='utf-8'):
+                 encoding='utf-8', branches=None):
         # for backward compatibility; the parameter used to be spelled with 'i'
         if pollinterval != -2:
             pollInterval = pollinterval
@@ -44,6 +44,7 @@ class GitPoller(base.PollingChangeSource):
 
         self.repourl = repourl
         self.branch = branch
+        self.branches = branches
         self.pollInterval = pollInterval
         self.fetch_refspec = fetch_refspec
         self.encoding = encoding
@@ -118,6 +119,15 @@ class GitPoller(base.PollingChangeSource):
             d.addErrback(self._stop_on_failure)
             return d
         d.addCallback(git_fetch_origin)
+
+        if self.branches is not None:
+            # watching several branches needs only the fetched refs, not a
+            # checkout
+            def print_done(_):
+                log.msg("gitpoller: finished initializing working dir from %s"
+                        % self.repourl)
+            d.addCallback(print_done)
+            return d
         
         def set_master(_):
             log.msg('gitpoller: checking out %s' % self.branch)
@@ -152,12 +162,25 @@ class GitPoller(base.PollingChangeSource):
         status = ""
         if not self.master:
             status = "[STOPPED - check log]"
-        str = 'GitPoller watching the remote git repository %s, branch: %s %s' \
-                % (self.repourl, self.branch, status)
+        if self.branches is None:
+            branches = 'branch: %s' % self.branch
+        elif self.branches is True:
+            branches = 'all branches'
+        elif callable(self.branches):
+            branches = 'selected branches'
+        else:
+            branches = 'branches: %s' % ', '.join(self.branches)
+        str = 'GitPoller watching the remote git repository %s, %s %s' \
+                % (self.repourl, branches, status)
         return str
 
     @deferredLocked('initLock')
     def poll(self):
+        if self.branches is not None:
+            d = self._get_changes()
+            d.addCallback(self._process_branch_changes)
+            d.addErrback(self._process_changes_failure)
+            return d
         d = self._get_changes()
         d.addCallback(self._process_changes)
         d.addErrback(self._process_changes_failure)
@@ -255,6 +278,8 @@ class GitPoller(base.PollingChangeSource):
         log.msg('gitpoller: processing %d changes: %s in "%s"'
                 % (self.changeCount, revList, self.workdir) )
 
+        chdicts = []
+        failure = None
         for rev in revList:
             dl = defer.DeferredList([
                 self._get_commit_timestamp(rev),
@@ -271,10 +296,11 @@ class GitPoller(base.PollingChangeSource):
             failures = [ r[1] for r in results if not r[0] ]
             if failures:
                 # just fail on the first error; they're probably all related!
-                raise failures[0]
+                failure = failures[0]
+                break
 
             timestamp, name, files, comments = [ r[1] for r in results ]
-            d = self.master.addChange(
+            chdicts.append(dict(
                    author=name,
                    revision=rev,
                    files=files,
@@ -283,10 +309,142 @@ class GitPoller(base.PollingChangeSource):
                    branch=self.branch,
                    category=self.category,
                    project=self.project,
-                   repository=self.repourl)
+                   repository=self.repourl))
+
+        # add the commits read so far in one batch, even if a later one
+        # could not be read
+        wfd = defer.waitForDeferred(self.submitChanges(chdicts))
+        yield wfd
+        wfd.getResult()
+
+        if failure:
+            raise failure
+
+    def _tracks_branch(self, branch):
+        if self.branches is True:
+            return True
+        if callable(self.branches):
+            return self.branches(branch)
+        return branch in self.branches
+
+    def _get_heads(self):
+        # get the fetched heads, and the heads as of the last poll, which
+        # are kept under refs/buildbot/heads/
+        args = ['for-each-ref', '--format=%(objectname) %(refname)',
+                'refs/remotes/origin', 'refs/buildbot/heads']
+        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir,
+                env=dict(PATH=os.environ['PATH']), errortoo=False )
+        def process(git_output):
+            remote, seen = {}, {}
+            for line in git_output.splitlines():
+                if not line.strip():
+                    continue
+                rev, ref = line.split(None, 1)
+                if ref.startswith('refs/remotes/origin/'):
+                    branch = ref[len('refs/remotes/origin/'):]
+                    if branch != 'HEAD' and self._tracks_branch(branch):
+                        remote[branch] = rev
+                elif ref.startswith('refs/buildbot/heads/'):
+                    seen[ref[len('refs/buildbot/heads/'):]] = rev
+            return remote, seen
+        d.addCallback(process)
+        return d
+
+    def _get_branch_changes(self, branch, rev, exclude):
+        # get every new commit on the branch, oldest first, with one 'git
+        # log'; each commit is a NUL-delimited header followed by its files
+        args = ['log', '--reverse', '--name-only',
+                '--format=%x00%H%n%ct%n%aE%n%s%n%b%x00', rev, '--not']
+        args.extend(exclude)
+        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir,
+                env=dict(PATH=os.environ['PATH']), errortoo=False )
+        d.addCallback(lambda git_output :
+                base.deferToParser(self._parse_branch_log, branch, git_output))
+        return d
+
+    def _parse_branch_log(self, branch, git_output):
+        # this runs in the change source parser pool
+        chdicts = []
+        records = git_output.split('\x00')[1:]
+        for i in range(0, len(records) - 1, 2):
+            rev, timestamp, name, comments = records[i].split('\n', 3)
+            files = [ f for f in records[i+1].splitlines() if f.strip() ]
+            if self.usetimestamps:
+                timestamp = float(timestamp)
+            else:
+                timestamp = None
+            chdicts.append(dict(
+                   author=name.decode(self.encoding),
+                   revision=rev,
+                   files=files,
+                   comments=comments.strip().decode(self.encoding),
+                   when_timestamp=epoch2datetime(timestamp),
+                   branch=branch,
+                   category=self.category,
+                   project=self.project,
+                   repository=self.repourl))
+        return chdicts
+
+    @defer.deferredGenerator
+    def _update_heads(self, updates):
+        for branch, rev in updates:
+            ref = 'refs/buildbot/heads/%s' % branch
+            if rev:
+                args = ['update-ref', ref, rev]
+            else:
+                args = ['update-ref', '-d', ref]
+            d = utils.getProcessOutputAndValue(self.gitbin, args,
+                    path=self.workdir, env=dict(PATH=os.environ['PATH']))
+            d.addCallback(self._convert_nonzero_to_failure)
             wfd = defer.waitForDeferred(d)
             yield wfd
-            results = wfd.getResult()
+            wfd.getResult()
+
+    @defer.deferredGenerator
+    def _process_branch_changes(self, unused_output):
+        wfd = defer.waitForDeferred(self._get_heads())
+        yield wfd
+        remote, seen = wfd.getResult()
+
+        chdicts = []
+        updates = []
+        branches = remote.keys()
+        branches.sort()
+        for branch in branches:
+            rev = remote[branch]
+            if seen.get(branch) == rev:
+                continue
+            updates.append((branch, rev))
+            if not seen:
+                # the first poll just notes where each branch is
+                continue
+            if branch in seen:
+                exclude = [ seen[branch] ]
+            else:
+                # a new branch; report the commits which are not on any
+                # branch we have already seen
+                exclude = seen.values()
+            wfd = defer.waitForDeferred(
+                    self._get_branch_changes(branch, rev, exclude))
+            yield wfd
+            chdicts.extend(wfd.getResult())
+        for branch in seen:
+            if branch not in remote:
+                updates.append((branch, None))
+
+        self.changeCount = len(chdicts)
+        if chdicts:
+            log.msg('gitpoller: processing %d changes on %d branches in "%s"'
+                    % (len(chdicts), len(updates), self.workdir))
+
+        wfd = defer.waitForDeferred(self.submitChanges(chdicts))
+        yield wfd
+        wfd.getResult()
+
+        # only now that the changes are added, remember the new heads
+        wfd = defer.waitForDeferred(self._update_heads(updates))
+        yield wfd
+        wfd.getResult()
 
     def _process_changes_failure(self, f):
         log.msg('gitpoller: repo poll failed')
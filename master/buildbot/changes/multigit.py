@@ -20,7 +20,7 @@ from time import strptime, mktime, time
 from twisted.internet.defer import DeferredList, succeed, Deferred, maybeDeferred, DeferredLock
 from pprint import pprint
 from sys import stdout
-from buildbot.changes.base import PollingChangeSource
+from buildbot.changes.base import PollingChangeSource, deferToParser
 from os.path import join, isdir, isfile, split
 from os import listdir
 from re import match
@@ -177,7 +177,7 @@ def get_metadata(gitd, revision):
         result['message'] = message
         result['files'] = []
         return result
-    deferred.addCallback(decode)
+    deferred.addCallback(lambda outs : deferToParser(decode, outs))
     def file_changes(result):
         subd = git(gitd, 'diff', '--raw', revision+'^1..'+revision)
         subd.addCallback(linesplitdropsplit)
@@ -521,7 +521,7 @@ class MultiGit(PollingChangeSource):
                     self.newTagCallback( tagdata )
                 tagdata.pop('prev', None)
                 if tagdata['files']:
-                    return self.master.addChange(**tagdata)
+                    return self.submitChanges([tagdata])
             subd.addCallback(store_change)
             def again(failure):
                 """tag again on failure"""
@@ -127,7 +127,9 @@ class P4Source(base.PollingChangeSource, util.ComparableMixin):
             changelists.append(num)
         changelists.reverse() # oldest first
 
-        # Retrieve each sequentially.
+        # Retrieve each sequentially, parsing the descriptions in the parser
+        # pool, and then add all of the resulting changes in one batch
+        chdicts = []
         for num in changelists:
             args = []
             if self.p4port:
@@ -141,46 +143,55 @@ class P4Source(base.PollingChangeSource, util.ComparableMixin):
             yield wfd
             result = wfd.getResult()
 
-            lines = result.split('\n')
-            # SF#1555985: Wade Brainerd reports a stray ^M at the end of the date
-            # field. The rstrip() is intended to remove that.
-            lines[0] = lines[0].rstrip()
-            m = self.describe_header_re.match(lines[0])
+            wfd = defer.waitForDeferred(
+                    base.deferToParser(self._parse_describe, num, result))
+            yield wfd
+            chdicts.extend(wfd.getResult())
+
+        wfd = defer.waitForDeferred(self.submitChanges(chdicts))
+        yield wfd
+        wfd.getResult()
+
+        if changelists:
+            self.last_change = changelists[-1]
+
+    def _parse_describe(self, num, result):
+        # this runs in the change source parser pool, turning the output of
+        # 'p4 describe' into a change dictionary for each affected branch
+        lines = result.split('\n')
+        # SF#1555985: Wade Brainerd reports a stray ^M at the end of the date
+        # field. The rstrip() is intended to remove that.
+        lines[0] = lines[0].rstrip()
+        m = self.describe_header_re.match(lines[0])
+        if not m:
+            raise P4PollerError("Unexpected 'p4 describe -s' result: %r" % result)
+        who = m.group('who')
+        when = time.mktime(time.strptime(m.group('when'), self.datefmt))
+        comments = ''
+        while not lines[0].startswith('Affected files'):
+            comments += lines.pop(0) + '\n'
+        lines.pop(0) # affected files
+
+        branch_files = {} # dict for branch mapped to file(s)
+        while lines:
+            line = lines.pop(0).strip()
+            if not line: continue
+            m = self.file_re.match(line)
             if not m:
-                raise P4PollerError("Unexpected 'p4 describe -s' result: %r" % result)
-            who = m.group('who')
-            when = time.mktime(time.strptime(m.group('when'), self.datefmt))
-            comments = ''
-            while not lines[0].startswith('Affected files'):
-                comments += lines.pop(0) + '\n'
-            lines.pop(0) # affected files
-
-            branch_files = {} # dict for branch mapped to file(s)
-            while lines:
-                line = lines.pop(0).strip()
-                if not line: continue
-                m = self.file_re.match(line)
-                if not m:
-                    raise P4PollerError("Invalid file line: %r" % line)
-                path = m.group('path')
-                if path.startswith(self.p4base):
-                    branch, file = self.split_file(path[len(self.p4base):])
-                    if (branch == None and file == None): continue
-                    if branch_files.has_key(branch):
-                        branch_files[branch].append(file)
-                    else:
-                        branch_files[branch] = [file]
-
-            for branch in branch_files:
-                d = self.master.addChange(
-                       author=who,
-                       files=branch_files[branch],
-                       comments=comments,
-                       revision=str(num),
-                       when_timestamp=util.epoch2datetime(when),
-                       branch=branch)
-                wfd = defer.waitForDeferred(d)
-                yield wfd
-                wfd.getResult()
-
-            self.last_change = num
+                raise P4PollerError("Invalid file line: %r" % line)
+            path = m.group('path')
+            if path.startswith(self.p4base):
+                branch, file = self.split_file(path[len(self.p4base):])
+                if (branch == None and file == None): continue
+                if branch_files.has_key(branch):
+                    branch_files[branch].append(file)
+                else:
+                    branch_files[branch] = [file]
+
+        return [ dict(author=who,
+                      files=branch_files[b],
+                      comments=comments,
+                      revision=str(num),
+                      when_timestamp=util.epoch2datetime(when),
+                      branch=b)
+                 for b in branch_files ]
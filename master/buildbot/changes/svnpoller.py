@@ -25,6 +25,7 @@ from buildbot import util
 from buildbot.changes import base
 
 import xml.dom.minidom
+import xml.parsers.expat
 import os, urllib
 
 # these split_file_* functions are available for use as values to the
@@ -44,6 +45,73 @@ def split_file_branches(path):
         return None
 
 
+class LogEntry(object):
+    """
+    One <logentry> from the output of 'svn log --xml --verbose'.
+
+    @ivar revision: the revision number, as an integer
+    @ivar author: the committer, or "<unknown>"
+    @ivar msg: the log message, or "<unknown>"
+    @ivar paths: list of (action, path) tuples, or None if the entry had no
+    <paths> element
+    """
+
+    def __init__(self, revision):
+        self.revision = revision
+        self.author = "<unknown>"
+        self.msg = "<unknown>"
+        self.paths = None
+
+class LogParser(object):
+    """
+    A parser for the output of 'svn log --xml --verbose', which builds
+    L{LogEntry} instances directly rather than a document tree.  Each call to
+    L{feed} returns the entries completed by the data given to it.
+    """
+
+    def __init__(self):
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self._start
+        self.parser.EndElementHandler = self._end
+        self.parser.CharacterDataHandler = self._data
+        self.completed = []
+        self.entry = None
+        self.text = None
+        self.action = None
+
+    def feed(self, data, final=False):
+        self.parser.Parse(data, final)
+        completed, self.completed = self.completed, []
+        return completed
+
+    def _start(self, name, attrs):
+        if name == 'logentry':
+            self.entry = LogEntry(int(attrs.get('revision', 0)))
+        elif self.entry is None:
+            return
+        elif name == 'paths':
+            self.entry.paths = []
+        elif name in ('author', 'msg', 'path'):
+            self.text = []
+            self.action = attrs.get('action')
+
+    def _data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+    def _end(self, name):
+        if self.entry is None:
+            return
+        if name == 'logentry':
+            self.completed.append(self.entry)
+            self.entry = None
+        elif name == 'path' and self.text is not None:
+            self.entry.paths.append((self.action, "".join(self.text)))
+            self.text = None
+        elif name in ('author', 'msg') and self.text is not None:
+            setattr(self.entry, name, "".join(self.text))
+            self.text = None
+
 class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
     """
     Poll a Subversion repository for changes and submit them to the change
@@ -57,6 +125,8 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
 
     parent = None # filled in when we're added
     last_change = None
+    _saved_last_change = None
+    _state_loaded = False
     loop = None
 
     def __init__(self, svnurl, split_file=None,
@@ -145,6 +215,18 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
             log.msg("SVNPoller polling")
 
         d = defer.succeed(None)
+        if not self._state_loaded:
+            # pick up where we left off before a restart; the database takes
+            # precedence over the cachepath file
+            d.addCallback(lambda _ : self._getState('last_change', None))
+            def set_last_change(last_change):
+                self._state_loaded = True
+                if last_change is not None:
+                    log.msg("SVNPoller(%s) setting last_change to %s from "
+                            "the database" % (self.svnurl, last_change))
+                    self.last_change = self._saved_last_change = last_change
+            d.addCallback(set_last_change)
+
         if not self._prefix:
             d.addCallback(lambda _ : self.get_prefix())
             def set_prefix(prefix):
@@ -152,10 +234,10 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
             d.addCallback(set_prefix)
 
         d.addCallback(self.get_logs)
-        d.addCallback(self.parse_logs)
-        d.addCallback(self.get_new_logentries)
-        d.addCallback(self.create_changes)
+        d.addCallback(lambda output :
+                base.deferToParser(self.process_logs, output))
         d.addCallback(self.submit_changes)
+        d.addCallback(self.save_state)
         d.addCallback(self.finished_ok)
         d.addErrback(log.err, 'error in SVNPoller while polling') # eat errors
         return d
@@ -207,62 +289,64 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
             args.extend(["--username=%s" % self.svnuser])
         if self.svnpasswd:
             args.extend(["--password=%s" % self.svnpasswd])
-        args.extend(["--limit=%d" % (self.histmax), self.svnurl])
+        if self.last_change is None:
+            # we only need to know which revision to start from
+            args.extend(["--limit=1"])
+        else:
+            # only ask for revisions we have not seen, oldest first.  The
+            # range starts at last_change itself, since 'svn log' fails if
+            # it starts past HEAD; get_new_logentries drops that entry.
+            args.extend(["--revision=%d:HEAD" % self.last_change,
+                         "--limit=%d" % self.histmax])
+        args.extend([self.svnurl])
         d = self.getProcessOutput(args)
         return d
 
+    def process_logs(self, output):
+        # this runs in the change source parser pool, turning the output of
+        # 'svn log' into a list of change dictionaries
+        logentries = self.parse_logs(output)
+        new_logentries = self.get_new_logentries(logentries)
+        return self.create_changes(new_logentries)
+
     def parse_logs(self, output):
-        # parse the XML output, return a list of <logentry> nodes
+        # parse the XML output into a list of LogEntry instances, one for
+        # each <logentry>
         try:
-            doc = xml.dom.minidom.parseString(output)
+            return LogParser().feed(output, final=True)
         except xml.parsers.expat.ExpatError:
             log.msg("SVNPoller.parse_logs: ExpatError in '%s'" % output)
             raise
-        logentries = doc.getElementsByTagName("logentry")
-        return logentries
-
 
     def get_new_logentries(self, logentries):
         last_change = old_last_change = self.last_change
 
-        # given a list of logentries, calculate new_last_change, and
-        # new_logentries, where new_logentries contains only the ones after
-        # last_change
+        # given an iterable of logentries, in any order, return those after
+        # last_change, oldest first, and advance last_change past them
 
-        new_last_change = None
+        new_last_change = last_change
         new_logentries = []
-        if logentries:
-            new_last_change = int(logentries[0].getAttribute("revision"))
-
-            if last_change is None:
-                # if this is the first time we've been run, ignore any changes
-                # that occurred before now. This prevents a build at every
-                # startup.
-                log.msg('svnPoller: starting at change %s' % new_last_change)
-            elif last_change == new_last_change:
-                # an unmodified repository will hit this case
-                log.msg('svnPoller: no changes')
-            else:
-                for el in logentries:
-                    if last_change == int(el.getAttribute("revision")):
-                        break
-                    new_logentries.append(el)
-                new_logentries.reverse() # return oldest first
+        for entry in logentries:
+            if new_last_change is None or entry.revision > new_last_change:
+                new_last_change = entry.revision
+            if last_change is not None and entry.revision > last_change:
+                new_logentries.append(entry)
+
+        if last_change is None:
+            # if this is the first time we've been run, ignore any changes
+            # that occurred before now. This prevents a build at every
+            # startup.
+            log.msg('svnPoller: starting at change %s' % new_last_change)
+        elif not new_logentries:
+            # an unmodified repository will hit this case
+            log.msg('svnPoller: no changes')
+        new_logentries.sort(key=lambda e : e.revision)
 
         self.last_change = new_last_change
         log.msg('svnPoller: _process_changes %s .. %s' %
                 (old_last_change, new_last_change))
         return new_logentries
 
-
-    def _get_text(self, element, tag_name):
-        try:
-            child_nodes = element.getElementsByTagName(tag_name)[0].childNodes
-            text = "".join([t.data for t in child_nodes])
-        except:
-            text = "<unknown>"
-        return text
-
     def _transform_path(self, path):
         assert path.startswith(self._prefix), \
                 ("filepath '%s' should start with prefix '%s'" %
@@ -277,8 +361,8 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
     def create_changes(self, new_logentries):
         changes = []
 
-        for el in new_logentries:
-            revision = str(el.getAttribute("revision"))
+        for entry in new_logentries:
+            revision = str(entry.revision)
 
             revlink=''
 
@@ -287,23 +371,19 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
                     revlink = self.revlinktmpl % urllib.quote_plus(revision)
 
             log.msg("Adding change revision %s" % (revision,))
-            author   = self._get_text(el, "author")
-            comments = self._get_text(el, "msg")
+            author   = entry.author
+            comments = entry.msg
             # there is a "date" field, but it provides localtime in the
             # repository's timezone, whereas we care about buildmaster's
             # localtime (since this will get used to position the boxes on
             # the Waterfall display, etc). So ignore the date field, and
             # addChange will fill in with the current time
             branches = {}
-            try:
-                pathlist = el.getElementsByTagName("paths")[0]
-            except IndexError: # weird, we got an empty revision
+            if entry.paths is None: # weird, we got an empty revision
                 log.msg("ignoring commit with no paths")
                 continue
 
-            for p in pathlist.getElementsByTagName("path"):
-                action = p.getAttribute("action")
-                path = "".join([t.data for t in p.childNodes])
+            for action, path in entry.paths:
                 # the rest of buildbot is certaily not yet ready to handle
                 # unicode filenames, because they get put in RemoteCommands
                 # which get sent via PB to the buildslave, and PB doesn't
@@ -346,12 +426,21 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
 
         return changes
 
-    @defer.deferredGenerator
     def submit_changes(self, changes):
-        for chdict in changes:
-            wfd = defer.waitForDeferred(self.master.addChange(**chdict))
-            yield wfd
-            wfd.getResult()
+        d = self.submitChanges(changes)
+        d.addCallback(lambda _ : None)
+        return d
+
+    def save_state(self, res):
+        if self.last_change == self._saved_last_change:
+            return res
+        last_change = self.last_change
+        d = self._setState('last_change', last_change)
+        def saved(_):
+            self._saved_last_change = last_change
+            return res
+        d.addCallback(saved)
+        return d
 
     def finished_ok(self, res):
         if self.cachepath:
@@ -361,3 +450,34 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
 
         log.msg("SVNPoller finished polling %s" % res)
         return res
+
+    ## state maintenance (private)
+
+    _objectid = None
+
+    def _getObjectId(self):
+        if self._objectid is None:
+            d = self.master.db.state.getObjectId(self.svnurl,
+                                    'buildbot.changes.svnpoller.SVNPoller')
+            def keep(objectid):
+                self._objectid = objectid
+                return objectid
+            d.addCallback(keep)
+            return d
+        return defer.succeed(self._objectid)
+
+    def _getState(self, name, default=None):
+        "private wrapper around C{self.master.db.state.getState}"
+        d = self._getObjectId()
+        def get(objectid):
+            return self.master.db.state.getState(objectid, name, default)
+        d.addCallback(get)
+        return d
+
+    def _setState(self, name, value):
+        "private wrapper around C{self.master.db.state.setState}"
+        d = self._getObjectId()
+        def set(objectid):
+            return self.master.db.state.setState(objectid, name, value)
+        d.addCallback(set)
+        return d
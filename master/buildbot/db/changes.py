@@ -107,66 +107,100 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
 
         @returns: new change's ID via Deferred
         """
-        assert project is not None, "project must be a string, not None"
-        assert repository is not None, "repository must be a string, not None"
+        d = self.addChanges([ dict(author=author, files=files,
+                comments=comments, is_dir=is_dir, links=links,
+                revision=revision, when_timestamp=when_timestamp,
+                branch=branch, category=category, revlink=revlink,
+                properties=properties, repository=repository,
+                project=project) ], _reactor=_reactor)
+        d.addCallback(lambda changeids : changeids[0])
+        return d
 
-        if when_timestamp is None:
-            when_timestamp = epoch2datetime(_reactor.seconds())
+    def addChanges(self, chdicts, _reactor=reactor):
+        """
+        Add several changes to the database in a single transaction.  Each
+        element of C{chdicts} is a dictionary of keyword arguments for
+        L{addChange}.  The files, links and properties of all of the changes
+        are inserted with one multi-row insert for each table.
 
-        # verify that source is 'Change' for each property
-        for pv in properties.values():
-            assert pv[1] == 'Change', ("properties must be qualified with"
-                                       "source 'Change'")
+        @param _reactor: for testing
+
+        @returns: list of the new changes' IDs, in the same order, via
+        Deferred
+        """
+        rows = [ self._makeChangeRow(_reactor=_reactor, **chdict)
+                 for chdict in chdicts ]
 
         def thd(conn):
             # note that in a read-uncommitted database like SQLite this
             # transaction does not buy atomicitiy - other database users may
             # still come across a change without its links, files, properties,
-            # etc.  That's OK, since we don't announce the change until it's
-            # all in the database, but beware.
+            # etc.  That's OK, since we don't announce the changes until they
+            # are all in the database, but beware.
 
             transaction = conn.begin()
 
             ins = self.db.model.changes.insert()
-            r = conn.execute(ins, dict(
-                author=author,
-                comments=comments,
-                is_dir=is_dir,
-                branch=branch,
-                revision=revision,
-                revlink=revlink,
-                when_timestamp=datetime2epoch(when_timestamp),
-                category=category,
-                repository=repository,
-                project=project))
-            changeid = r.inserted_primary_key[0]
-            if links:
-                ins = self.db.model.change_links.insert()
-                conn.execute(ins, [
-                    dict(changeid=changeid, link=l)
-                        for l in links
-                    ])
-            if files:
-                ins = self.db.model.change_files.insert()
-                conn.execute(ins, [
-                    dict(changeid=changeid, filename=f)
-                        for f in files
-                    ])
-            if properties:
-                ins = self.db.model.change_properties.insert()
-                conn.execute(ins, [
-                    dict(changeid=changeid,
-                        property_name=k,
-                        property_value=json.dumps(v))
-                    for k,v in properties.iteritems()
-                ])
+            changeids = []
+            link_rows = []
+            file_rows = []
+            property_rows = []
+            for row, links, files, properties in rows:
+                r = conn.execute(ins, row)
+                changeid = r.inserted_primary_key[0]
+                changeids.append(changeid)
+                link_rows.extend([ dict(changeid=changeid, link=l)
+                                   for l in links ])
+                file_rows.extend([ dict(changeid=changeid, filename=f)
+                                   for f in files ])
+                property_rows.extend([ dict(changeid=changeid,
+                                            property_name=k,
+                                            property_value=json.dumps(v))
+                                       for k,v in properties.iteritems() ])
+            if link_rows:
+                conn.execute(self.db.model.change_links.insert(), link_rows)
+            if file_rows:
+                conn.execute(self.db.model.change_files.insert(), file_rows)
+            if property_rows:
+                conn.execute(self.db.model.change_properties.insert(),
+                             property_rows)
 
             transaction.commit()
 
-            return changeid
+            return changeids
         d = self.db.pool.do(thd)
         return d
 
+    def _makeChangeRow(self, author=None, files=None, comments=None, is_dir=0,
+            links=None, revision=None, when_timestamp=None, branch=None,
+            category=None, revlink='', properties={}, repository='',
+            project='', _reactor=reactor):
+        # check the arguments to addChange, returning the row for the changes
+        # table along with the change's links, files and properties
+        assert project is not None, "project must be a string, not None"
+        assert repository is not None, "repository must be a string, not None"
+
+        if when_timestamp is None:
+            when_timestamp = epoch2datetime(_reactor.seconds())
+
+        # verify that source is 'Change' for each property
+        for pv in properties.values():
+            assert pv[1] == 'Change', ("properties must be qualified with"
+                                       "source 'Change'")
+
+        row = dict(
+            author=author,
+            comments=comments,
+            is_dir=is_dir,
+            branch=branch,
+            revision=revision,
+            revlink=revlink,
+            when_timestamp=datetime2epoch(when_timestamp),
+            category=category,
+            repository=repository,
+            project=project)
+        return row, links or [], files or [], properties
+
     @base.cached("chdicts")
     def getChange(self, changeid):
         """
@@ -194,6 +228,34 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         d = self.db.pool.do(thd)
         return d
 
+    # the number of changes fetched by each query in getChanges, keeping the
+    # query's IN clause within the limits of every supported database
+    getChangesChunkSize = 100
+
+    def getChanges(self, changeids):
+        """
+        Get several changes by ID at once, using a few queries for each
+        hundred changes rather than several queries for each change.
+
+        @param changeids: the ids of the changes to fetch
+
+        @returns: dictionary mapping changeid to change dictionary, via
+        Deferred; changes which do not exist are omitted
+        """
+        changeids = sorted(set(changeids))
+        def thd(conn):
+            changes_tbl = self.db.model.changes
+            chdicts = {}
+            for i in range(0, len(changeids), self.getChangesChunkSize):
+                chunk = changeids[i:i+self.getChangesChunkSize]
+                q = changes_tbl.select(
+                        whereclause=(changes_tbl.c.changeid.in_(chunk)))
+                rows = conn.execute(q).fetchall()
+                for chdict in self._chdicts_from_change_rows_thd(conn, rows):
+                    chdicts[chdict['changeid']] = chdict
+            return chdicts
+        return self.db.pool.do(thd)
+
     def getRecentChanges(self, count):
         """
         Get a list of the C{count} most recent changes, represented as
@@ -269,6 +331,12 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
     def _chdict_from_change_row_thd(self, conn, ch_row):
         # This method must be run in a db.pool thread, and returns a chdict
         # given a row from the 'changes' table
+        return self._chdicts_from_change_rows_thd(conn, [ ch_row ])[0]
+
+    def _chdicts_from_change_rows_thd(self, conn, ch_rows):
+        # This method must be run in a db.pool thread, and returns a list of
+        # chdicts given rows from the 'changes' table, fetching their
+        # ancillary data with one query per table
         change_links_tbl = self.db.model.change_links
         change_files_tbl = self.db.model.change_files
         change_properties_tbl = self.db.model.change_properties
@@ -277,33 +345,41 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             if epoch:
                 return epoch2datetime(epoch)
 
-        chdict = ChDict(
-                changeid=ch_row.changeid,
-                author=ch_row.author,
-                files=[], # see below
-                comments=ch_row.comments,
-                is_dir=ch_row.is_dir,
-                links=[], # see below
-                revision=ch_row.revision,
-                when_timestamp=mkdt(ch_row.when_timestamp),
-                branch=ch_row.branch,
-                category=ch_row.category,
-                revlink=ch_row.revlink,
-                properties={}, # see below
-                repository=ch_row.repository,
-                project=ch_row.project)
+        chdicts = []
+        by_id = {}
+        for ch_row in ch_rows:
+            chdict = ChDict(
+                    changeid=ch_row.changeid,
+                    author=ch_row.author,
+                    files=[], # see below
+                    comments=ch_row.comments,
+                    is_dir=ch_row.is_dir,
+                    links=[], # see below
+                    revision=ch_row.revision,
+                    when_timestamp=mkdt(ch_row.when_timestamp),
+                    branch=ch_row.branch,
+                    category=ch_row.category,
+                    revlink=ch_row.revlink,
+                    properties={}, # see below
+                    repository=ch_row.repository,
+                    project=ch_row.project)
+            chdicts.append(chdict)
+            by_id[ch_row.changeid] = chdict
+        if not chdicts:
+            return chdicts
+        changeids = by_id.keys()
 
         query = change_links_tbl.select(
-                whereclause=(change_links_tbl.c.changeid == ch_row.changeid))
+                whereclause=(change_links_tbl.c.changeid.in_(changeids)))
         rows = conn.execute(query)
         for r in rows:
-            chdict['links'].append(r.link)
+            by_id[r.changeid]['links'].append(r.link)
 
         query = change_files_tbl.select(
-                whereclause=(change_files_tbl.c.changeid == ch_row.changeid))
+                whereclause=(change_files_tbl.c.changeid.in_(changeids)))
         rows = conn.execute(query)
         for r in rows:
-            chdict['files'].append(r.filename)
+            by_id[r.changeid]['files'].append(r.filename)
 
         # and properties must be given without a source, so strip that, but
         # be flexible in case users have used a development version where the
@@ -318,10 +394,10 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             return v, s
 
         query = change_properties_tbl.select(
-                whereclause=(change_properties_tbl.c.changeid == ch_row.changeid))
+                whereclause=(change_properties_tbl.c.changeid.in_(changeids)))
         rows = conn.execute(query)
         for r in rows:
             v, s = split_vs(json.loads(r.property_value))
-            chdict['properties'][r.property_name] = (v,s)
+            by_id[r.changeid]['properties'][r.property_name] = (v,s)
 
-        return chdict
+        return chdicts
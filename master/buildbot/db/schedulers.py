@@ -98,6 +98,73 @@ class SchedulersConnectorComponent(base.DBConnectorComponent):
             conn.execute(q)
         return self.db.pool.do(thd)
 
+    def classifyChangesForSchedulers(self, classifications):
+        """Record classifications for several schedulers at once, in a
+        single transaction.  CLASSIFICATIONS is a dictionary mapping
+        SCHEDULERID to a dictionary like that given to L{classifyChanges}.
+        Returns a Deferred."""
+        # convert the 'important' values into integers, since that is the
+        # column type
+        rows = [ (schedulerid, changeid, important and 1 or 0)
+                 for schedulerid, cls in classifications.iteritems()
+                 for changeid, important in cls.iteritems() ]
+        def thd(conn):
+            if not rows:
+                return
+            tbl = self.db.model.scheduler_changes
+            transaction = conn.begin()
+            try:
+                # changes may be reclassified, so remove any existing rows
+                # and insert them all again
+                del_q = tbl.delete(
+                        (tbl.c.schedulerid == sa.bindparam('wc_schedulerid'))
+                        & (tbl.c.changeid == sa.bindparam('wc_changeid')))
+                conn.execute(del_q, [ dict(wc_schedulerid=sid,
+                                           wc_changeid=cid)
+                                      for sid, cid, imp in rows ])
+                conn.execute(tbl.insert(), [
+                        dict(schedulerid=sid, changeid=cid, important=imp)
+                        for sid, cid, imp in rows ])
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+        return self.db.pool.do(thd)
+
+    def flushChangeClassificationsForSchedulers(self, flushes):
+        """
+        Flush the scheduler_changes of several schedulers at once, in a
+        single transaction.  C{flushes} is a dictionary mapping schedulerid
+        to the C{less_than} argument of L{flushChangeClassifications}.
+        Returns a Deferred.
+        """
+        def thd(conn):
+            if not flushes:
+                return
+            tbl = self.db.model.scheduler_changes
+            flush_all = [ schedulerid
+                          for schedulerid, less_than in flushes.iteritems()
+                          if less_than is None ]
+            flush_some = [ dict(wc_schedulerid=schedulerid,
+                                wc_less_than=less_than)
+                           for schedulerid, less_than in flushes.iteritems()
+                           if less_than is not None ]
+            transaction = conn.begin()
+            try:
+                if flush_all:
+                    conn.execute(tbl.delete(
+                        whereclause=tbl.c.schedulerid.in_(flush_all)))
+                if flush_some:
+                    conn.execute(tbl.delete(
+                        (tbl.c.schedulerid == sa.bindparam('wc_schedulerid'))
+                        & (tbl.c.changeid < sa.bindparam('wc_less_than'))),
+                        flush_some)
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+        return self.db.pool.do(thd)
+
     class Thunk: pass
     def getChangeClassifications(self, schedulerid, branch=Thunk):
         """
@@ -159,7 +159,8 @@ class IStatus(Interface):
 
     def generateFinishedBuilds(builders=[], branches=[],
                                num_builds=None, finished_before=None,
-                               max_search=200):
+                               max_search=200, results=None,
+                               slavenames=None):
         """Return a generator that will produce IBuildStatus objects each
         time you invoke its .next() method, starting with the most recent
         finished build and working backwards.
@@ -189,6 +190,17 @@ class IStatus(Interface):
                            This argument imposes a hard limit on the number
                            of builds that will be examined within any given
                            Builder.
+
+        @type results: list of ints
+        @param results: if provided, only produce builds whose results are
+                        among these, e.g. C{[FAILURE]}.
+
+        @type slavenames: list of strings
+        @param slavenames: if provided, only produce builds which ran on
+                           one of these buildslaves.
+
+        The builds are filtered using an index of each Builder's finished
+        builds, so builds which do not match are not loaded from disk.
         """
 
     def subscribe(receiver):
@@ -363,8 +375,8 @@ class IBuilderStatus(Interface):
     def generateFinishedBuilds(branches=[],
                                num_builds=None,
                                max_buildnum=None, finished_before=None,
-                               max_search=200,
-                               ):
+                               max_search=200, results=None,
+                               slavenames=None):
         """Return a generator that will produce IBuildStatus objects each
         time you invoke its .next() method, starting with the most recent
         finished build, then the previous build, and so on back to the oldest
@@ -400,6 +412,17 @@ class IBuilderStatus(Interface):
                            especially if there aren't any matching builds.
                            This argument imposes a hard limit on the number
                            of builds that will be examined.
+
+        @type results: list of ints
+        @param results: if provided, only produce builds whose results are
+                        among these, e.g. C{[FAILURE]}.
+
+        @type slavenames: list of strings
+        @param slavenames: if provided, only produce builds which ran on
+                           one of these buildslaves.
+
+        The builds are filtered using an index of each Builder's finished
+        builds, so builds which do not match are not loaded from disk.
         """
 
     def subscribe(receiver):
@@ -775,7 +798,7 @@ class IStatusLog(Interface):
         to remove a receiver which was not previously registered is a no-op.
         """
 
-    def subscribeConsumer(consumer):
+    def subscribeConsumer(consumer, start=0, end=None, channels=[]):
         """Register an L{IStatusLogConsumer} to receive all chunks of the
         logfile, including all the old entries and any that will arrive in
         the future. The consumer will first have their C{registerProducer}
@@ -788,6 +811,11 @@ class IStatusLog(Interface):
         a small amount of data could be written via C{writeChunk} even after
         C{pauseProducing} has been called.
 
+        If C{channels} is given, only chunks on those channels are sent.
+        C{start} and C{end} limit the chunks to that range of the text on
+        those channels; when C{end} is given, the consumer is finished at the
+        end of the range, or at the end of what has been logged so far.
+
         To unsubscribe the consumer, use C{producer.stopProducing}."""
 
     # once the log has finished, the following methods make sense. They can
@@ -870,6 +870,73 @@ class BuildMaster(service.MultiService):
         """
         metrics.MetricCountEvent.log("added_changes", 1)
 
+        d = self.db.changes.addChange(**self._changeArgs(who=who,
+                files=files, comments=comments, author=author, isdir=isdir,
+                is_dir=is_dir, links=links, revision=revision, when=when,
+                when_timestamp=when_timestamp, branch=branch,
+                category=category, revlink=revlink, properties=properties,
+                repository=repository, project=project))
+
+        # convert the changeid to a Change instance
+        d.addCallback(lambda changeid :
+                self.db.changes.getChange(changeid))
+        d.addCallback(lambda chdict :
+                changes.Change.fromChdict(self, chdict))
+
+        def notify(change):
+            msg = u"added change %s to database" % change
+            log.msg(msg.encode('utf-8', 'replace'))
+            # only deliver messages immediately if we're not polling
+            if not self.db_poll_interval:
+                self._change_subs.deliver(change)
+            return change
+        d.addCallback(notify)
+        return d
+
+    def addChanges(self, chdicts):
+        """
+        Add several changes to the buildmaster at once, and act on them.
+
+        Each element of C{chdicts} is a dictionary of keyword arguments for
+        L{addChange}.  The changes are written to the database in a single
+        transaction, and subscribers are notified of all of them together
+        once they have all been added.
+
+        @returns: list of L{Change} instances, in the same order, via Deferred
+        """
+        if not chdicts:
+            return defer.succeed([])
+        metrics.MetricCountEvent.log("added_changes", len(chdicts))
+
+        d = self.db.changes.addChanges([ self._changeArgs(**chdict)
+                                         for chdict in chdicts ])
+
+        # convert the changeids to Change instances
+        def get_changes(changeids):
+            d = self.db.changes.getChanges(changeids)
+            d.addCallback(lambda chdicts_by_id :
+                defer.gatherResults([
+                    changes.Change.fromChdict(self, chdicts_by_id[changeid])
+                    for changeid in changeids ]))
+            return d
+        d.addCallback(get_changes)
+
+        def notify(changelist):
+            log.msg("added %d changes to database" % len(changelist))
+            # only deliver messages immediately if we're not polling
+            if not self.db_poll_interval:
+                for change in changelist:
+                    self._change_subs.deliver(change)
+            return changelist
+        d.addCallback(notify)
+        return d
+
+    def _changeArgs(self, who=None, files=None, comments=None, author=None,
+            isdir=None, is_dir=None, links=None, revision=None, when=None,
+            when_timestamp=None, branch=None, category=None, revlink='',
+            properties={}, repository='', project=''):
+        # translate the arguments to addChange into those for db.changes
+
         # handle translating deprecated names into new names for db.changes
         def handle_deprec(oldname, old, newname, new, default=None,
                           converter = lambda x:x):
@@ -892,31 +959,15 @@ class BuildMaster(service.MultiService):
                                 converter=epoch2datetime)
 
         # add a source to each property
-        for n in properties:
-            properties[n] = (properties[n], 'Change')
+        properties = dict([ (n, (v, 'Change'))
+                            for n, v in properties.iteritems() ])
 
-        d = self.db.changes.addChange(author=author, files=files,
+        return dict(author=author, files=files,
                 comments=comments, is_dir=is_dir, links=links,
                 revision=revision, when_timestamp=when_timestamp,
                 branch=branch, category=category, revlink=revlink,
                 properties=properties, repository=repository, project=project)
 
-        # convert the changeid to a Change instance
-        d.addCallback(lambda changeid :
-                self.db.changes.getChange(changeid))
-        d.addCallback(lambda chdict :
-                changes.Change.fromChdict(self, chdict))
-
-        def notify(change):
-            msg = u"added change %s to database" % change
-            log.msg(msg.encode('utf-8', 'replace'))
-            # only deliver messages immediately if we're not polling
-            if not self.db_poll_interval:
-                self._change_subs.deliver(change)
-            return change
-        d.addCallback(notify)
-        return d
-
     def subscribeToChanges(self, callback):
         """
         Request that C{callback} be called with each Change object added to the
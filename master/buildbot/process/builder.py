@@ -780,10 +780,13 @@ class Builder(pb.Referenceable, service.MultiService):
         if mergeRequests_fn is False:
             mergeRequests_fn = None
         elif mergeRequests_fn is True:
-            mergeRequests_fn = buildrequest.BuildRequest.canBeMergedWith
+            mergeRequests_fn = Builder._defaultMergeRequestFn
 
         return mergeRequests_fn
 
+    def _defaultMergeRequestFn(self, req1, req2):
+        return req1.canBeMergedWith(req2)
+
     @defer.deferredGenerator
     def _mergeRequests(self, breq, unclaimed_requests, mergeRequests_fn):
         """Use C{mergeRequests_fn} to merge C{breq} against
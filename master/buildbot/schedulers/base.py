@@ -15,7 +15,7 @@
 
 from twisted.python import failure, log
 from twisted.application import service
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 from buildbot import util
 from buildbot.process.properties import Properties
 from buildbot.util import ComparableMixin
@@ -37,6 +37,8 @@ class BaseScheduler(service.MultiService, ComparableMixin):
 
     compare_attrs = ('name', 'builderNames', 'properties')
 
+    _reactor = reactor # for tests
+
     def __init__(self, name, builderNames, properties):
         """
         Initialize a Scheduler.
@@ -82,6 +84,11 @@ class BaseScheduler(service.MultiService, ComparableMixin):
         """BuildMaster instance; set just before the scheduler starts, and set
         to None after stopService is complete."""
 
+        self.manager = None
+        """SchedulerManager instance, set and cleared along with
+        C{master}.  This is None for schedulers started outside of a
+        manager, as in tests."""
+
         # internal variables
         self._change_subscription = None
         self._state_lock = defer.DeferredLock()
@@ -93,6 +100,7 @@ class BaseScheduler(service.MultiService, ComparableMixin):
         # this is called by SchedulerManager *before* startService
         self.schedulerid = schedulerid
         self.master = master
+        self.manager = manager
 
     def startService(self):
         service.MultiService.startService(self)
@@ -106,6 +114,7 @@ class BaseScheduler(service.MultiService, ComparableMixin):
         # called by SchedulerManager *after* stopService is complete
         self.schedulerid = None
         self.master = None
+        self.manager = None
 
     ## state management
 
@@ -143,6 +152,46 @@ class BaseScheduler(service.MultiService, ComparableMixin):
             return self.master.db.schedulers.setState(self.schedulerid, state_dict)
         d.addCallback(set_value_and_store)
 
+    ## timers
+
+    def callLater(self, delay, fn, *args, **kwargs):
+        """
+        For use by subclasses; like C{reactor.callLater}, but when running
+        under a SchedulerManager, the call is scheduled on the manager's
+        L{buildbot.util.timerwheel.TimerWheel}, shared by all schedulers.
+        The call may then be up to a second late.  Returns an object with
+        C{cancel} and C{active} methods.
+        """
+        if self.manager:
+            return self.manager.timers.callLater(delay, fn, *args, **kwargs)
+        return self._reactor.callLater(delay, fn, *args, **kwargs)
+
+    ## change classifications
+
+    def classifyChanges(self, classifications):
+        """
+        For use by subclasses; record the importance of changes for this
+        scheduler, as C{db.schedulers.classifyChanges} does.  When running
+        under a SchedulerManager, the write is batched with those of the
+        other schedulers.  Returns a Deferred.
+        """
+        if self.manager:
+            return self.manager.classifyChanges(self.schedulerid,
+                                                classifications)
+        return self.master.db.schedulers.classifyChanges(self.schedulerid,
+                                                         classifications)
+
+    def flushChangeClassifications(self, less_than=None):
+        """
+        For use by subclasses; flush this scheduler's classified changes,
+        batched like L{classifyChanges}.  Returns a Deferred.
+        """
+        if self.manager:
+            return self.manager.flushChangeClassifications(self.schedulerid,
+                                                           less_than)
+        return self.master.db.schedulers.flushChangeClassifications(
+                                        self.schedulerid, less_than=less_than)
+
     ## status queries
 
     # TODO: these aren't compatible with distributed schedulers
@@ -187,8 +236,6 @@ class BaseScheduler(service.MultiService, ComparableMixin):
             if not self._change_subscription:
                 return
 
-            if change_filter and not change_filter.filter_change(change):
-                return
             if fileIsImportant:
                 try:
                     important = fileIsImportant(change)
@@ -209,7 +256,18 @@ class BaseScheduler(service.MultiService, ComparableMixin):
                 self._change_consumption_lock.release()
             d.addBoth(release)
             d.addErrback(log.err, 'while processing change')
-        self._change_subscription = self.master.subscribeToChanges(changeCallback)
+        if self.manager:
+            # the manager runs the change filter, using an index of all of
+            # the schedulers' filters to skip those which cannot match
+            self._change_subscription = self.manager.subscribeToChanges(
+                                            changeCallback, change_filter)
+        else:
+            def filteredChangeCallback(change):
+                if change_filter and not change_filter.filter_change(change):
+                    return
+                changeCallback(change)
+            self._change_subscription = self.master.subscribeToChanges(
+                                            filteredChangeCallback)
 
         return defer.succeed(None)
 
@@ -74,8 +74,7 @@ class BaseBasicScheduler(base.BaseScheduler):
         # configurations
         if not self.treeStableTimer:
             d.addCallback(lambda _ :
-                self.master.db.schedulers.flushChangeClassifications(
-                                                        self.schedulerid))
+                self.flushChangeClassifications())
 
         # otherwise, if there are classified changes out there, start their
         # treeStableTimers again
@@ -122,51 +121,58 @@ class BaseBasicScheduler(base.BaseScheduler):
         # and:
         # - for an important change, start the timer
         # - for an unimportant change, reset the timer if it is running
-        d = self.master.db.schedulers.classifyChanges(
-                self.schedulerid, { change.number : important })
+        d = self.classifyChanges({ change.number : important })
         def fix_timer(_):
             if not important and not self._stable_timers[timer_name]:
                 return
             if self._stable_timers[timer_name]:
                 self._stable_timers[timer_name].cancel()
-            self._stable_timers[timer_name] = self._reactor.callLater(
+            self._stable_timers[timer_name] = self.callLater(
                     self.treeStableTimer, self.stableTimerFired, timer_name)
         d.addCallback(fix_timer)
         return d
 
+    @util.deferredLocked('_stable_timers_lock')
     @defer.deferredGenerator
     def scanExistingClassifiedChanges(self):
-        # call gotChange for each classified change.  This is called at startup
-        # and is intended to re-start the treeStableTimer for any changes that
-        # had not yet been built when the scheduler was stopped.
-
-        # NOTE: this may double-call gotChange for changes that arrive just as
-        # the scheduler starts up.  In practice, this doesn't hurt anything.
+        # re-start the treeStableTimer for any changes that had not yet been
+        # built when the scheduler was stopped.  This is called at startup.
+        # The classified changes are fetched all at once, and since they are
+        # already classified they are not passed to gotChange; instead, each
+        # timer with an important change is started in a single pass.
         wfd = defer.waitForDeferred(
             self.master.db.schedulers.getChangeClassifications(
                                                         self.schedulerid))
         yield wfd
         classifications = wfd.getResult()
+        if not classifications:
+            return
 
-        # call gotChange for each change, after first fetching it from the db
-        for changeid, important in classifications.iteritems():
-            wfd = defer.waitForDeferred(
-                self.master.db.changes.getChange(changeid))
-            yield wfd
-            chdict = wfd.getResult()
+        wfd = defer.waitForDeferred(
+            self.master.db.changes.getChanges(classifications.keys()))
+        yield wfd
+        chdicts = wfd.getResult()
 
-            if not chdict:
-                continue
+        wfd = defer.waitForDeferred(defer.gatherResults([
+            changes.Change.fromChdict(self.master, chdicts[changeid])
+            for changeid in sorted(chdicts) ]))
+        yield wfd
+        changelist = wfd.getResult()
 
-            wfd = defer.waitForDeferred(
-                changes.Change.fromChdict(self.master, chdict))
-            yield wfd
-            change = wfd.getResult()
+        # timer name -> true if any of its changes is important
+        timers = {}
+        for change in changelist:
+            timer_name = self.getTimerNameForChange(change)
+            important = classifications[change.number]
+            timers[timer_name] = timers.get(timer_name, False) or important
 
-            wfd = defer.waitForDeferred(
-                self.gotChange(change, important))
-            yield wfd
-            wfd.getResult()
+        for timer_name, important in timers.iteritems():
+            if not important:
+                continue
+            if self._stable_timers[timer_name]:
+                self._stable_timers[timer_name].cancel()
+            self._stable_timers[timer_name] = self.callLater(
+                    self.treeStableTimer, self.stableTimerFired, timer_name)
 
     def getTimerNameForChange(self, change):
         raise NotImplementedError # see subclasses
@@ -205,8 +211,7 @@ class BaseBasicScheduler(base.BaseScheduler):
 
         max_changeid = changeids[-1] # (changeids are sorted)
         wfd = defer.waitForDeferred(
-                self.master.db.schedulers.flushChangeClassifications(
-                            self.schedulerid, less_than=max_changeid+1))
+                self.flushChangeClassifications(less_than=max_changeid+1))
         yield wfd
         wfd.getResult()
 
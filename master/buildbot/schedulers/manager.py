@@ -15,8 +15,108 @@
 
 from twisted.internet import defer
 from twisted.application import service
-from twisted.python import log
+from twisted.python import log, failure
 from buildbot.util import bbcollections, deferredLocked
+from buildbot.util.eventual import eventually
+from buildbot.util.subscription import Subscription
+from buildbot.util.timerwheel import TimerWheel
+
+class ChangeDispatcher(object):
+    """
+    Deliver changes to the schedulers whose change filters accept them.
+
+    Most change filters only accept changes with particular branches,
+    projects, repositories or categories, so subscriptions are indexed by
+    one of these exact matches, and a change is only checked against the
+    filters of the subscriptions indexed under its own values, along with
+    those which could not be indexed.
+
+    The dispatcher subscribes to the master's changes while it has any
+    subscriptions of its own.
+    """
+
+    # the change attributes used to index subscriptions, in order of
+    # preference
+    indexed_attrs = ('branch', 'project', 'repository', 'category')
+
+    def __init__(self, master):
+        self.master = master
+        self.master_subscription = None
+        self.unindexed = set()
+        # attr -> value -> set of subscriptions
+        self.index = dict((attr, {}) for attr in self.indexed_attrs)
+
+    def __str__(self):
+        return "<ChangeDispatcher>"
+
+    def _getIndexKey(self, change_filter):
+        if not change_filter:
+            return None, None
+        matches = change_filter.getExactMatches()
+        for attr in self.indexed_attrs:
+            if attr in matches:
+                return attr, matches[attr]
+        return None, None
+
+    def subscribe(self, callback, change_filter=None):
+        """Call C{callback} with each change accepted by C{change_filter}
+        (or every change, if it is None); returns a
+        L{buildbot.util.subscription.Subscription}."""
+        sub = Subscription(self, callback)
+        sub.change_filter = change_filter
+        attr, values = self._getIndexKey(change_filter)
+        if attr is None:
+            self.unindexed.add(sub)
+        else:
+            for value in values:
+                self.index[attr].setdefault(value, set()).add(sub)
+        if not self.master_subscription:
+            self.master_subscription = \
+                    self.master.subscribeToChanges(self.deliver)
+        return sub
+
+    def _unsubscribe(self, sub):
+        attr, values = self._getIndexKey(sub.change_filter)
+        if attr is None:
+            self.unindexed.discard(sub)
+        else:
+            for value in values:
+                subs = self.index[attr].get(value)
+                if subs is None:
+                    continue
+                subs.discard(sub)
+                if not subs:
+                    del self.index[attr][value]
+        if not self.hasSubscriptions() and self.master_subscription:
+            self.master_subscription.unsubscribe()
+            self.master_subscription = None
+
+    def hasSubscriptions(self):
+        if self.unindexed:
+            return True
+        for subs in self.index.itervalues():
+            if subs:
+                return True
+        return False
+
+    def getCandidates(self, change):
+        """Return the subscriptions which might accept C{change}"""
+        candidates = set(self.unindexed)
+        for attr, subs in self.index.iteritems():
+            if subs:
+                candidates.update(subs.get(getattr(change, attr, ''), ()))
+        return candidates
+
+    def deliver(self, change):
+        for sub in self.getCandidates(change):
+            try:
+                if sub.change_filter and \
+                        not sub.change_filter.filter_change(change):
+                    continue
+                sub.callback(change)
+            except:
+                log.err(failure.Failure(),
+                        'while delivering change to %s' % (sub.callback,))
 
 class SchedulerManager(service.MultiService):
     def __init__(self, master):
@@ -25,6 +125,82 @@ class SchedulerManager(service.MultiService):
         self.upstream_subscribers = bbcollections.defaultdict(list)
         self._updateLock = defer.DeferredLock()
 
+        # schedulers' subscriptions to new changes
+        self.changeDispatcher = ChangeDispatcher(master)
+
+        # the schedulers' timers, such as tree-stable timers, share a single
+        # reactor timer
+        self.timers = TimerWheel()
+
+        # change classifications and flushes waiting to be written, keyed
+        # by schedulerid, and the Deferreds waiting for them
+        self._pendingClassifications = {}
+        self._pendingFlushes = {}
+        self._classificationWaiters = []
+        self._classificationLock = defer.DeferredLock()
+
+    def subscribeToChanges(self, callback, change_filter=None):
+        """Like the master's C{subscribeToChanges}, but only deliver changes
+        accepted by C{change_filter}, which is checked only for changes that
+        could match it; see L{ChangeDispatcher}."""
+        return self.changeDispatcher.subscribe(callback, change_filter)
+
+    def classifyChanges(self, schedulerid, classifications):
+        """Like C{db.schedulers.classifyChanges}, but the classifications
+        are written along with those of every other scheduler which
+        classifies changes in the same reactor turn - typically all of the
+        schedulers interested in a new change.  Returns a Deferred which
+        fires when they have been written."""
+        pending = self._pendingClassifications.setdefault(schedulerid, {})
+        pending.update(classifications)
+        return self._writeClassificationsSoon()
+
+    def flushChangeClassifications(self, schedulerid, less_than=None):
+        """Like L{classifyChanges}, but batching
+        C{db.schedulers.flushChangeClassifications}.  Flushes are written
+        before classifications."""
+        pending = self._pendingClassifications.get(schedulerid, {})
+        for changeid in pending.keys():
+            if less_than is None or changeid < less_than:
+                del pending[changeid]
+        if schedulerid in self._pendingFlushes:
+            previous = self._pendingFlushes[schedulerid]
+            if previous is None or less_than is None:
+                less_than = None
+            else:
+                less_than = max(previous, less_than)
+        self._pendingFlushes[schedulerid] = less_than
+        return self._writeClassificationsSoon()
+
+    def _writeClassificationsSoon(self):
+        d = defer.Deferred()
+        if not self._classificationWaiters:
+            eventually(self._writeClassifications)
+        self._classificationWaiters.append(d)
+        return d
+
+    @deferredLocked('_classificationLock')
+    def _writeClassifications(self):
+        flushes = self._pendingFlushes
+        classifications = self._pendingClassifications
+        waiters = self._classificationWaiters
+        self._pendingFlushes = {}
+        self._pendingClassifications = {}
+        self._classificationWaiters = []
+
+        db = self.master.db.schedulers
+        d = db.flushChangeClassificationsForSchedulers(flushes)
+        d.addCallback(lambda _ :
+                db.classifyChangesForSchedulers(classifications))
+        def notify(res):
+            for w in waiters:
+                if isinstance(res, failure.Failure):
+                    w.errback(res)
+                else:
+                    w.callback(None)
+        d.addBoth(notify)
+        return d
+
     @deferredLocked('_updateLock')
     def updateSchedulers(self, newschedulers):
         """Add and start any Scheduler that isn't already a child of ours.
@@ -156,8 +156,8 @@ class Timed(base.BaseScheduler):
                 if untilNext == 0:
                     log.msg(("%s: missed scheduled build time, so building "
                              "immediately") % self.name)
-                self.actuateAtTimer = self._reactor.callLater(untilNext,
-                                                              self._actuate)
+                self.actuateAtTimer = self.callLater(untilNext,
+                                                     self._actuate)
         d.addCallback(set_timer)
 
         return d
@@ -264,7 +264,7 @@ class Nightly(Timed):
                                               change_filter=self.change_filter,
                                               onlyImportant=self.onlyImportant)
         else:
-            return self.master.db.schedulers.flushChangeClassifications(self.schedulerid)
+            return self.flushChangeClassifications()
 
     def gotChange(self, change, important):
         # both important and unimportant changes on our branch are recorded, as
@@ -273,8 +273,7 @@ class Nightly(Timed):
         # change filter
         if change.branch != self.branch:
             return defer.succeed(None) # don't care about this change
-        return self.master.db.schedulers.classifyChanges(
-                self.schedulerid, { change.number : important })
+        return self.classifyChanges({ change.number : important })
 
     def getNextBuildTime(self, lastActuated):
         def addTime(timetuple, secs):
@@ -353,8 +352,7 @@ class Nightly(Timed):
 
             max_changeid = changeids[-1] # (changeids are sorted)
             wfd = defer.waitForDeferred(
-                    scheds.flushChangeClassifications(self.schedulerid,
-                                                      less_than=max_changeid+1))
+                    self.flushChangeClassifications(less_than=max_changeid+1))
             yield wfd
             wfd.getResult()
         else:
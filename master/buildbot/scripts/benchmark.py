@@ -0,0 +1,513 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+"""
+Support for C{buildbot benchmark}: run a master configuration against an
+in-memory database and simulated slaves, feed it a stream of changes, and
+report how quickly the changes become running builds.
+"""
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+from twisted.python import log
+from twisted.internet import defer, reactor, task
+from buildbot import util
+from buildbot.util import json
+from buildbot.status.results import SUCCESS
+
+def percentiles(samples, points=(50, 90, 99)):
+    """
+    Summarize a list of samples as a dictionary with keys C{count}, C{max},
+    and C{pNN} for each of C{points}, using the nearest-rank method.  The
+    values are C{None} if there are no samples.
+    """
+    samples = sorted(samples)
+    summary = dict(count=len(samples), max=None)
+    for p in points:
+        summary['p%d' % p] = None
+    if not samples:
+        return summary
+    summary['max'] = samples[-1]
+    for p in points:
+        rank = int(math.ceil(p / 100.0 * len(samples)))
+        summary['p%d' % p] = samples[max(rank, 1) - 1]
+    return summary
+
+def syntheticChanges(count, branches=None):
+    """
+    Generate C{count} change dictionaries, suitable for
+    L{BuildMaster.addChange}, cycling through the given branches.
+    """
+    branches = branches or [ None ]
+    for i in xrange(count):
+        yield dict(author=u'benchmark', files=[ u'file%d.c' % (i % 10) ],
+                   comments=u'synthetic change %d' % i,
+                   revision=unicode(i + 1),
+                   branch=branches[i % len(branches)])
+
+def loadChanges(filename):
+    """
+    Load recorded changes from a JSON file containing a list of objects,
+    each giving the keyword arguments to L{BuildMaster.addChange}.  A
+    C{when} key is taken as a UNIX timestamp.
+    """
+    changes = []
+    for chdict in json.load(open(filename)):
+        kwargs = dict([ (str(k), v) for k, v in chdict.iteritems() ])
+        if 'when' in kwargs:
+            kwargs['when_timestamp'] = util.epoch2datetime(kwargs.pop('when'))
+        changes.append(kwargs)
+    return changes
+
+
+class FakeSlave(object):
+    """
+    Stands in for a L{BuildSlave} during a benchmark, limiting the number of
+    concurrent builds to the real slave's C{max_builds}.
+    """
+
+    def __init__(self, slavename, max_builds=None):
+        self.slavename = slavename
+        self.max_builds = max_builds
+        self.building = 0
+
+    def canStartBuild(self):
+        return not self.max_builds or self.building < self.max_builds
+
+    def releaseLocks(self):
+        pass
+
+
+class FakeSlaveBuilder(object):
+    """
+    Stands in for a L{SlaveBuilder}, so that the builder's own slave and
+    request selection, merging and claiming code runs unmodified.
+    """
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.busy = False
+
+    def isAvailable(self):
+        return not self.busy and self.slave.canStartBuild()
+
+    def isBusy(self):
+        return self.busy
+
+
+class Benchmark(object):
+    """
+    A single benchmark run of a master configuration.
+
+    The configuration is loaded into a L{BuildMaster} with a temporary
+    basedir and an in-memory SQLite database.  Status targets, change
+    sources and the manhole are removed, the slave port is never opened, and
+    the configured slaves are replaced with L{FakeSlave}s: when a builder
+    starts a build, the benchmark marks its build requests complete after
+    C{build_time} seconds instead.  The changes are then fed
+    to C{master.addChange} at C{rate} changes per second (or one after the
+    other, if C{rate} is zero).
+
+    The run ends once all changes have been added, no builds are running,
+    no scheduler timers are due before C{timeout} and nothing has happened
+    for C{settle} seconds -- or after C{timeout} seconds in any case.
+
+    @ivar report: the report produced by L{run}
+    """
+
+    db_url = 'sqlite://'
+
+    # seconds between samples of the reactor's lag
+    lag_interval = 0.1
+
+    def __init__(self, configFileName, changes, rate=10, build_time=0,
+                 settle=2, timeout=3600, _reactor=reactor):
+        self.configFileName = os.path.abspath(configFileName)
+        self.changes = changes
+        self.rate = rate
+        self.build_time = build_time
+        self.settle = settle
+        self.timeout = timeout
+        self._reactor = _reactor
+
+        self.master = None
+        self.basedir = None
+        self.report = None
+
+        # changeid -> time it was submitted
+        self.changeTimes = {}
+        # bsid -> (time, ssid)
+        self.buildsets = {}
+        # brid -> bsid
+        self.requests = {}
+        # brid -> time it was claimed / its build started
+        self.claimTimes = {}
+        self.startTimes = {}
+        # (component, method) -> number of database operations
+        self.dbCalls = {}
+        self.lags = []
+        self.errors = 0
+        self.builds = 0
+
+        self.counting = False
+        self.started = None
+        self.replayed = False
+        self.running = 0
+        self.lastEvent = None
+        self.finished = None
+
+    def now(self):
+        return util.now(self._reactor)
+
+    def touch(self):
+        self.lastEvent = self.now()
+
+    def run(self):
+        """
+        Run the benchmark, returning the report via Deferred.
+        """
+        self.basedir = tempfile.mkdtemp(prefix='benchmark')
+        old_sys_path = sys.path[:]
+        sys.path.append(os.path.dirname(self.configFileName))
+
+        d = self.setUpMaster()
+        def start(_):
+            self.installSlaves()
+            self.instrumentDatabase()
+            self.master.startService()
+            # the builders were added before the master was running, so
+            # they need a nudge to look for work
+            self.master.botmaster.maybeStartBuildsForAllBuilders()
+            return self.replay()
+        d.addCallback(start)
+        d.addCallback(lambda _ : self.makeReport())
+        def keep(report):
+            self.report = report
+        d.addCallback(keep)
+        def tearDown(res):
+            sys.path[:] = old_sys_path
+            d = self.tearDownMaster()
+            d.addCallback(lambda _ : res)
+            return d
+        d.addBoth(tearDown)
+        d.addCallback(lambda _ : self.report)
+        return d
+
+    @defer.deferredGenerator
+    def setUpMaster(self):
+        from buildbot.master import BuildMaster
+        from buildbot.db import connector
+
+        master = self.master = BuildMaster(self.basedir, self.configFileName)
+
+        # load the database first, so that loadConfig leaves it alone
+        master.db = connector.DBConnector(master, self.db_url, self.basedir)
+        master.db.setServiceParent(master)
+        wfd = defer.waitForDeferred(master.db.model.upgrade())
+        yield wfd
+        wfd.getResult()
+        master.subscribeToChanges(master.status.changeAdded)
+
+        wfd = defer.waitForDeferred(
+                master.loadConfig(open(self.configFileName, "r")))
+        yield wfd
+        wfd.getResult()
+        if not master.readConfig:
+            raise RuntimeError("could not load %s; run 'buildbot checkconfig'"
+                               % self.configFileName)
+
+        # deliver changes and build requests immediately, even if the
+        # configuration polls a shared database
+        master.db_poll_interval = None
+
+        # nothing should listen on the network or contact the outside world:
+        # the PB manager (and with it the slave, change source and debug
+        # client registrations) and the slaves are never started
+        master.pbmanager.disownServiceParent()
+        self.max_builds = {}
+        for s in master.botmaster.slaves.values():
+            self.max_builds[s.slavename] = s.max_builds
+            s.disownServiceParent()
+        for d in [ master.loadConfig_Status([]),
+                   master.loadConfig_Sources([]) ]:
+            wfd = defer.waitForDeferred(d)
+            yield wfd
+            wfd.getResult()
+        if master.manhole:
+            master.manhole.disownServiceParent()
+            master.manhole = None
+
+    def installSlaves(self):
+        slaves = {}
+        for bldr in self.master.botmaster.builders.values():
+            bldr.attaching_slaves = []
+            bldr.slaves = []
+            for slavename in bldr.slavenames:
+                if slavename not in slaves:
+                    slaves[slavename] = FakeSlave(slavename,
+                                self.max_builds.get(slavename))
+                bldr.slaves.append(FakeSlaveBuilder(slaves[slavename]))
+            bldr._startBuildFor = (lambda sb, breqs, bldr=bldr :
+                                    self.startBuild(bldr, sb, breqs))
+
+        self.master.subscribeToBuildsets(self.buildsetAdded)
+        self.master.subscribeToBuildRequests(self.buildRequestAdded)
+
+    def instrumentDatabase(self):
+        # count the operations run in the database thread pool, keyed by the
+        # connector component and method which ran them
+        def counted(method):
+            def wrap(callable, *args, **kwargs):
+                if self.counting:
+                    caller = sys._getframe(1)
+                    compname = caller.f_globals.get('__name__', '?')
+                    key = (compname.split('.')[-1], caller.f_code.co_name)
+                    self.dbCalls[key] = self.dbCalls.get(key, 0) + 1
+                return method(callable, *args, **kwargs)
+            return wrap
+        pool = self.master.db.pool
+        pool.do = counted(pool.do)
+        pool.do_with_engine = counted(pool.do_with_engine)
+
+        buildrequests = self.master.db.buildrequests
+        claimBuildRequests = buildrequests.claimBuildRequests
+        def claimed(res, brids):
+            now = self.now()
+            for brid in brids:
+                self.claimTimes[brid] = now
+            self.touch()
+            return res
+        def wrap(brids, *args, **kwargs):
+            d = claimBuildRequests(brids, *args, **kwargs)
+            d.addCallback(claimed, brids)
+            return d
+        buildrequests.claimBuildRequests = wrap
+
+    @defer.deferredGenerator
+    def tearDownMaster(self):
+        if self.master and self.master.running:
+            wfd = defer.waitForDeferred(
+                    defer.maybeDeferred(self.master.stopService))
+            yield wfd
+            wfd.getResult()
+        if self.master and self.master.db:
+            self.master.db.pool.shutdown()
+        shutil.rmtree(self.basedir, ignore_errors=True)
+
+    # event handlers
+
+    def buildsetAdded(self, bsid=None, ssid=None, **kwargs):
+        self.buildsets[bsid] = (self.now(), ssid)
+        self.touch()
+
+    def buildRequestAdded(self, notif):
+        self.requests[notif['brid']] = notif['bsid']
+        self.touch()
+
+    def startBuild(self, bldr, slavebuilder, breqs):
+        # this replaces Builder._startBuildFor; the build "runs" for
+        # build_time seconds and then succeeds
+        now = self.now()
+        for br in breqs:
+            self.startTimes[br.id] = now
+        self.builds += 1
+        slavebuilder.busy = True
+        slavebuilder.slave.building += 1
+        self.running += 1
+        self.touch()
+
+        d = task.deferLater(self._reactor, self.build_time, lambda : None)
+        d.addCallback(lambda _ :
+            self.master.db.buildrequests.completeBuildRequests(
+                [ br.id for br in breqs ], SUCCESS))
+        d.addCallback(lambda _ : bldr._maybeBuildsetsComplete(breqs))
+        def failed(f):
+            # as in a real master, this is logged but does not stop the run;
+            # it is counted in the report
+            self.errors += 1
+            log.msg('while completing a benchmark build: %s' % f)
+        d.addErrback(failed)
+        def done(_):
+            slavebuilder.busy = False
+            slavebuilder.slave.building -= 1
+            self.running -= 1
+            self.touch()
+            self.master.botmaster.maybeStartBuildsForSlave(
+                                        slavebuilder.slave.slavename)
+        d.addCallback(done)
+        return defer.succeed(None)
+
+    # replay
+
+    def replay(self):
+        self.finished = defer.Deferred()
+        self.counting = True
+        self.started = self.now()
+        self.touch()
+
+        monitor = task.LoopingCall(self.tick)
+        monitor.clock = self._reactor
+        self.lastTick = self.now()
+        monitor.start(self.lag_interval, now=False)
+
+        d = self.addChanges()
+        d.addErrback(log.err, 'while adding benchmark changes')
+        def replayed(_):
+            self.replayed = True
+            self.touch()
+        d.addCallback(replayed)
+
+        d = self.finished
+        d.addCallback(lambda _ : monitor.stop())
+        return d
+
+    @defer.deferredGenerator
+    def addChanges(self):
+        dl = []
+        for i, kwargs in enumerate(self.changes):
+            if self.rate:
+                delay = self.started + float(i) / self.rate - self.now()
+                if delay > 0:
+                    wfd = defer.waitForDeferred(
+                        task.deferLater(self._reactor, delay, lambda : None))
+                    yield wfd
+                    wfd.getResult()
+            d = self.addChange(kwargs)
+            if not self.rate:
+                wfd = defer.waitForDeferred(d)
+                yield wfd
+                wfd.getResult()
+            dl.append(d)
+        wfd = defer.waitForDeferred(defer.gatherResults(dl))
+        yield wfd
+        wfd.getResult()
+
+    def addChange(self, kwargs):
+        submitted = self.now()
+        d = self.master.addChange(**kwargs)
+        def added(change):
+            self.changeTimes[change.number] = submitted
+            self.touch()
+        d.addCallback(added)
+        return d
+
+    def tick(self):
+        now = self.now()
+        self.lags.append(max(0, now - self.lastTick - self.lag_interval))
+        self.lastTick = now
+
+        deadline = self.started + self.timeout
+        if now < deadline:
+            if not self.replayed or self.running:
+                return
+            if now - self.lastEvent < self.settle:
+                return
+            timers = self.master.scheduler_manager.timers
+            for t in timers.getDelayedCalls():
+                if t.getTime() <= deadline:
+                    return
+
+        if not self.finished.called:
+            self.finished.callback(None)
+
+    # reporting
+
+    @defer.deferredGenerator
+    def makeReport(self):
+        self.counting = False
+        changeBuildset, buildsetClaim, claimStart, changeStart = [], [], [], []
+
+        # the latency of a buildset is measured from the last change in it
+        triggers = {}
+        for bsid, (when, ssid) in self.buildsets.iteritems():
+            wfd = defer.waitForDeferred(
+                    self.master.db.sourcestamps.getSourceStamp(ssid))
+            yield wfd
+            ssdict = wfd.getResult()
+            times = [ self.changeTimes[changeid]
+                      for changeid in ssdict['changeids']
+                      if changeid in self.changeTimes ]
+            if times:
+                triggers[bsid] = max(times)
+                changeBuildset.append(when - triggers[bsid])
+
+        for brid, bsid in self.requests.iteritems():
+            if brid in self.claimTimes:
+                buildsetClaim.append(self.claimTimes[brid]
+                                     - self.buildsets[bsid][0])
+                if brid in self.startTimes:
+                    claimStart.append(self.startTimes[brid]
+                                      - self.claimTimes[brid])
+            if brid in self.startTimes and bsid in triggers:
+                changeStart.append(self.startTimes[brid] - triggers[bsid])
+
+        db = {}
+        for (compname, method), count in self.dbCalls.iteritems():
+            db.setdefault(compname, {})[method] = count
+
+        yield dict(
+            elapsed=self.now() - self.started,
+            changes=len(self.changeTimes),
+            buildsets=len(self.buildsets),
+            buildrequests=len(self.requests),
+            builds=self.builds,
+            errors=self.errors,
+            latency={
+                'change-buildset' : percentiles(changeBuildset),
+                'buildset-claim' : percentiles(buildsetClaim),
+                'claim-start' : percentiles(claimStart),
+                'change-start' : percentiles(changeStart),
+            },
+            db=db,
+            reactor_lag=percentiles(self.lags))
+
+
+def formatReport(report):
+    """Format a report from L{Benchmark.run} for humans"""
+    def fmt(summary):
+        def ms(v):
+            if v is None:
+                return '-'
+            return '%.1fms' % (v * 1000)
+        return 'n=%-6d p50=%-10s p90=%-10s p99=%-10s max=%s' % (
+                summary['count'], ms(summary['p50']), ms(summary['p90']),
+                ms(summary['p99']), ms(summary['max']))
+
+    lines = []
+    lines.append("%(changes)d changes, %(buildsets)d buildsets, "
+                 "%(buildrequests)d build requests and %(builds)d builds "
+                 "in %(elapsed).1fs" % report)
+    if report['errors']:
+        lines.append("%(errors)d errors while completing builds; "
+                     "see the log (buildbot --verbose)" % report)
+    lines.append("")
+    lines.append("latency:")
+    for stage in ('change-buildset', 'buildset-claim', 'claim-start',
+                  'change-start'):
+        lines.append("  %-16s %s" % (stage, fmt(report['latency'][stage])))
+    lines.append("")
+    lines.append("database operations:")
+    for compname in sorted(report['db']):
+        methods = report['db'][compname]
+        lines.append("  %-16s %d" % (compname, sum(methods.values())))
+        for method in sorted(methods):
+            lines.append("    %-40s %d" % (method, methods[method]))
+    lines.append("")
+    lines.append("reactor lag:")
+    lines.append("  %-16s %s" % ('', fmt(report['reactor_lag'])))
+    return "\n".join(lines)
@@ -1151,6 +1151,82 @@ def doCheckConfig(config):
 
     return d
 
+class BenchmarkOptions(OptionsWithOptionsFile):
+    optFlags = [
+        ['json', None, "Print the report as JSON"],
+    ]
+    optParameters = [
+        ['changes', 'n', '100', "Number of synthetic changes to add"],
+        ['rate', 'r', '10',
+         "Changes to add per second (0 to add them one after another)"],
+        ['branches', 'b', None,
+         "Comma-separated list of branches for the synthetic changes"],
+        ['replay', None, None,
+         "JSON file of changes to add instead of synthetic changes"],
+        ['build-time', None, '0', "Seconds each simulated build takes"],
+        ['settle', None, '2',
+         "End the run after this many seconds without activity"],
+        ['timeout', None, '3600', "Maximum length of the run, in seconds"],
+    ]
+
+    def getSynopsis(self):
+        return "Usage:\t\tbuildbot benchmark [options] [configFile]\n" + \
+         "\t\tIf not specified, 'master.cfg' will be used as 'configFile'"
+
+    def parseArgs(self, *args):
+        if len(args) > 1:
+            raise usage.UsageError("I wasn't expecting so many arguments")
+        if args:
+            self['configFile'] = args[0]
+        else:
+            self['configFile'] = 'master.cfg'
+
+    def postOptions(self):
+        if os.path.isdir(self['configFile']):
+            self['configFile'] = os.path.join(self['configFile'], 'master.cfg')
+        if not re.match('^\d+$', self['changes']):
+            raise usage.UsageError("changes parameter needs to be an int")
+        self['changes'] = int(self['changes'])
+        for name in ('rate', 'build-time', 'settle', 'timeout'):
+            try:
+                self[name] = float(self[name])
+            except ValueError:
+                raise usage.UsageError("%s parameter needs to be a number"
+                                       % name)
+        if self['branches']:
+            self['branches'] = self['branches'].split(',')
+
+
+@in_reactor
+def doBenchmark(config):
+    from buildbot.scripts import benchmark
+    from buildbot.util import json
+    if config['replay']:
+        changes = benchmark.loadChanges(config['replay'])
+    else:
+        changes = list(benchmark.syntheticChanges(config['changes'],
+                                                  config['branches']))
+
+    bm = benchmark.Benchmark(config['configFile'], changes,
+                             rate=config['rate'],
+                             build_time=config['build-time'],
+                             settle=config['settle'],
+                             timeout=config['timeout'])
+    d = bm.run()
+
+    def cb(report):
+        if config['json']:
+            print json.dumps(report, indent=2, sort_keys=True)
+        else:
+            print benchmark.formatReport(report)
+        return True
+    def eb(f):
+        f.printTraceback()
+        return False
+    d.addCallbacks(cb, eb)
+
+    return d
+
 class Options(usage.Options):
     synopsis = "Usage:    buildbot <command> [command options]"
 
@@ -1190,6 +1266,9 @@ class Options(usage.Options):
         ['checkconfig', None, CheckConfigOptions,
          "test the validity of a master.cfg config file"],
 
+        ['benchmark', None, BenchmarkOptions,
+         "measure how a master.cfg handles a stream of changes"],
+
         # TODO: 'watch'
         ]
 
@@ -1262,5 +1341,8 @@ def run():
     elif command == "checkconfig":
         if not doCheckConfig(so):
             sys.exit(1)
+    elif command == "benchmark":
+        if not doBenchmark(so):
+            sys.exit(1)
     sys.exit(0)
 
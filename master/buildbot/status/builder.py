@@ -54,7 +54,7 @@ class BuilderStatus(styles.Versioned):
 
     implements(interfaces.IBuilderStatus, interfaces.IEventSource)
 
-    persistenceVersion = 1
+    persistenceVersion = 2
     persistenceForgets = ( 'wasUpgraded', )
 
     # these limit the amount of memory we consume, as well as the size of the
@@ -62,6 +62,7 @@ class BuilderStatus(styles.Versioned):
     # handled separately.
     buildCacheSize = 15
     eventHorizon = 50 # forget events beyond this
+    finishedIndexSize = 500 # index only this many of the newest builds
 
     # these limit on-disk storage
     logHorizon = 40 # forget logs in steps in builds beyond this
@@ -91,6 +92,10 @@ class BuilderStatus(styles.Versioned):
         self.logCompressionMethod = "bz2"
         self.logMaxSize = None # No default limit
         self.logMaxTailSize = None # No tail buffering
+        # build number -> (finish time, branch, results, slavename) of the
+        # finished builds, for generateFinishedBuilds; None marks a build
+        # which is missing from disk
+        self.finishedIndex = {}
 
     # persistence
 
@@ -140,6 +145,10 @@ class BuilderStatus(styles.Versioned):
             del self.nextBuildNumber # determineNextBuildNumber chooses this
         self.wasUpgraded = True
 
+    def upgradeToVersion2(self):
+        self.finishedIndex = {}
+        self.wasUpgraded = True
+
     def determineNextBuildNumber(self):
         """Scan our directory of saved BuildStatus instances to determine
         what our self.nextBuildNumber should be. Set it one larger than the
@@ -153,6 +162,10 @@ class BuilderStatus(styles.Versioned):
             self.nextBuildNumber = max(existing_builds) + 1
         else:
             self.nextBuildNumber = 0
+        # forget the index if the builds it describes have been removed
+        if self.finishedIndex and \
+                max(self.finishedIndex) >= self.nextBuildNumber:
+            self.finishedIndex = {}
 
     def setLogCompressionLimit(self, lowerLimit):
         self.logCompressionLimit = lowerLimit
@@ -264,6 +277,9 @@ class BuilderStatus(styles.Versioned):
         if earliest_build == 0:
             return
 
+        for num in [ n for n in self.finishedIndex if n < earliest_build ]:
+            del self.finishedIndex[num]
+
         # skim the directory and delete anything that shouldn't be there anymore
         build_re = re.compile(r"^([0-9]+)$")
         build_log_re = re.compile(r"^([0-9]+)-.*$")
@@ -342,32 +358,74 @@ class BuilderStatus(styles.Versioned):
         except IndexError:
             return None
 
-    def generateFinishedBuilds(self, branches=[],
-                               num_builds=None,
-                               max_buildnum=None,
-                               finished_before=None,
-                               max_search=200):
-        got = 0
+    def indexBuild(self, build):
+        """Add a finished build to the index used by
+        L{generateFinishedBuilds}"""
+        self.finishedIndex[build.getNumber()] = (build.getTimes()[1],
+                build.getSourceStamp().branch, build.getResults(),
+                build.getSlavename())
+        if len(self.finishedIndex) > self.finishedIndexSize:
+            earliest = self.nextBuildNumber - self.finishedIndexSize
+            for num in [ n for n in self.finishedIndex if n < earliest ]:
+                del self.finishedIndex[num]
+
+    def generateFinishedBuildNumbers(self, branches=[], max_buildnum=None,
+                                     finished_before=None, max_search=200,
+                                     results=None, slavenames=None):
+        """Generate (finish time, build number) for each of the finished
+        builds matching the given filters, newest first.  The builds are
+        checked against L{finishedIndex}, so a build is loaded only the
+        first time it is examined."""
+        index = self.finishedIndex
         for Nb in itertools.count(1):
             if Nb > self.nextBuildNumber:
                 break
             if Nb > max_search:
                 break
-            build = self.getBuild(-Nb)
-            if build is None:
-                continue
+            number = self.nextBuildNumber - Nb
             if max_buildnum is not None:
-                if build.getNumber() > max_buildnum:
+                if number > max_buildnum:
+                    continue
+            if number not in index:
+                build = self.getBuild(number)
+                if build is None:
+                    index[number] = None
                     continue
-            if not build.isFinished():
+                if not build.isFinished():
+                    continue
+                self.indexBuild(build)
+            entry = index[number]
+            if entry is None:
                 continue
+            finished, branch, build_results, slavename = entry
             if finished_before is not None:
-                start, end = build.getTimes()
-                if end >= finished_before:
+                if finished >= finished_before:
                     continue
             if branches:
-                if build.getSourceStamp().branch not in branches:
+                if branch not in branches:
+                    continue
+            if results is not None:
+                if build_results not in results:
+                    continue
+            if slavenames is not None:
+                if slavename not in slavenames:
                     continue
+            yield finished, number
+
+    def generateFinishedBuilds(self, branches=[],
+                               num_builds=None,
+                               max_buildnum=None,
+                               finished_before=None,
+                               max_search=200,
+                               results=None,
+                               slavenames=None):
+        got = 0
+        for finished, number in self.generateFinishedBuildNumbers(branches,
+                max_buildnum, finished_before, max_search, results,
+                slavenames):
+            build = self.getBuild(number)
+            if build is None:
+                continue
             got += 1
             yield build
             if num_builds is not None:
@@ -530,6 +588,7 @@ class BuilderStatus(styles.Versioned):
         assert s in self.currentBuilds
         s.saveYourself()
         self.currentBuilds.remove(s)
+        self.indexBuild(s)
 
         name = self.getName()
         results = s.getResults()
@@ -79,30 +79,75 @@ class LogFileProducer:
     subscribed = False
     BUFFERSIZE = 2048
 
-    def __init__(self, logfile, consumer):
+    def __init__(self, logfile, consumer, start=0, end=None, channels=[]):
         self.logfile = logfile
         self.consumer = consumer
+        self.start = start
+        self.channels = channels
+        # text still to be skipped before the first chunk, and still to be
+        # sent before the end of the range (None for the whole log)
+        self.skip = start
+        if end is None:
+            self.remaining = None
+        else:
+            self.remaining = max(end - start, 0)
         self.chunkGenerator = self.getChunks()
         consumer.registerProducer(self, True)
 
+    def _trim(self, chunk):
+        # apply the requested range to a chunk, returning None if nothing
+        # is left of it
+        channel, text = chunk
+        if self.channels and channel not in self.channels:
+            return None
+        if self.skip:
+            skipped = min(self.skip, len(text))
+            text = text[skipped:]
+            self.skip -= skipped
+        if self.remaining is not None:
+            text = text[:self.remaining]
+            self.remaining -= len(text)
+        if not text:
+            return None
+        return (channel, text)
+
     def getChunks(self):
         f = self.logfile.getFile()
         offset = 0
+        if self.start:
+            # seek straight to the chunk holding the start of the range
+            offset, self.skip = self.logfile.findTextOffset(self.start,
+                                                            self.channels)
         chunks = []
-        p = LogFileScanner(chunks.append)
+        p = LogFileScanner(chunks.append, self.channels)
         f.seek(offset)
         data = f.read(self.BUFFERSIZE)
         offset = f.tell()
         while data:
             p.dataReceived(data)
             while chunks:
-                c = chunks.pop(0)
-                yield c
+                chunk = self._trim(chunks.pop(0))
+                if chunk:
+                    yield chunk
+                if self.remaining == 0:
+                    self.logfileFinished(self.logfile)
+                    return
             f.seek(offset)
             data = f.read(self.BUFFERSIZE)
             offset = f.tell()
         del f
 
+        if self.remaining is not None:
+            # a range only covers what has been logged so far
+            if self.logfile.runEntries:
+                channel = self.logfile.runEntries[0][0]
+                text = "".join([c[1] for c in self.logfile.runEntries])
+                chunk = self._trim((channel, text))
+                if chunk:
+                    yield chunk
+            self.logfileFinished(self.logfile)
+            return
+
         # now subscribe them to receive new entries
         self.subscribed = True
         self.logfile.watchers.append(self)
@@ -112,7 +157,9 @@ class LogFileProducer:
         if self.logfile.runEntries:
             channel = self.logfile.runEntries[0][0]
             text = "".join([c[1] for c in self.logfile.runEntries])
-            yield (channel, text)
+            chunk = self._trim((channel, text))
+            if chunk:
+                yield chunk
 
         # now we've caught up to the present. Anything further will come from
         # the logfile subscription. We add the callback *after* yielding the
@@ -165,7 +212,9 @@ class LogFileProducer:
 
     def logChunk(self, build, step, logfile, channel, chunk):
         if self.consumer:
-            self.consumer.writeChunk((channel, chunk))
+            c = self._trim((channel, chunk))
+            if c:
+                self.consumer.writeChunk(c)
 
     def logfileFinished(self, logfile):
         self.done()
@@ -206,6 +255,10 @@ class LogFile:
     filename = None # relative to the Builder's basedir
     openfile = None
     compressMethod = "bz2"
+    # (file offset, channel, text length) of each chunk on disk, built on
+    # demand by _updateIndex; _indexed is the file offset indexed so far
+    _index = None
+    _indexed = 0
 
     def __init__(self, parent, name, logfilename):
         """
@@ -351,6 +404,54 @@ class LogFile:
             else:
                 yield leftover
 
+    def _updateIndex(self):
+        # index the chunks written since the last call.  This only reads
+        # the netstring headers, seeking over the text itself.
+        if self._index is None:
+            self._index = []
+            self._indexed = 0
+        f = self.getFile()
+        offset = self._indexed
+        while True:
+            f.seek(offset)
+            header = f.read(16)
+            colon = header.find(':')
+            if colon < 1 or len(header) < colon + 2:
+                break
+            size = int(header[:colon])
+            self._index.append((offset, int(header[colon+1]), size - 1))
+            offset += colon + 1 + size + 1
+        self._indexed = offset
+        del f
+
+    def getTextLength(self, channels=[]):
+        """Return the length of the text logged so far on the given
+        channels (or on all channels)"""
+        self._updateIndex()
+        length = 0
+        for offset, channel, size in self._index:
+            if not channels or channel in channels:
+                length += size
+        for channel, text in self.runEntries:
+            if not channels or channel in channels:
+                length += len(text)
+        return length
+
+    def findTextOffset(self, start, channels=[]):
+        """Find the chunk holding byte C{start} of the text on the given
+        channels (or on all channels).  Returns the file offset at which
+        to start reading, and the amount of text to skip from there."""
+        self._updateIndex()
+        position = 0
+        for offset, channel, size in self._index:
+            if channels and channel not in channels:
+                continue
+            if position + size > start:
+                return offset, start - position
+            position += size
+        # the start is beyond the chunks on disk
+        return self._indexed, start - position
+
     def readlines(self, channel=STDOUT):
         """Return an iterator that produces newline-terminated lines,
         excluding header chunks."""
@@ -375,8 +476,8 @@ class LogFile:
         if receiver in self.watchers:
             self.watchers.remove(receiver)
 
-    def subscribeConsumer(self, consumer):
-        p = LogFileProducer(self, consumer)
+    def subscribeConsumer(self, consumer, start=0, end=None, channels=[]):
+        p = LogFileProducer(self, consumer, start, end, channels)
         p.resumeProducing()
 
     # interface used by the build steps to add things to the log
@@ -533,6 +634,9 @@ class LogFile:
             del d['finished']
         if d.has_key('openfile'):
             del d['openfile']
+        # the chunk index is rebuilt when needed
+        d.pop('_index', None)
+        d.pop('_indexed', None)
         return d
 
     def __setstate__(self, d):
@@ -13,7 +13,7 @@
 #
 # Copyright Buildbot Team Members
 
-import os, urllib
+import os, urllib, heapq
 from cPickle import load
 from twisted.python import log
 from twisted.persisted import styles
@@ -184,7 +184,8 @@ class Status:
 
     def generateFinishedBuilds(self, builders=[], branches=[],
                                num_builds=None, finished_before=None,
-                               max_search=200):
+                               max_search=200, results=None,
+                               slavenames=None):
 
         def want_builder(bn):
             if builders:
@@ -194,48 +195,29 @@ class Status:
                          for bn in self.getBuilderNames()
                          if want_builder(bn)]
 
-        # 'sources' is a list of generators, one for each Builder we're
-        # using. When the generator is exhausted, it is replaced in this list
-        # with None.
-        sources = []
-        for bn in builder_names:
+        # merge the builders' indexes of finished builds, newest first,
+        # using a heap of the next (finish time, build number) from each
+        # builder; only the builds which are produced are loaded
+        heap = []
+        def push(i, bldr, numbers):
+            for finished, number in numbers:
+                heapq.heappush(heap, (-finished, i, number, bldr, numbers))
+                return
+        for i, bn in enumerate(builder_names):
             b = self.getBuilder(bn)
-            g = b.generateFinishedBuilds(branches,
-                                         finished_before=finished_before,
-                                         max_search=max_search)
-            sources.append(g)
-
-        # next_build the next build from each source
-        next_build = [None] * len(sources)
-
-        def refill():
-            for i,g in enumerate(sources):
-                if next_build[i]:
-                    # already filled
-                    continue
-                if not g:
-                    # already exhausted
-                    continue
-                try:
-                    next_build[i] = g.next()
-                except StopIteration:
-                    next_build[i] = None
-                    sources[i] = None
+            push(i, b, b.generateFinishedBuildNumbers(branches,
+                                        finished_before=finished_before,
+                                        max_search=max_search,
+                                        results=results,
+                                        slavenames=slavenames))
 
         got = 0
-        while True:
-            refill()
-            # find the latest build among all the candidates
-            candidates = [(i, b, b.getTimes()[1])
-                          for i,b in enumerate(next_build)
-                          if b is not None]
-            candidates.sort(lambda x,y: cmp(x[2], y[2]))
-            if not candidates:
-                return
-
-            # and remove it from the list
-            i, build, finshed_time = candidates[-1]
-            next_build[i] = None
+        while heap:
+            _, i, number, bldr, numbers = heapq.heappop(heap)
+            push(i, bldr, numbers)
+            build = bldr.getBuild(number)
+            if build is None:
+                continue
             got += 1
             yield build
             if num_builds is not None:
@@ -16,6 +16,7 @@
 
 from collections import deque
 import os
+import struct
 import cPickle as pickle
 
 from zope.interface import implements, Interface
@@ -251,6 +252,352 @@ class DiskQueue(object):
             self.lastItemId = files[-1]
 
 
+class _Segment(object):
+    """One segment file of a SegmentedDiskQueue."""
+
+    def __init__(self, path, id, count=0):
+        self.path = path
+        self.id = id
+        # Number of records in the file.
+        self.count = count
+        # The unpickled records, once the segment reaches the head of the
+        # queue.
+        self.items = None
+
+
+class SegmentedDiskQueue(object):
+    """Keeps a list of abstract items on disk in append-only segment files.
+
+    Items are appended as length-prefixed records to the newest segment file,
+    holding up to segmentSize items, so pushing an item costs one buffered
+    write rather than a new file.  The oldest segment is read in one go when
+    items are first popped from it and deleted once it is consumed; the
+    position in it is kept in a small 'head' file.  Writes are flushed and
+    fsync'ed together every syncInterval operations, and by save(), so a
+    crash may lose the last few items pushed and redeliver the last few
+    popped.
+
+    Item files left by DiskQueue in the same directory are imported, so this
+    can replace it as the secondaryQueue of a PersistentQueue.
+    """
+    implements(IQueue)
+
+    def __init__(self, path, maxItems=None, pickleFn=pickle.dumps,
+                 unpickleFn=pickle.loads, segmentSize=1000, syncInterval=100):
+        """
+        @path: directory to save the segments.
+        @maxItems: maximum number of items to keep on disk, flush the
+        older ones.
+        @pickleFn: function used to pack the items to disk.
+        @unpickleFn: function used to unpack items from disk.
+        @segmentSize: maximum number of items in each segment file.
+        @syncInterval: number of pushes and pops between syncs to disk.
+        """
+        self.path = path
+        self._maxItems = maxItems
+        if self._maxItems is None:
+            self._maxItems = 100000
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+        self.pickleFn = pickleFn
+        self.unpickleFn = unpickleFn
+        self.segmentSize = segmentSize
+        self.syncInterval = syncInterval
+
+        self._segments = deque()
+        # Number of items already popped from the head segment.
+        self._consumed = 0
+        self._nbItems = 0
+        # The open tail segment file, and the segment it belongs to.
+        self._tailFile = None
+        self._tailSegment = None
+        self._unsynced = 0
+        self._loadFromDisk()
+
+    def pushItem(self, item):
+        ret = None
+        if self._nbItems == self._maxItems:
+            ret = self._popItem()
+        self._append(item)
+        self._maybeSync()
+        return ret
+
+    def insertBackChunk(self, chunk):
+        ret = None
+        excess = self._nbItems + len(chunk) - self._maxItems
+        if excess > 0:
+            ret = chunk[0:excess]
+            chunk = chunk[excess:]
+        if not chunk:
+            return ret
+        if self._isLastPopped(chunk):
+            # The usual case: a chunk which could not be sent is put back.
+            # It is still in the head segment, so just step back over it.
+            self._consumed -= len(chunk)
+            self._nbItems += len(chunk)
+        else:
+            # Write the chunk to a new segment in front of the others; the
+            # head file can only describe the first segment, so the consumed
+            # part of the current head segment is compacted away first.  The
+            # head file is pointed at the new segment before anything is
+            # changed, so that a crash part way through can only cause items
+            # to be redelivered: a segment after the one it names is read
+            # from its start.
+            if self._segments:
+                id = self._segments[0].id - 1
+            else:
+                id = 0
+            self._writeHead(id, 0)
+            self._compactHead()
+            segment = _Segment(self._segmentPath(id), id)
+            f = open(segment.path, 'wb')
+            try:
+                for item in chunk:
+                    f.write(self._record(item))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            segment.count = len(chunk)
+            self._segments.appendleft(segment)
+            self._consumed = 0
+            self._nbItems += len(chunk)
+        self._sync()
+        return ret
+
+    def popChunk(self, nbItems=None):
+        if nbItems is None:
+            nbItems = self._maxItems
+        ret = []
+        while len(ret) < nbItems and self._nbItems:
+            ret.append(self._popItem())
+        if ret:
+            self._maybeSync()
+        return ret
+
+    def save(self):
+        self._sync()
+
+    def items(self):
+        self._flushTail()
+        ret = []
+        for i, segment in enumerate(self._segments):
+            items = segment.items
+            if items is None:
+                items = [ self.unpickleFn(r)
+                          for r in self._readRecords(segment.path)[0] ]
+            if i == 0:
+                items = items[self._consumed:]
+            ret.extend(items)
+        return ret
+
+    def nbItems(self):
+        return self._nbItems
+
+    def maxItems(self):
+        return self._maxItems
+
+    #### Protected functions
+
+    def _segmentPath(self, id):
+        return os.path.join(self.path, '%d.seg' % id)
+
+    def _record(self, item):
+        data = self.pickleFn(item)
+        return struct.pack('>I', len(data)) + data
+
+    def _readRecords(self, path):
+        """Returns the records in a segment file, and the length of the file
+        up to the end of the last complete record."""
+        buf = ReadFile(path)
+        records = []
+        pos = 0
+        while pos + 4 <= len(buf):
+            length, = struct.unpack('>I', buf[pos:pos + 4])
+            if pos + 4 + length > len(buf):
+                # A write torn by a crash.
+                break
+            records.append(buf[pos + 4:pos + 4 + length])
+            pos += 4 + length
+        return records, pos
+
+    def _append(self, item):
+        tail = None
+        if self._segments:
+            tail = self._segments[-1]
+        if tail is None or tail.count >= self.segmentSize:
+            if tail is None:
+                id = 0
+            else:
+                id = tail.id + 1
+            tail = _Segment(self._segmentPath(id), id)
+            self._segments.append(tail)
+        if self._tailSegment is not tail:
+            self._closeTail()
+            self._tailFile = open(tail.path, 'ab')
+            self._tailSegment = tail
+        self._tailFile.write(self._record(item))
+        tail.count += 1
+        if tail.items is not None:
+            tail.items.append(item)
+        self._nbItems += 1
+
+    def _popItem(self):
+        head = self._segments[0]
+        if head.items is None:
+            if head is self._tailSegment:
+                self._flushTail()
+            head.items = [ self.unpickleFn(r)
+                           for r in self._readRecords(head.path)[0] ]
+        item = head.items[self._consumed]
+        self._consumed += 1
+        self._nbItems -= 1
+        if self._consumed == head.count:
+            self._removeHead()
+        return item
+
+    def _removeHead(self):
+        head = self._segments.popleft()
+        if head is self._tailSegment:
+            self._closeTail()
+        os.remove(head.path)
+        self._consumed = 0
+        if not self._segments:
+            # Nothing is left, so there is no position to record.
+            self._sync()
+
+    def _isLastPopped(self, chunk):
+        """Returns True if chunk is exactly the items last popped from the
+        head segment."""
+        if not self._segments or len(chunk) > self._consumed:
+            return False
+        items = self._segments[0].items
+        start = self._consumed - len(chunk)
+        for i in range(len(chunk)):
+            if items[start + i] is not chunk[i]:
+                return False
+        return True
+
+    def _compactHead(self):
+        """Rewrites the head segment without its consumed records."""
+        if not self._consumed:
+            return
+        head = self._segments[0]
+        if head is self._tailSegment:
+            self._closeTail()
+        records = self._readRecords(head.path)[0][self._consumed:]
+        tmp = head.path + '.tmp'
+        f = open(tmp, 'wb')
+        try:
+            for r in records:
+                f.write(struct.pack('>I', len(r)) + r)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(tmp, head.path)
+        if head.items is not None:
+            head.items = head.items[self._consumed:]
+        head.count = len(records)
+        self._consumed = 0
+
+    def _flushTail(self):
+        if self._tailFile:
+            self._tailFile.flush()
+
+    def _closeTail(self):
+        if self._tailFile:
+            self._tailFile.flush()
+            os.fsync(self._tailFile.fileno())
+            self._tailFile.close()
+        self._tailFile = None
+        self._tailSegment = None
+
+    def _maybeSync(self):
+        self._unsynced += 1
+        if self._unsynced >= self.syncInterval:
+            self._sync()
+
+    def _sync(self):
+        """Flushes the appended items to disk and records the position in
+        the head segment."""
+        self._unsynced = 0
+        if self._tailFile:
+            self._tailFile.flush()
+            os.fsync(self._tailFile.fileno())
+        if not self._segments:
+            headPath = os.path.join(self.path, 'head')
+            if os.path.exists(headPath):
+                os.remove(headPath)
+            return
+        self._writeHead(self._segments[0].id, self._consumed)
+
+    def _writeHead(self, id, consumed):
+        """Records that the first consumed items of segment id were popped,
+        and that the segments before it are gone."""
+        headPath = os.path.join(self.path, 'head')
+        tmp = headPath + '.tmp'
+        WriteFile(tmp, '%d %d' % (id, consumed))
+        os.rename(tmp, headPath)
+
+    def _loadFromDisk(self):
+        """Finds the segments, and imports any items left by DiskQueue."""
+        def SafeInt(item):
+            try:
+                return int(item)
+            except ValueError:
+                return None
+
+        headId, consumed = None, 0
+        headPath = os.path.join(self.path, 'head')
+        if os.path.exists(headPath):
+            try:
+                headId, consumed = map(int, ReadFile(headPath).split())
+            except ValueError:
+                headId, consumed = None, 0
+
+        names = os.listdir(self.path)
+        ids = filter(lambda x: x is not None,
+                     [SafeInt(x[:-4]) for x in names if x.endswith('.seg')])
+        ids.sort()
+        for id in ids:
+            path = self._segmentPath(id)
+            if headId is not None and id < headId:
+                # Already consumed; the head file was written but the
+                # segment was not removed yet.
+                os.remove(path)
+                continue
+            records, length = self._readRecords(path)
+            if not records:
+                os.remove(path)
+                continue
+            if length < os.path.getsize(path):
+                f = open(path, 'r+b')
+                try:
+                    f.truncate(length)
+                finally:
+                    f.close()
+            self._segments.append(_Segment(path, id, len(records)))
+            self._nbItems += len(records)
+
+        if self._segments and self._segments[0].id == headId:
+            self._consumed = min(consumed, self._segments[0].count)
+            self._nbItems -= self._consumed
+            if self._consumed == self._segments[0].count:
+                self._removeHead()
+
+        # Import the one-file-per-item queue of DiskQueue.
+        legacy = filter(lambda x: x is not None, [SafeInt(x) for x in names])
+        legacy.sort()
+        for id in legacy:
+            path = os.path.join(self.path, str(id))
+            self._append(self.unpickleFn(ReadFile(path)))
+        if legacy:
+            self._sync()
+            for id in legacy:
+                os.remove(os.path.join(self.path, str(id)))
+
+
 class PersistentQueue(object):
     """Keeps a list of abstract items and serializes it to the disk.
 
@@ -327,6 +674,7 @@ class PersistentQueue(object):
 
     def save(self):
         self.secondaryQueue.insertBackChunk(self.primaryQueue.popChunk())
+        self.secondaryQueue.save()
 
     def items(self):
         return self.primaryQueue.items() + self.secondaryQueue.items()
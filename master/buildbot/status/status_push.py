@@ -31,8 +31,8 @@ except ImportError:
     import json
 
 from buildbot.status.base import StatusReceiverMultiService
-from buildbot.status.persistent_queue import DiskQueue, IndexedQueue, \
-        MemoryQueue, PersistentQueue
+from buildbot.status.persistent_queue import IndexedQueue, MemoryQueue, \
+        PersistentQueue, SegmentedDiskQueue
 from buildbot.status.web.status_json import FilterOut
 from twisted.internet import defer, reactor
 from twisted.python import log
@@ -351,7 +351,8 @@ class HttpStatusPush(StatusPush):
                     urlparse.urlparse(self.serverUrl)[1].split(':')[0])
             queue = PersistentQueue(
                         primaryQueue=MemoryQueue(maxItems=maxMemoryItems),
-                        secondaryQueue=DiskQueue(path, maxItems=maxDiskItems))
+                        secondaryQueue=SegmentedDiskQueue(
+                            path, maxItems=maxDiskItems))
         else:
             path = None
             queue = MemoryQueue(maxItems=maxMemoryItems)
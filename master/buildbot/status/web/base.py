@@ -244,6 +244,12 @@ class HtmlResource(resource.Resource, ContextMixin):
     contentType = "text/html; charset=utf-8"
     pageTitle = "Buildbot"
     addSlash = False # adapted from Nevow
+    # if true, rendered pages are shared between requests with the same path
+    # and arguments until the status changes; see PageCache
+    pageCacheable = False
+    # extra response headers, set whether or not the page came from the cache
+    # (content() is not called for cached pages, so must not set them itself)
+    pageHeaders = {}
 
     def getChild(self, path, request):
         if self.addSlash and path == "" and len(request.postpath) == 0:
@@ -304,11 +310,18 @@ class HtmlResource(resource.Resource, ContextMixin):
 
         ctx = self.getContext(request)
 
-        d = defer.maybeDeferred(lambda : self.content(request, ctx))
+        if self.pageCacheable:
+            cache = request.site.buildbot_service.pageCache
+            d = cache.get(cache.getKey(request),
+                          lambda : self.content(request, ctx))
+        else:
+            d = defer.maybeDeferred(lambda : self.content(request, ctx))
         def handle(data):
             if isinstance(data, unicode):
                 data = data.encode("utf-8")
             request.setHeader("content-type", self.contentType)
+            for name, value in self.pageHeaders.items():
+                request.setHeader(name, value)
             if request.method == "HEAD":
                 request.setHeader("content-length", len(data))
                 return ''
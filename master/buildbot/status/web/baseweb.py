@@ -27,21 +27,25 @@ from buildbot.interfaces import IStatusReceiver
 
 from buildbot.status.web.base import StaticFile, createJinjaEnv
 from buildbot.status.web.feeds import Rss20StatusResource, \
-     Atom10StatusResource
-from buildbot.status.web.waterfall import WaterfallStatusResource
-from buildbot.status.web.console import ConsoleStatusResource
+     Atom10StatusResource, FeedIndex
+from buildbot.status.web.waterfall import WaterfallStatusResource, \
+     BuildTimeline
+from buildbot.status.web.console import ConsoleStatusResource, ConsoleIndex
 from buildbot.status.web.olpb import OneLinePerBuild
-from buildbot.status.web.grid import GridStatusResource, TransposedGridStatusResource
+from buildbot.status.web.grid import GridStatusResource, \
+     TransposedGridStatusResource, GridIndex
 from buildbot.status.web.changes import ChangesResource
 from buildbot.status.web.builder import BuildersResource
 from buildbot.status.web.buildstatus import BuildStatusStatusResource
 from buildbot.status.web.slaves import BuildSlavesResource
-from buildbot.status.web.status_json import JsonStatusResource
+from buildbot.status.web.status_json import JsonStatusResource, \
+     JsonCache, StatusEventHub
 from buildbot.status.web.about import AboutBuildbot
 from buildbot.status.web.authz import Authz
 from buildbot.status.web.auth import AuthFailResource
 from buildbot.status.web.root import RootPage
 from buildbot.status.web.change_hook import ChangeHookResource
+from buildbot.status.web.pagecache import PageCache
 
 # this class contains the WebStatus class.  Basic utilities are in base.py,
 # and specific pages are each in their own module.
@@ -322,6 +326,18 @@ class WebStatus(service.MultiService):
         self.templates = createJinjaEnv(revlink, changecommentlink,
                                         repositories, projects)
 
+        # rendered pages and JSON responses shared between requests, the
+        # waterfall's, console's, grids' and feeds' indexes of builds, and the
+        # events for /json/events; these subscribe to the status while we are
+        # running
+        self.pageCache = PageCache()
+        self.jsonCache = JsonCache()
+        self.timeline = BuildTimeline()
+        self.consoleIndex = ConsoleIndex()
+        self.gridIndex = GridIndex()
+        self.feedIndex = FeedIndex()
+        self.statusEvents = StatusEventHub()
+
         # keep track of cached connections so we can break them when we shut
         # down. See ticket #102 for more details.
         self.channels = weakref.WeakKeyDictionary()
@@ -368,13 +384,14 @@ class WebStatus(service.MultiService):
                 (self.http_port, self.distrib_port, hex(id(self))))
 
     def setServiceParent(self, parent):
-        service.MultiService.setServiceParent(self, parent)
-
         # this class keeps a *separate* link to the buildmaster, rather than
         # just using self.parent, so that when we are "disowned" (and thus
         # parent=None), any remaining HTTP clients of this WebStatus will still
-        # be able to get reasonable results.
+        # be able to get reasonable results.  It is set first, since
+        # startService needs it.
         self.master = parent
+
+        service.MultiService.setServiceParent(self, parent)
         
         def either(a,b): # a if a else b for py2.4
             if a:
@@ -463,7 +480,40 @@ class WebStatus(service.MultiService):
     def registerChannel(self, channel):
         self.channels[channel] = 1 # weakrefs
 
+    def getConsoleIndexFilename(self):
+        return os.path.join(self.master.basedir, "console.index")
+
+    def getFeedIndexFilename(self):
+        return os.path.join(self.master.basedir, "feeds.index")
+
+    def startService(self):
+        service.MultiService.startService(self)
+        self.consoleIndex.load(self.getConsoleIndexFilename())
+        self.feedIndex.load(self.getFeedIndexFilename())
+        self.getStatus().subscribe(self.pageCache)
+        self.getStatus().subscribe(self.jsonCache)
+        self.getStatus().subscribe(self.timeline)
+        self.getStatus().subscribe(self.consoleIndex)
+        self.getStatus().subscribe(self.gridIndex)
+        self.getStatus().subscribe(self.feedIndex)
+        self.getStatus().subscribe(self.statusEvents)
+        # the saved index is stale if the master did not stop cleanly; the
+        # backfill skips the builds it already has
+        self.feedIndex.backfill(self.getStatus())
+
     def stopService(self):
+        self.getStatus().unsubscribe(self.pageCache)
+        self.getStatus().unsubscribe(self.jsonCache)
+        self.getStatus().unsubscribe(self.timeline)
+        self.getStatus().unsubscribe(self.consoleIndex)
+        self.getStatus().unsubscribe(self.gridIndex)
+        self.getStatus().unsubscribe(self.feedIndex)
+        self.getStatus().unsubscribe(self.statusEvents)
+        self.feedIndex.stopBackfilling()
+        self.consoleIndex.save(self.getConsoleIndexFilename())
+        self.feedIndex.save(self.getFeedIndexFilename())
+        self.pageCache.invalidate()
+        self.jsonCache.entries.clear()
         for channel in self.channels:
             try:
                 channel.transport.loseConnection()
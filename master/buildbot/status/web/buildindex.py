@@ -0,0 +1,114 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+import cPickle
+from twisted.python import log, runtime
+from buildbot.status.base import StatusReceiver
+
+class BuildIndex(StatusReceiver):
+    """
+    A summary of each of the builders' recent builds, for status pages that
+    would otherwise load many builds for every request.  Subclasses say what
+    is kept for a build by implementing L{summarize}.
+
+    A build is summarized when it finishes.  Builds which are not in the
+    index yet are loaded from the builder's history the first time they are
+    needed; running builds are summarized afresh each time.  At most
+    C{max_builds} builds are kept for each builder.
+    """
+
+    def __init__(self, max_builds=500):
+        self.max_builds = max_builds
+        # builderName -> { build number : summary }
+        self.builders = {}
+        # builders checked against their history since the index was loaded
+        self.checked = set()
+
+    def summarize(self, builderName, build):
+        """Return the summary of a build.  It must have C{getNumber} and
+        C{isFinished} methods."""
+        raise NotImplementedError
+
+    def _add(self, builderName, summary):
+        builds = self.builders.setdefault(builderName, {})
+        builds[summary.getNumber()] = summary
+        if len(builds) > self.max_builds:
+            del builds[min(builds)]
+
+    def getBuilds(self, builderName, builder):
+        """Generate summaries of the builder's builds, newest first"""
+        builds = self.builders.setdefault(builderName, {})
+        top = builder.nextBuildNumber - 1
+        if builderName not in self.checked:
+            self.checked.add(builderName)
+            # a builder whose history was removed starts numbering again
+            if builds and max(builds) > top:
+                builds.clear()
+
+        running = dict((b.getNumber(), b) for b in builder.getCurrentBuilds())
+        number = top
+        while number >= 0:
+            if number in builds:
+                yield builds[number]
+            elif number in running:
+                yield self.summarize(builderName, running[number])
+            else:
+                build = builder.getBuild(number)
+                if build is None:
+                    # HACK: Work around #601, the head build may be None if
+                    # it is locked.
+                    if number == top:
+                        number -= 1
+                        continue
+                    break
+                summary = self.summarize(builderName, build)
+                if summary.isFinished():
+                    self._add(builderName, summary)
+                yield summary
+            number -= 1
+
+    def save(self, filename):
+        tmpfilename = filename + ".tmp"
+        try:
+            cPickle.dump(self.builders, open(tmpfilename, "wb"), -1)
+            if runtime.platformType  == 'win32':
+                # windows cannot rename a file on top of an existing one
+                if os.path.exists(filename):
+                    os.unlink(filename)
+            os.rename(tmpfilename, filename)
+        except:
+            log.msg("unable to save build index %s" % filename)
+            log.err()
+
+    def load(self, filename):
+        if not os.path.exists(filename):
+            return
+        try:
+            self.builders = cPickle.load(open(filename, "rb"))
+        except:
+            log.msg("unable to load build index %s; rebuilding it"
+                    % filename)
+            log.err()
+            self.builders = {}
+        self.checked.clear()
+
+    # IStatusReceiver
+
+    def builderAdded(self, builderName, builder):
+        return self # subscribe to this builder
+
+    def buildFinished(self, builderName, build, results):
+        self._add(builderName, self.summarize(builderName, build))
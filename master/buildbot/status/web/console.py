@@ -21,6 +21,7 @@ from twisted.internet import defer
 from buildbot import util
 from buildbot.status import builder
 from buildbot.status.web.base import HtmlResource
+from buildbot.status.web.buildindex import BuildIndex
 from buildbot.changes import changes
 
 class DoesNotPassFilter(Exception): pass # Used for filtering revs
@@ -85,7 +86,114 @@ class DevBuild:
         self.eta = build.getETA()
         self.details = details
         self.when = build.getTimes()[0]
-        self.source = build.getSourceStamp()
+
+
+class ChangeSummary(object):
+    """The parts of a change that the revision comparators look at"""
+    __slots__ = ('revision', 'when')
+
+    def __init__(self, revision, when):
+        self.revision = revision
+        self.when = when
+
+    def __getstate__(self):
+        return (self.revision, self.when)
+
+    def __setstate__(self, state):
+        self.revision, self.when = state
+
+
+class BuildSummary(object):
+    """What the console needs to know about a build.  It has the same
+    accessors as a build status, so it can stand in for one, but keeps none
+    of the build itself."""
+
+    def __init__(self, builderName, build):
+        self.number = build.getNumber()
+        self.results = build.getResults()
+        self.finished = build.isFinished()
+        self.text = build.getText()
+        self.eta = build.getETA()
+        self.times = build.getTimes()
+        self.properties = {}
+        for name in ('got_revision', 'revision'):
+            try:
+                self.properties[name] = build.getProperty(name)
+            except KeyError:
+                pass
+        self.changes = [ ChangeSummary(c.revision, c.when)
+                         for c in build.getChanges() ]
+        self.failures = self._getFailures(builderName, build)
+
+    def _getFailures(self, builderName, build):
+        # the failing step and its logs, with the logs' paths relative to
+        # the console page
+        details = {}
+        if not build.getLogs():
+            return details
+
+        for step in build.getSteps():
+            (result, reason) = step.getResults()
+            if result == builder.FAILURE:
+                name = step.getName()
+
+                # Remove html tags from the error text.
+                stripHtml = re.compile(r'<.*?>')
+                strippedDetails = stripHtml.sub('', ' '.join(step.getText()))
+
+                details['buildername'] = builderName
+                details['status'] = strippedDetails
+                details['reason'] = reason
+                logs = details['logs'] = []
+
+                if step.getLogs():
+                    for log in step.getLogs():
+                        logname = log.getName()
+                        path = ("../builders/%s/builds/%s/steps/%s/logs/%s" %
+                                (urllib.quote(builderName),
+                                 build.getNumber(),
+                                 urllib.quote(name),
+                                 urllib.quote(logname)))
+                        logs.append(dict(path=path, name=logname))
+        return details
+
+    def getNumber(self):
+        return self.number
+
+    def getResults(self):
+        return self.results
+
+    def isFinished(self):
+        return self.finished
+
+    def getText(self):
+        return self.text
+
+    def getETA(self):
+        return self.eta
+
+    def getTimes(self):
+        return self.times
+
+    def getProperty(self, propname):
+        return self.properties[propname]
+
+    def getChanges(self):
+        return self.changes
+
+
+class ConsoleIndex(BuildIndex):
+    """
+    Summaries of the builds shown on the console, so that the console can be
+    rendered without loading the builds themselves.  The index can be saved
+    to a file, so that it survives a restart.
+    """
+
+    def __init__(self, max_builds=500):
+        BuildIndex.__init__(self, max_builds)
+
+    def summarize(self, builderName, build):
+        return BuildSummary(builderName, build)
 
 
 class ConsoleStatusResource(HtmlResource):
@@ -93,6 +201,9 @@ class ConsoleStatusResource(HtmlResource):
     Every change is a line in the page, and it shows the result of the first
     build with this change for each slave."""
 
+    pageCacheable = True
+    pageHeaders = {'Cache-Control' : 'no-cache'}
+
     def __init__(self, orderByTime=False):
         HtmlResource.__init__(self)
 
@@ -195,34 +306,11 @@ class ConsoleStatusResource(HtmlResource):
 
     def getBuildDetails(self, request, builderName, build):
         """Returns an HTML list of failures for a given build."""
-        details = {}
-        if not build.getLogs():
-            return details
-        
-        for step in build.getSteps():
-            (result, reason) = step.getResults()
-            if result == builder.FAILURE:
-                name = step.getName()
-
-                # Remove html tags from the error text.
-                stripHtml = re.compile(r'<.*?>')
-                strippedDetails = stripHtml.sub('', ' '.join(step.getText()))
-                
-                details['buildername'] = builderName
-                details['status'] = strippedDetails
-                details['reason'] = reason
-                logs = details['logs'] = []
-
-                if step.getLogs():
-                    for log in step.getLogs():
-                        logname = log.getName()
-                        logurl = request.childLink(
-                          "../builders/%s/builds/%s/steps/%s/logs/%s" % 
-                            (urllib.quote(builderName),
-                             build.getNumber(),
-                             urllib.quote(name),
-                             urllib.quote(logname)))
-                        logs.append(dict(url=logurl, name=logname))
+        details = build.failures.copy()
+        if 'logs' in details:
+            details['logs'] = [ dict(url=request.childLink(l['path']),
+                                     name=l['name'])
+                                for l in details['logs'] ]
         return details
 
     def getBuildsForRevision(self, request, builder, builderName, lastRevision,
@@ -234,10 +322,12 @@ class ConsoleStatusResource(HtmlResource):
 
         revision = lastRevision 
 
+        index = request.site.buildbot_service.consoleIndex
         builds = []
-        build = self.getHeadBuild(builder)
         number = 0
-        while build and number < numBuilds:
+        for build in index.getBuilds(builderName, builder):
+            if number >= numBuilds:
+                break
             debugInfo["builds_scanned"] += 1
             number += 1
 
@@ -276,8 +366,6 @@ class ConsoleStatusResource(HtmlResource):
                     devBuild, current_revision):
                     break
 
-            build = build.getPreviousBuild()
-
         return builds
 
     def getChangeForBuild(self, build, revision):
@@ -377,7 +465,7 @@ class ConsoleStatusResource(HtmlResource):
             
         return cs
 
-    def displaySlaveLine(self, status, builderList, debugInfo):
+    def displaySlaveLine(self, status, builderList, debugInfo, index):
         """Display a line the shows the current status for all the builders we
         care about."""
 
@@ -410,9 +498,12 @@ class ConsoleStatusResource(HtmlResource):
                 else:
                     # If not offline, then display the result of the last
                     # finished build.
-                    build = self.getHeadBuild(status.getBuilder(builder))
-                    while build and not build.isFinished():
-                        build = build.getPreviousBuild()
+                    build = None
+                    for summary in index.getBuilds(builder,
+                                                   status.getBuilder(builder)):
+                        if summary.isFinished():
+                            build = summary
+                            break
 
                     if build:
                         s["color"] = getResultsClass(build.getResults(), None,
@@ -553,7 +644,8 @@ class ConsoleStatusResource(HtmlResource):
 
         if builderList:
             subs["categories"] = self.displayCategories(builderList, debugInfo)
-            subs['slaves'] = self.displaySlaveLine(status, builderList, debugInfo)
+            subs['slaves'] = self.displaySlaveLine(status, builderList,
+                    debugInfo, request.site.buildbot_service.consoleIndex)
         else:
             subs["categories"] = []
 
@@ -606,8 +698,6 @@ class ConsoleStatusResource(HtmlResource):
             except ValueError:
                 pass
 
-        request.setHeader('Cache-Control', 'no-cache')
-
         # Sets the default reload time to 60 seconds.
         if not reload_time:
             reload_time = 60
@@ -39,10 +39,13 @@
 # buildbot/status/web/baseweb.py.
 
 import os
-import re
 import time
+import urllib
 from twisted.web import resource
+from twisted.internet import task
+from twisted.python import log
 from buildbot.status.builder import FAILURE
+from buildbot.status.web.buildindex import BuildIndex
 
 class XmlResource(resource.Resource):
     contentType = "text/xml; charset=UTF-8"
@@ -69,6 +72,164 @@ def rfc822_time(tstamp):
     res = res % (tstamp.tm_wday, tstamp.tm_mon)
     return res
 
+class FeedEntry(object):
+    """What a feed says about a finished build, including the ends of the
+    logs of its failed steps"""
+
+    # how many lines of each failed step's log are kept
+    log_lines = 30
+
+    def __init__(self, builderName, build):
+        self.builderName = builderName
+        self.number = build.getNumber()
+        self.times = build.getTimes()
+        self.results = build.getResults()
+        self.responsibleUsers = build.getResponsibleUsers()
+
+        # title: trunk r22191 (plus patch) failed on
+        # 'i686-debian-sarge1 shared gcc-3.3.5'
+        ss = build.getSourceStamp()
+        source = ""
+        if ss.branch:
+            source += "Branch %s " % ss.branch
+        if ss.revision:
+            source += "Revision %s " % str(ss.revision)
+        if ss.patch:
+            source += " (plus patch)"
+        if (ss.branch is None and ss.revision is None and ss.patch is None
+            and not ss.changes):
+            source += "Latest revision "
+        got_revision = None
+        try:
+            got_revision = build.getProperty("got_revision")
+        except KeyError:
+            pass
+        if got_revision:
+            got_revision = str(got_revision)
+            if len(got_revision) > 40:
+                got_revision = "[revision string too long]"
+            source += "(Got Revision: %s)" % got_revision
+        failflag = (self.results != FAILURE)
+        self.pageTitle = ('%s %s on "%s"' %
+                          (source, ["failed","succeeded"][failflag],
+                           builderName))
+
+        # Add information about the failing steps.
+        self.failedSteps = []
+        self.logLines = []
+        for s in build.getSteps():
+            if s.getResults()[0] == FAILURE:
+                self.failedSteps.append(s.getName())
+
+                # Add the last lines of each log.
+                for steplog in s.getLogs():
+                    self.logLines.append('Last lines of build log "%s":' %
+                                         steplog.getName())
+                    self.logLines.append([])
+                    try:
+                        logdata = steplog.getText()
+                    except IOError:
+                        # Probably the log file has been removed
+                        logdata ='** log file not available **'
+                    for line in logdata.split('\n')[-self.log_lines:]:
+                        self.logLines.append(unicode(line, 'utf-8',
+                                                     'replace'))
+
+    def getNumber(self):
+        return self.number
+
+    def isFinished(self):
+        return True
+
+    def getTimes(self):
+        return self.times
+
+    def getResults(self):
+        return self.results
+
+class FeedIndex(BuildIndex):
+    """
+    The entries of the feeds, kept up to date as builds finish so that a
+    feed can be rendered without loading any builds or logs.  For each
+    builder, the newest C{max_builds} builds are kept, along with the newest
+    C{max_builds} failures for C{failures_only} feeds.
+
+    The index is saved when the master stops.  At startup, L{backfill} adds
+    any recent builds it is missing from the builders' histories, a build at
+    a time, in the background; these are all of them when there is no saved
+    index, or those which finished after the last save if the master did not
+    stop cleanly.
+    """
+
+    def __init__(self, max_builds=25):
+        BuildIndex.__init__(self, max_builds)
+        self.backfilling = False
+
+    def summarize(self, builderName, build):
+        return FeedEntry(builderName, build)
+
+    def _add(self, builderName, summary):
+        builds = self.builders.setdefault(builderName, {})
+        builds[summary.getNumber()] = summary
+        if len(builds) > self.max_builds:
+            numbers = sorted(builds, reverse=True)
+            failures = [ n for n in numbers
+                         if builds[n].getResults() == FAILURE ]
+            keep = set(numbers[:self.max_builds])
+            keep.update(failures[:self.max_builds])
+            for n in numbers:
+                if n not in keep:
+                    del builds[n]
+
+    def getEntries(self, builderName, failures_only=False):
+        """Return the indexed builds of a builder, newest first"""
+        builds = self.builders.get(builderName, {})
+        entries = [ builds[n] for n in sorted(builds, reverse=True) ]
+        if failures_only:
+            entries = [ e for e in entries if e.getResults() == FAILURE ]
+        return entries[:self.max_builds]
+
+    def backfill(self, status, max_depth=200):
+        """Index the recent builds of each builder, looking at no more than
+        C{max_depth} builds of each.  Returns a Deferred which fires when
+        done."""
+        self.backfilling = True
+        def walk():
+            for builderName in status.getBuilderNames():
+                builder = status.getBuilder(builderName)
+                builds = self.builders.setdefault(builderName, {})
+                top = builder.nextBuildNumber - 1
+                if builds and max(builds) > top:
+                    builds.clear()
+                number = top
+                failures = 0
+                while number >= 0 and number > top - max_depth:
+                    if not self.backfilling:
+                        return
+                    if len(builds) >= self.max_builds and \
+                            failures >= self.max_builds:
+                        break
+                    if number not in builds:
+                        build = builder.getBuild(number)
+                        if build is not None and build.isFinished():
+                            self._add(builderName,
+                                      self.summarize(builderName, build))
+                    entry = builds.get(number)
+                    if entry is not None and entry.getResults() == FAILURE:
+                        failures += 1
+                    number -= 1
+                    yield None
+        d = task.coiterate(walk())
+        def done(res):
+            self.backfilling = False
+            return res
+        d.addBoth(done)
+        d.addErrback(log.err, "while backfilling the feed index")
+        return d
+
+    def stopBackfilling(self):
+        self.backfilling = False
+
 class FeedResource(XmlResource):
     pageTitle = None
     link = 'http://dummylink'
@@ -96,7 +257,7 @@ class FeedResource(XmlResource):
         return fallback
 
     def getBuilds(self, request):
-        builds = []
+        """Return the L{FeedEntry}s to show, newest first"""
         # THIS is lifted straight from the WaterfallStatusResource Class in
         # status/web/waterfall.py
         #
@@ -122,49 +283,21 @@ class FeedResource(XmlResource):
         if showCategories:
             builders = [b for b in builders if b.category in showCategories]
 
-        failures_only = request.args.get("failures_only", "false")
+        failures_only = request.args.get("failures_only", ["false"])[0]
+        failures_only = failures_only != "false"
 
         maxFeeds = 25
 
-        # Copy all failed builds in a new list.
-        # This could clearly be implemented much better if we had
-        # access to a global list of builds.
+        # the builds come from the feed index, which is kept up to date as
+        # builds finish, so no builds or logs are loaded here
+        index = request.site.buildbot_service.feedIndex
+        builds = []
         for b in builders:
-            lastbuild = b.getLastFinishedBuild()
-            if lastbuild is None:
-                continue
-
-            lastnr = lastbuild.getNumber()
-
-            totalbuilds = 0
-            i = lastnr
-            while i >= 0:
-                build = b.getBuild(i)
-                i -= 1
-                if not build:
-                    continue
-
-                results = build.getResults()
-
-                if failures_only == "false" or results == FAILURE:
-                    totalbuilds += 1
-                    builds.append(build)
-
-                # stop for this builder when our total nr. of feeds is reached
-                if totalbuilds >= maxFeeds:
-                    break
+            builds.extend(index.getEntries(b.name, failures_only)[:maxFeeds])
 
         # Sort build list by date, youngest first.
-        # To keep compatibility with python < 2.4, use this for sorting instead:
-        # We apply Decorate-Sort-Undecorate
-        deco = [(build.getTimes(), build) for build in builds]
-        deco.sort()
-        deco.reverse()
-        builds = [build for (b1, build) in deco]
-
-        if builds:
-            builds = builds[:min(len(builds), maxFeeds)]
-        return builds
+        builds.sort(key=lambda e : e.getTimes(), reverse=True)
+        return builds[:maxFeeds]
 
     def content(self, request):
         builds = self.getBuilds(request)
@@ -174,72 +307,20 @@ class FeedResource(XmlResource):
         for build in builds:
             start, finished = build.getTimes()
             finishedTime = time.gmtime(int(finished))
-            link = re.sub(r'index.html', "", self.status.getURLForThing(build))
-
-            # title: trunk r22191 (plus patch) failed on
-            # 'i686-debian-sarge1 shared gcc-3.3.5'
-            ss = build.getSourceStamp()
-            source = ""
-            if ss.branch:
-                source += "Branch %s " % ss.branch
-            if ss.revision:
-                source += "Revision %s " % str(ss.revision)
-            if ss.patch:
-                source += " (plus patch)"
-            if ss.changes:
-                pass
-            if (ss.branch is None and ss.revision is None and ss.patch is None
-                and not ss.changes):
-                source += "Latest revision "
-            got_revision = None
-            try:
-                got_revision = build.getProperty("got_revision")
-            except KeyError:
-                pass
-            if got_revision:
-                got_revision = str(got_revision)
-                if len(got_revision) > 40:
-                    got_revision = "[revision string too long]"
-                source += "(Got Revision: %s)" % got_revision
-            failflag = (build.getResults() != FAILURE)
-            pageTitle = ('%s %s on "%s"' %
-                     (source, ["failed","succeeded"][failflag],
-                      build.getBuilder().getName()))
-
-            # Add information about the failing steps.
-            failed_steps = []
-            log_lines = []
-            for s in build.getSteps():
-                if s.getResults()[0] == FAILURE:
-                    failed_steps.append(s.getName())
-
-                    # Add the last 30 lines of each log.
-                    for log in s.getLogs():
-                        log_lines.append('Last lines of build log "%s":' %
-                                         log.getName())
-                        log_lines.append([])
-                        try:
-                            logdata = log.getText()
-                        except IOError:
-                            # Probably the log file has been removed
-                            logdata ='** log file not available **'
-                        unilist = list()
-                        for line in logdata.split('\n')[-30:]:
-                            unilist.append(unicode(line,'utf-8'))
-                        log_lines.extend(unilist)
-
+            link = '%sbuilders/%s/builds/%d' % (self.link,
+                    urllib.quote(build.builderName, safe=''), build.number)
             bc = {}
             bc['date'] = rfc822_time(finishedTime)
             bc['summary_link'] = ('%sbuilders/%s' %
                                   (self.link,
-                                   build.getBuilder().getName()))            
-            bc['name'] = build.getBuilder().getName()
-            bc['number'] = build.getNumber()
-            bc['responsible_users'] = build.getResponsibleUsers()
-            bc['failed_steps'] = failed_steps
-            bc['pageTitle'] = pageTitle
+                                   build.builderName))
+            bc['name'] = build.builderName
+            bc['number'] = build.number
+            bc['responsible_users'] = build.responsibleUsers
+            bc['failed_steps'] = build.failedSteps
+            bc['pageTitle'] = build.pageTitle
             bc['link'] = link
-            bc['log_lines'] = log_lines
+            bc['log_lines'] = build.logLines
 
             if finishedTime is not None:
                 bc['rfc822_pubdate'] = rfc822_time(finishedTime)
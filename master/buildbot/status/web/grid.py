@@ -16,10 +16,45 @@
 from twisted.internet import defer
 from buildbot.status.web.base import HtmlResource
 from buildbot.status.web.base import build_get_class, path_to_builder, path_to_build
+from buildbot.status.web.buildindex import BuildIndex
 from buildbot.sourcestamp import SourceStamp
 
 class ANYBRANCH: pass # a flag value, used below
 
+class GridEntry(object):
+    """What the grid shows of a build"""
+
+    def __init__(self, build):
+        self.builder = build.getBuilder()
+        self.number = build.getNumber()
+        self.start = build.getTimes()[0]
+        self.ss = build.getSourceStamp(absolute=True)
+        self.finished = build.isFinished()
+        self.text = build.getText()
+        self.cssClass = build_get_class(build)
+
+    def getBuilder(self):
+        return self.builder
+
+    def getNumber(self):
+        return self.number
+
+    def isFinished(self):
+        return self.finished
+
+    def getText(self):
+        return self.text
+
+class GridIndex(BuildIndex):
+    """The builds shown on the grids, with their source stamps, so that the
+    grids can be rendered without loading the builds themselves"""
+
+    def __init__(self, max_builds=200):
+        BuildIndex.__init__(self, max_builds)
+
+    def summarize(self, builderName, build):
+        return GridEntry(build)
+
 class GridStatusMixin(object):
     def getPageTitle(self, request):
         status = self.getStatus(request)
@@ -58,7 +93,7 @@ class GridStatusMixin(object):
         cxt['name'] = name
         cxt['url'] = path_to_build(request, build)
         cxt['text'] = text
-        cxt['class'] = build_get_class(build)
+        cxt['class'] = build.cssClass
         return cxt
 
     @defer.deferredGenerator
@@ -98,50 +133,50 @@ class GridStatusMixin(object):
         """
         return (ss.branch, ss.revision, ss.patch)
 
-    def getRecentBuilds(self, builder, numBuilds, branch):
+    def getRecentBuilds(self, request, builder, numBuilds, branch):
         """
-        get a list of most recent builds on given builder
+        get a list of L{GridEntry}s for the most recent builds on given
+        builder
         """
-        build = builder.getBuild(-1)
+        index = request.site.buildbot_service.gridIndex
         num = 0
-        while build and num < numBuilds:
-            start = build.getTimes()[0]
-            ss = build.getSourceStamp(absolute=True)
-
-            okay_build = True
+        for entry in index.getBuilds(builder.getName(), builder):
+            if num >= numBuilds:
+                break
 
             # skip un-started builds
-            if not start:
-                okay_build = False
+            if not entry.start:
+                continue
 
             # skip non-matching branches
-            if branch != ANYBRANCH and ss.branch != branch:
-                okay_build = False
-
-            if okay_build:
-                num += 1
-                yield build
+            if branch != ANYBRANCH and entry.ss.branch != branch:
+                continue
 
-            build = build.getPreviousBuild()
-        return
+            num += 1
+            yield entry
 
-    def getRecentSourcestamps(self, status, numBuilds, categories, branch):
+    def getGrid(self, request, status, numBuilds, categories, branch):
         """
-        get a list of the most recent NUMBUILDS SourceStamp tuples, sorted
-        by the earliest start we've seen for them
+        get a list of the most recent NUMBUILDS SourceStamps, sorted by the
+        earliest start we've seen for them, and a dictionary giving for each
+        builder shown a list of its most recent build (a L{GridEntry}) of
+        each of those stamps, or None
         """
-        # TODO: use baseweb's getLastNBuilds?
-        sourcestamps = { } # { ss-tuple : earliest time }
+        sourcestamps = { } # { ss-tuple : (ss, earliest time) }
+        latest = { } # { builderName : { ss-tuple : latest build } }
         for bn in status.getBuilderNames():
             builder = status.getBuilder(bn)
             if categories and builder.category not in categories:
                 continue
-            for build in self.getRecentBuilds(builder, numBuilds, branch):
-                ss = build.getSourceStamp(absolute=True)
-                key= self.getSourceStampKey(ss)
-                start = build.getTimes()[0]
-                if key not in sourcestamps or sourcestamps[key][1] > start:
-                    sourcestamps[key] = (ss, start)
+            builds = latest[bn] = {}
+            for entry in self.getRecentBuilds(request, builder, numBuilds,
+                                              branch):
+                key = self.getSourceStampKey(entry.ss)
+                # builds come newest first
+                if key not in builds:
+                    builds[key] = entry
+                if key not in sourcestamps or sourcestamps[key][1] > entry.start:
+                    sourcestamps[key] = (entry.ss, entry.start)
 
         # now sort those and take the NUMBUILDS most recent
         sourcestamps = sourcestamps.values()
@@ -149,12 +184,18 @@ class GridStatusMixin(object):
         sourcestamps = map(lambda tup : tup[0], sourcestamps)
         sourcestamps = sourcestamps[-numBuilds:]
 
-        return sourcestamps
+        keys = map(self.getSourceStampKey, sourcestamps)
+        cells = {}
+        for bn, builds in latest.iteritems():
+            cells[bn] = [ builds.get(k) for k in keys ]
+
+        return sourcestamps, cells
 
 class GridStatusResource(HtmlResource, GridStatusMixin):
     # TODO: docs
     status = None
     changemaster = None
+    pageCacheable = True
 
     @defer.deferredGenerator
     def content(self, request, cxt):
@@ -170,7 +211,8 @@ class GridStatusResource(HtmlResource, GridStatusMixin):
 
         # and the data we want to render
         status = self.getStatus(request)
-        stamps = self.getRecentSourcestamps(status, numBuilds, categories, branch)
+        stamps, cells = self.getGrid(request, status, numBuilds, categories,
+                                     branch)
 
         cxt['refresh'] = self.get_reload_time(request)
 
@@ -186,18 +228,9 @@ class GridStatusResource(HtmlResource, GridStatusMixin):
         cxt['builders'] = []
 
         for bn in sortedBuilderNames:
-            builds = [None] * len(stamps)
-
-            builder = status.getBuilder(bn)
-            if categories and builder.category not in categories:
+            if bn not in cells:
                 continue
-
-            for build in self.getRecentBuilds(builder, numBuilds, branch):
-                ss = build.getSourceStamp(absolute=True)
-                key= self.getSourceStampKey(ss)
-                for i in range(len(stamps)):
-                    if key == self.getSourceStampKey(stamps[i]) and builds[i] is None:
-                        builds[i] = build
+            builder = status.getBuilder(bn)
 
             wfd = defer.waitForDeferred(
                     self.builder_cxt(request, builder))
@@ -205,7 +238,7 @@ class GridStatusResource(HtmlResource, GridStatusMixin):
             b = wfd.getResult()
 
             b['builds'] = []
-            for build in builds:
+            for build in cells[bn]:
                 b['builds'].append(self.build_cxt(request, build))
             cxt['builders'].append(b)
 
@@ -217,6 +250,7 @@ class TransposedGridStatusResource(HtmlResource, GridStatusMixin):
     # TODO: docs
     status = None
     changemaster = None
+    pageCacheable = True
     default_rev_order = "asc"
 
     @defer.deferredGenerator
@@ -239,7 +273,8 @@ class TransposedGridStatusResource(HtmlResource, GridStatusMixin):
 
         # and the data we want to render
         status = self.getStatus(request)
-        stamps = self.getRecentSourcestamps(status, numBuilds, categories, branch)
+        stamps, cells = self.getGrid(request, status, numBuilds, categories,
+                                     branch)
 
         cxt.update({'categories': categories,
                     'branch': branch,
@@ -258,25 +293,17 @@ class TransposedGridStatusResource(HtmlResource, GridStatusMixin):
             cxt['range'].reverse()
         
         for bn in sortedBuilderNames:
-            builds = [None] * len(stamps)
-
-            builder = status.getBuilder(bn)
-            if categories and builder.category not in categories:
+            if bn not in cells:
                 continue
-
-            for build in self.getRecentBuilds(builder, numBuilds, branch):
-                ss = build.getSourceStamp(absolute=True)
-                key = self.getSourceStampKey(ss)
-                for i in range(len(stamps)):
-                    if key == self.getSourceStampKey(stamps[i]) and builds[i] is None:
-                        builds[i] = build
+            builder = status.getBuilder(bn)
 
             wfd = defer.waitForDeferred(
                     self.builder_cxt(request, builder))
             yield wfd
             builders.append(wfd.getResult())
 
-            builder_builds.append(map(lambda b: self.build_cxt(request, b), builds))
+            builder_builds.append(map(lambda b: self.build_cxt(request, b),
+                                      cells[bn]))
 
         template = request.site.buildbot_service.templates.get_template('grid_transposed.html')
         yield template.render(**cxt)
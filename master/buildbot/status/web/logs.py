@@ -13,11 +13,12 @@
 #
 # Copyright Buildbot Team Members
 
+import zlib
 
 from zope.interface import implements
 from twisted.python import components
 from twisted.spread import pb
-from twisted.web import server
+from twisted.web import http, server
 from twisted.web.resource import Resource
 from twisted.web.error import NoResource
 
@@ -41,13 +42,60 @@ class ChunkConsumer:
         try:
             if isinstance(formatted, unicode):
                 formatted = formatted.encode('utf-8')
-            self.original.write(formatted)
+            self.textlog.write(formatted)
         except pb.DeadReferenceError:
-            self.producing.stopProducing()
+            self.producer.stopProducing()
     def finish(self):
         self.textlog.finished()
 
 
+def _escape(text):
+    # this is called for every chunk of a log, so avoid the overhead of a
+    # template call, and of decoding the text
+    return text.replace('&', '&amp;').replace('<', '&lt;') \
+               .replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _acceptsGzip(req):
+    return 'gzip' in (req.getHeader('accept-encoding') or '')
+
+
+def _parseRange(header, length):
+    """Parse a single-range HTTP Range header against a body of C{length}
+    bytes.  Returns the (first, last) byte positions, None if the header
+    should be ignored, or () if it cannot be satisfied."""
+    try:
+        unit, spec = header.split('=', 1)
+        if unit.strip() != 'bytes' or ',' in spec:
+            return None
+        first, last = spec.strip().split('-', 1)
+        if not first:
+            # the last N bytes
+            n = int(last)
+            if n <= 0 or length == 0:
+                return ()
+            return (max(length - n, 0), length - 1)
+        first = int(first)
+        if last:
+            last = int(last)
+            if last < first:
+                return None
+        else:
+            last = length - 1
+    except ValueError:
+        return None
+    if first >= length:
+        return ()
+    return (first, min(last, length - 1))
+
+
+def _intArg(req, name):
+    try:
+        return max(int(req.args[name][0]), 0)
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
 # /builders/$builder/builds/$buildnum/steps/$stepname/logs/$logname
 class TextLog(Resource):
     # a new instance of this Resource is created for each client who views
@@ -56,6 +104,10 @@ class TextLog(Resource):
 
     asText = False
     subscribed = False
+    compressor = None
+    laterurl = None
+    # the amount of text shown on each page of the HTML view
+    pageSize = 64*1024
 
     def __init__(self, original):
         Resource.__init__(self)
@@ -68,29 +120,23 @@ class TextLog(Resource):
         return HtmlResource.getChild(self, path, req)
 
     def content(self, entries):
-        html_entries = []
-        text_data = ''
+        data = []
         for type, entry in entries:
             if type >= len(logfile.ChunkTypes) or type < 0:
                 # non-std channel, don't display
                 continue
-            
+
             is_header = type == logfile.HEADER
 
             if not self.asText:
-                # jinja only works with unicode, or pure ascii, so assume utf-8 in logs
-                if not isinstance(entry, unicode):
-                    entry = unicode(entry, 'utf-8', 'replace')
-                html_entries.append(dict(type = logfile.ChunkTypes[type], 
-                                         text = entry,
-                                         is_header = is_header))
+                if isinstance(entry, unicode):
+                    entry = entry.encode('utf-8')
+                data.append('<span class="%s">%s</span>'
+                            % (logfile.ChunkTypes[type], _escape(entry)))
             elif not is_header:
-                text_data += entry
+                data.append(entry)
 
-        if self.asText:
-            return text_data
-        else:
-            return self.template.module.chunks(html_entries)
+        return ''.join(data)
 
     def render_HEAD(self, req):
         self._setContentType(req)
@@ -103,40 +149,113 @@ class TextLog(Resource):
         self._setContentType(req)
         self.req = req
 
+        if self.asText:
+            channels = [logfile.STDOUT, logfile.STDERR]
+            req.setHeader("accept-ranges", "bytes")
+        else:
+            channels = []
+        start, end = 0, None
+        earlierurl = laterurl = None
+        rangeHeader = self.asText and req.getHeader('range')
+
+        if rangeHeader:
+            length = self.original.getTextLength(channels)
+            byterange = _parseRange(rangeHeader, length)
+            if byterange == ():
+                req.setResponseCode(http.REQUESTED_RANGE_NOT_SATISFIABLE)
+                req.setHeader("content-range", "bytes */%d" % length)
+                self.req = None
+                return ''
+            if byterange:
+                start, end = byterange[0], byterange[1] + 1
+                req.setResponseCode(http.PARTIAL_CONTENT)
+                req.setHeader("content-range", "bytes %d-%d/%d"
+                              % (start, end - 1, length))
+                req.setHeader("content-length", end - start)
+            else:
+                rangeHeader = None
+
+        if not rangeHeader:
+            start = _intArg(req, 'start')
+            tail = _intArg(req, 'tail')
+            if start is None and tail is None and not self.asText:
+                # show the end of big logs in the browser, rather than
+                # sending the whole thing; the text view has it all
+                tail = self.pageSize
+            if start is None:
+                start = 0
+                if tail is not None:
+                    start = max(self.original.getTextLength(channels) - tail,
+                                0)
+            elif start and not self.asText:
+                # a page of the log, unless that reaches the end
+                end = start + self.pageSize
+                if end >= self.original.getTextLength(channels):
+                    end = None
+            if start:
+                earlierurl = "?start=%d" % max(start - self.pageSize, 0)
+            if end is not None:
+                laterurl = "?start=%d" % end
+
+        # big logs compress very well, so compress them on the fly for
+        # clients which accept it
+        req.setHeader("vary", "Accept-Encoding")
+        if _acceptsGzip(req) and not rangeHeader:
+            req.setHeader("content-encoding", "gzip")
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED,
+                                               16 + zlib.MAX_WBITS)
+
         if not self.asText:
-            self.template = req.site.buildbot_service.templates.get_template("logs.html")                
-            
+            self.template = req.site.buildbot_service.templates.get_template("logs.html")
+            self.laterurl = laterurl
+
             data = self.template.module.page_header(
                     pageTitle = "Log File contents",
                     texturl = req.childLink("text"),
-                    path_to_root = path_to_root(req))
-            data = data.encode('utf-8')                   
-            req.write(data)
+                    path_to_root = path_to_root(req),
+                    earlierurl = earlierurl,
+                    skipped = start)
+            data = data.encode('utf-8')
+            self.write(data)
 
-        self.original.subscribeConsumer(ChunkConsumer(req, self))
+        self.original.subscribeConsumer(ChunkConsumer(req, self),
+                                        start, end, channels)
         return server.NOT_DONE_YET
 
+    def write(self, data):
+        if self.compressor:
+            data = self.compressor.compress(data)
+            if not self.original.isFinished():
+                # send what we have, so that a running log stays up to date
+                data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            self.req.write(data)
+
     def _setContentType(self, req):
         if self.asText:
             req.setHeader("content-type", "text/plain; charset=utf-8")
         else:
             req.setHeader("content-type", "text/html; charset=utf-8")
-        
+
     def finished(self):
         if not self.req:
             return
         try:
             if not self.asText:
-                data = self.template.module.page_footer()
+                data = self.template.module.page_footer(
+                        laterurl = self.laterurl)
                 data = data.encode('utf-8')
-                self.req.write(data)
+                self.write(data)
+            if self.compressor:
+                self.req.write(self.compressor.flush())
+                self.compressor = None
             self.req.finish()
         except pb.DeadReferenceError:
             pass
         # break the cycle, the Request's .notifications list includes the
         # Deferred (from req.notifyFinish) that's pointing at us.
         self.req = None
-        
+
         # release template
         self.template = None
 
@@ -0,0 +1,152 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.internet import defer, reactor
+from buildbot import util
+from buildbot.status.base import StatusReceiver
+
+class PageCache(StatusReceiver):
+    """
+    A cache of rendered status pages, shared by all requests to a WebStatus.
+
+    Pages like the waterfall, grid and console are expensive to build, and
+    are typically re-requested every few seconds by auto-refreshing browsers.
+    This cache keeps each rendered page, keyed by its path and query
+    arguments, until the next status event which might change it (a build or
+    step starting or finishing, a new change, a new or cancelled build
+    request, a builder changing state, or a slave connecting or
+    disconnecting).  Entries also expire after C{max_age} seconds, so that
+    relative times on the pages do not get too stale.
+
+    Concurrent requests for a page which is not yet cached share a single
+    computation.
+
+    @ivar hits: number of requests answered from the cache
+    @ivar misses: number of pages computed
+    """
+
+    def __init__(self, max_age=60, max_size=100, _reactor=reactor):
+        self.max_age = max_age
+        self.max_size = max_size
+        self._reactor = _reactor
+        # key -> (time, page)
+        self.pages = {}
+        # key -> list of Deferreds waiting for the page to be computed
+        self.concurrent = {}
+        # incremented on every invalidation, so that pages which were being
+        # computed at the time are not cached
+        self.generation = 0
+        self.hits = self.misses = 0
+
+    def getKey(self, request):
+        """Return the cache key for a request: its path and normalized
+        query arguments"""
+        args = [ (k, tuple(v)) for k, v in request.args.iteritems() ]
+        args.sort()
+        return (tuple(request.prepath), tuple(args))
+
+    def get(self, key, compute):
+        """
+        Get the page for C{key}, calling C{compute} (which may return a
+        Deferred) if it is not cached.  Returns a Deferred.
+        """
+        now = util.now(self._reactor)
+        if key in self.pages:
+            when, page = self.pages[key]
+            if now - when < self.max_age:
+                self.hits += 1
+                return defer.succeed(page)
+            del self.pages[key]
+
+        if key in self.concurrent:
+            self.hits += 1
+            d = defer.Deferred()
+            self.concurrent[key].append(d)
+            return d
+
+        self.misses += 1
+        waiters = self.concurrent[key] = []
+        generation = self.generation
+        d = defer.maybeDeferred(compute)
+        def done(page):
+            del self.concurrent[key]
+            if generation == self.generation:
+                if len(self.pages) >= self.max_size:
+                    self._purge(now)
+                self.pages[key] = (now, page)
+            for w in waiters:
+                w.callback(page)
+            return page
+        def failed(f):
+            del self.concurrent[key]
+            for w in waiters:
+                w.errback(f)
+            return f
+        d.addCallbacks(done, failed)
+        return d
+
+    def _purge(self, now):
+        for key, (when, page) in self.pages.items():
+            if now - when >= self.max_age:
+                del self.pages[key]
+        # still full? drop the oldest page
+        if len(self.pages) >= self.max_size:
+            oldest = min(self.pages, key=lambda k : self.pages[k][0])
+            del self.pages[oldest]
+
+    def invalidate(self):
+        """Forget all cached pages"""
+        self.generation += 1
+        self.pages.clear()
+
+    # IStatusReceiver
+
+    def builderAdded(self, builderName, builder):
+        self.invalidate()
+        return self # subscribe to this builder
+
+    def builderRemoved(self, builderName):
+        self.invalidate()
+
+    def builderChangedState(self, builderName, state):
+        self.invalidate()
+
+    def requestSubmitted(self, request):
+        self.invalidate()
+
+    def requestCancelled(self, builder, request):
+        self.invalidate()
+
+    def buildStarted(self, builderName, build):
+        self.invalidate()
+        return self # subscribe to this build's steps
+
+    def stepStarted(self, build, step):
+        self.invalidate()
+
+    def stepFinished(self, build, step, results):
+        self.invalidate()
+
+    def buildFinished(self, builderName, build, results):
+        self.invalidate()
+
+    def changeAdded(self, change):
+        self.invalidate()
+
+    def slaveConnected(self, slaveName):
+        self.invalidate()
+
+    def slaveDisconnected(self, slaveName):
+        self.invalidate()
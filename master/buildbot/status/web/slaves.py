@@ -68,12 +68,12 @@ class OneBuildSlaveResource(HtmlResource, BuildLineMixin):
            
         recent_builds = []    
         n = 0
-        for rb in s.generateFinishedBuilds(builders=[b.getName() for b in my_builders]):
-            if rb.getSlavename() == self.slavename:
-                n += 1
-                recent_builds.append(self.get_line_values(request, rb))
-                if n > max_builds:
-                    break
+        for rb in s.generateFinishedBuilds(builders=[b.getName() for b in my_builders],
+                                           slavenames=[self.slavename]):
+            n += 1
+            recent_builds.append(self.get_line_values(request, rb))
+            if n > max_builds:
+                break
 
         # connects over the last hour
         slave = s.getSlave(self.slavename)
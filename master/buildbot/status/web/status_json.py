@@ -17,12 +17,19 @@
 """Simple JSON exporter."""
 
 import datetime
+import gzip
 import os
 import re
+import cStringIO
+from hashlib import sha1
 
-from twisted.internet import defer
-from twisted.web import html, resource, server
+from zope.interface import implements
+from twisted.internet import defer, reactor, interfaces
+from twisted.python import log
+from twisted.web import html, http, resource, server
 
+from buildbot import util
+from buildbot.status.base import StatusReceiver
 from buildbot.status.web.base import HtmlResource
 from buildbot.util import json
 
@@ -81,6 +88,8 @@ EXAMPLES = """\
     - A specific slave.
   - /json?select=slaves/<A_SLAVE>/&select=project&select=builders/<A_BUILDER>/builds/<A_BUILD>
     - A selection of random unrelated stuff as an random example. :)
+  - /json/events?since=<ID>&builder=<A_BUILDER>
+    - Waits for status events on '<A_BUILDER>' newer than event <ID>.
 """
 
 
@@ -117,6 +126,121 @@ def FilterOut(data):
         return data
 
 
+def _gzip(data):
+    buf = cStringIO.StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6)
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+
+class _JsonEntry(object):
+    """A serialized JSON response, and its gzipped form once needed"""
+
+    def __init__(self, generation, when, body, headers):
+        self.generation = generation
+        self.when = when
+        self.body = body
+        self.headers = headers
+        self.etag = '"%s"' % sha1(body).hexdigest()
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = _gzip(self.body)
+        return self._gzipped
+
+
+class JsonCache(StatusReceiver):
+    """Serialized JSON responses, shared by all requests to a WebStatus.
+
+    Each response is stored with the generation of the status it was built
+    from: a counter for its builder or slave, or for the whole status, which
+    is incremented by every status event that concerns it.  A response is
+    reused while that generation has not changed, for at most the
+    resource's C{cache_seconds}.  At most C{max_size} responses are kept."""
+
+    def __init__(self, max_size=200, _reactor=reactor):
+        self.max_size = max_size
+        self._reactor = _reactor
+        self.generation = 1
+        self.builders = {}
+        self.slaves = {}
+        self.entries = {}
+        self.hits = self.misses = 0
+
+    def builderGeneration(self, builderName):
+        return self.builders.get(builderName, 0)
+
+    def slaveGeneration(self, slaveName):
+        return self.slaves.get(slaveName, 0)
+
+    def bump(self, builderName=None, slaveName=None):
+        self.generation += 1
+        if builderName is not None:
+            self.builders[builderName] = self.builders.get(builderName, 0) + 1
+        if slaveName is not None:
+            self.slaves[slaveName] = self.slaves.get(slaveName, 0) + 1
+
+    def get(self, key, generation, max_age):
+        entry = self.entries.get(key)
+        if entry is None or entry.generation != generation \
+                or util.now(self._reactor) - entry.when >= max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, generation, body, headers):
+        if key not in self.entries and len(self.entries) >= self.max_size:
+            # drop the oldest response
+            oldest = min(self.entries, key=lambda k : self.entries[k].when)
+            del self.entries[oldest]
+        entry = _JsonEntry(generation, util.now(self._reactor), body, headers)
+        self.entries[key] = entry
+        return entry
+
+    # IStatusReceiver
+
+    def builderAdded(self, builderName, builder):
+        self.bump(builderName)
+        return self # subscribe to this builder
+
+    def builderRemoved(self, builderName):
+        self.bump(builderName)
+
+    def builderChangedState(self, builderName, state):
+        self.bump(builderName)
+
+    def requestSubmitted(self, request):
+        self.bump(request.getBuilderName())
+
+    def requestCancelled(self, builder, request):
+        self.bump()
+
+    def buildStarted(self, builderName, build):
+        self.bump(builderName)
+        return self # subscribe to this build's steps
+
+    def stepStarted(self, build, step):
+        self.bump(build.getBuilder().getName())
+
+    def stepFinished(self, build, step, results):
+        self.bump(build.getBuilder().getName())
+
+    def buildFinished(self, builderName, build, results):
+        self.bump(builderName)
+
+    def changeAdded(self, change):
+        self.bump()
+
+    def slaveConnected(self, slaveName):
+        self.bump(slaveName=slaveName)
+
+    def slaveDisconnected(self, slaveName):
+        self.bump(slaveName=slaveName)
+
+
 class JsonResource(resource.Resource):
     """Base class for json data."""
 
@@ -160,35 +284,86 @@ class JsonResource(resource.Resource):
 
     def render_GET(self, request):
         """Renders a HTTP GET at the http request level."""
+        cache = request.site.buildbot_service.jsonCache
+        args = [ (k, tuple(v)) for k, v in request.args.iteritems() ]
+        args.sort()
+        key = (tuple(request.prepath), tuple(args))
+        if 'select' in request.args:
+            # the selection may come from anywhere in the status
+            generation = cache.generation
+        else:
+            generation = self.getGeneration(cache, request)
+
+        entry = cache.get(key, generation, self.cache_seconds)
+        if entry is not None:
+            self.respond(request, entry)
+            return server.NOT_DONE_YET
+
         d = defer.maybeDeferred(lambda : self.content(request))
         def handle(data):
             if isinstance(data, unicode):
                 data = data.encode("utf-8")
-            request.setHeader("Access-Control-Allow-Origin", "*")
+            headers = {}
             if RequestArgToBool(request, 'as_text', False):
-                request.setHeader("content-type", 'text/plain')
+                headers["content-type"] = 'text/plain'
             else:
-                request.setHeader("content-type", self.contentType)
-                request.setHeader("content-disposition",
-                                "attachment; filename=\"%s.json\"" % request.path)
-            # Make sure we get fresh pages.
-            if self.cache_seconds:
-                now = datetime.datetime.utcnow()
-                expires = now + datetime.timedelta(seconds=self.cache_seconds)
-                request.setHeader("Expires",
-                                expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
-                request.setHeader("Pragma", "no-cache")
-            return data
+                headers["content-type"] = self.contentType
+                headers["content-disposition"] = (
+                        "attachment; filename=\"%s.json\"" % request.path)
+            return cache.put(key, generation, data, headers)
         d.addCallback(handle)
-        def ok(data):
-            request.write(data)
-            request.finish()
+        def ok(entry):
+            self.respond(request, entry)
         def fail(f):
             request.processingFailed(f)
             return None # processingFailed will log this for us
         d.addCallbacks(ok, fail)
         return server.NOT_DONE_YET
 
+    def getGeneration(self, cache, request):
+        """Return the generation of the status this resource's data comes
+        from, as found through C{request}'s path; see L{JsonCache}.  By
+        default, any status event invalidates it."""
+        return cache.generation
+
+    def respond(self, request, entry):
+        """Write a serialized response, honoring If-None-Match and
+        Accept-Encoding."""
+        request.setHeader("Access-Control-Allow-Origin", "*")
+        for name, value in entry.headers.iteritems():
+            request.setHeader(name, value)
+        # Make sure we get fresh pages.
+        if self.cache_seconds:
+            now = datetime.datetime.utcnow()
+            expires = now + datetime.timedelta(seconds=self.cache_seconds)
+            request.setHeader("Expires",
+                            expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+            request.setHeader("Pragma", "no-cache")
+        request.setHeader("Vary", "Accept-Encoding")
+
+        accept_encoding = request.getHeader('accept-encoding') or ''
+        use_gzip = 'gzip' in accept_encoding
+        etag = entry.etag
+        if use_gzip:
+            # a different representation needs a different strong ETag
+            etag = etag[:-1] + '-gzip"'
+        request.setHeader("ETag", etag)
+
+        if_none_match = request.getHeader('if-none-match')
+        if if_none_match:
+            tags = [ t.strip() for t in if_none_match.split(',') ]
+            if etag in tags or '*' in tags:
+                request.setResponseCode(http.NOT_MODIFIED)
+                request.finish()
+                return
+
+        if use_gzip:
+            request.setHeader("Content-Encoding", "gzip")
+            request.write(entry.gzipped())
+        else:
+            request.write(entry.body)
+        request.finish()
+
     @defer.deferredGenerator
     def content(self, request):
         """Renders the json dictionaries."""
@@ -354,6 +529,20 @@ class HelpResource(HtmlResource):
         template = request.site.buildbot_service.templates.get_template("jsonhelp.html")
         return template.render(**cxt)
 
+def _buildGeneration(cache, build_status, request):
+    # finished builds do not change, but a relative build number like
+    # builds/-1 refers to another build once a newer one starts
+    if build_status.isFinished() and not _isRelativeBuildPath(request.prepath):
+        return 'finished'
+    return cache.builderGeneration(build_status.getBuilder().getName())
+
+def _isRelativeBuildPath(prepath):
+    for i in range(1, len(prepath)):
+        if prepath[i - 1] in ('builds', '_all') and prepath[i].startswith('-'):
+            return True
+    return False
+
+
 class BuilderPendingBuildsJsonResource(JsonResource):
     help = """Describe pending builds for a builder.
 """
@@ -363,6 +552,9 @@ class BuilderPendingBuildsJsonResource(JsonResource):
         JsonResource.__init__(self, status)
         self.builder_status = builder_status
 
+    def getGeneration(self, cache, request):
+        return cache.builderGeneration(self.builder_status.getName())
+
     def asDict(self, request):
         # buildbot.status.builder.BuilderStatus
         d = self.builder_status.getPendingBuildRequestStatuses()
@@ -388,6 +580,9 @@ class BuilderJsonResource(JsonResource):
                 'pendingBuilds',
                 BuilderPendingBuildsJsonResource(status, builder_status))
 
+    def getGeneration(self, cache, request):
+        return cache.builderGeneration(self.builder_status.getName())
+
     def asDict(self, request):
         # buildbot.status.builder.BuilderStatus
         return self.builder_status.asDict_async()
@@ -433,6 +628,9 @@ class BuildJsonResource(JsonResource):
                                               build_status.getSourceStamp()))
         self.putChild('steps', BuildStepsJsonResource(status, build_status))
 
+    def getGeneration(self, cache, request):
+        return _buildGeneration(cache, self.build_status, request)
+
     def asDict(self, request):
         return self.build_status.asDict()
 
@@ -446,6 +644,9 @@ class AllBuildsJsonResource(JsonResource):
         JsonResource.__init__(self, status)
         self.builder_status = builder_status
 
+    def getGeneration(self, cache, request):
+        return cache.builderGeneration(self.builder_status.getName())
+
     def getChild(self, path, request):
         # Dynamic childs.
         if isinstance(path, int) or _IS_INT.match(path):
@@ -514,6 +715,10 @@ class BuildStepJsonResource(JsonResource):
         self.build_step_status = build_step_status
         # TODO self.putChild('logs', LogsJsonResource())
 
+    def getGeneration(self, cache, request):
+        return _buildGeneration(cache, self.build_step_status.getBuild(),
+                                request)
+
     def asDict(self, request):
         return self.build_step_status.asDict()
 
@@ -529,6 +734,9 @@ class BuildStepsJsonResource(JsonResource):
         # The build steps are constantly changing until the build is done so
         # keep a reference to build_status instead
 
+    def getGeneration(self, cache, request):
+        return _buildGeneration(cache, self.build_status, request)
+
     def getChild(self, path, request):
         # Dynamic childs.
         build_step_status = None
@@ -632,6 +840,12 @@ class SlaveJsonResource(JsonResource):
         self.name = self.slave_status.getName()
         self.builders = None
 
+    def getGeneration(self, cache, request):
+        # this includes the slave's recent builds on each of its builders
+        return (cache.slaveGeneration(self.name),
+                tuple([ cache.builderGeneration(b)
+                        for b in self.getBuilders() ]))
+
     def getBuilders(self):
         if self.builders is None:
             # Figure out all the builders to which it's attached
@@ -705,6 +919,289 @@ class MetricsJsonResource(JsonResource):
 
 
 
+class StatusEventHub(StatusReceiver):
+    """Collects status events for L{EventsJsonResource}.
+
+    Each event is a dictionary with an increasing 'id', the 'event' name, the
+    'builderName' it concerns, and a small 'payload' describing what changed.
+    The most recent C{max_events} are kept, so that long-polling clients can
+    pick up where they left off; clients which fall further behind are told
+    to re-read the full status instead."""
+
+    def __init__(self, max_events=1000, eta_interval=10):
+        self.max_events = max_events
+        self.eta_interval = eta_interval
+        self.events = []
+        self.next_id = 1
+        self.listeners = []
+        self.builders = {}
+
+    def addListener(self, listener):
+        """Call C{listener.eventAdded(event)} for each new event."""
+        self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def lastId(self):
+        return self.next_id - 1
+
+    def getEventsSince(self, since):
+        """Return (events, overflow) for the events after the one with id
+        C{since}.  If some of those events have already been discarded, or
+        C{since} is from before a reconfig, overflow is True."""
+        if since > self.lastId():
+            return [], True
+        if self.events and since < self.events[0]['id'] - 1:
+            return [], True
+        first = len(self.events) - (self.lastId() - since)
+        return self.events[first:], False
+
+    def push(self, event, builderName, **payload):
+        packet = dict(id=self.next_id, event=event, builderName=builderName,
+                      payload=payload)
+        self.next_id += 1
+        self.events.append(packet)
+        if len(self.events) > self.max_events:
+            del self.events[0]
+        for listener in self.listeners[:]:
+            try:
+                listener.eventAdded(packet)
+            except:
+                log.err(None, "while sending status event")
+
+    def pushPendingCount(self, builderName):
+        builder_status = self.builders.get(builderName)
+        if not builder_status:
+            return
+        d = builder_status.getPendingBuildRequestStatuses()
+        d.addCallback(lambda statuses :
+                self.push('pendingBuilds', builderName, count=len(statuses)))
+        d.addErrback(log.err, "while counting pending builds")
+
+    def _build(self, build):
+        return dict(number=build.getNumber(), text=build.getText(),
+                    results=build.getResults(), times=build.getTimes(),
+                    eta=build.getETA())
+
+    def _step(self, build, step):
+        return dict(buildNumber=build.getNumber(), name=step.getName(),
+                    text=step.getText(), results=step.getResults(),
+                    times=step.getTimes())
+
+    # IStatusReceiver
+
+    def builderAdded(self, builderName, builder):
+        self.builders[builderName] = builder
+        return self # subscribe to this builder
+
+    def builderRemoved(self, builderName):
+        self.builders.pop(builderName, None)
+
+    def builderChangedState(self, builderName, state):
+        self.push('builderChangedState', builderName, state=state)
+
+    def requestSubmitted(self, request):
+        self.pushPendingCount(request.getBuilderName())
+
+    def buildStarted(self, builderName, build):
+        self.push('buildStarted', builderName, **self._build(build))
+        self.pushPendingCount(builderName)
+        # subscribe to the build's steps and ETA updates
+        return (self, self.eta_interval)
+
+    def buildETAUpdate(self, build, ETA):
+        self.push('buildETAUpdate', build.getBuilder().getName(),
+                  number=build.getNumber(), eta=ETA)
+
+    def stepStarted(self, build, step):
+        self.push('stepStarted', build.getBuilder().getName(),
+                  **self._step(build, step))
+
+    def stepFinished(self, build, step, results):
+        self.push('stepFinished', build.getBuilder().getName(),
+                  **self._step(build, step))
+
+    def buildFinished(self, builderName, build, results):
+        self.push('buildFinished', builderName, **self._build(build))
+
+
+class _EventFilter(object):
+    """The events a client asked for, with builder= and event= arguments"""
+
+    def __init__(self, request):
+        self.builders = request.args.get('builder')
+        self.events = request.args.get('event')
+
+    def __call__(self, packet):
+        if self.builders and packet['builderName'] not in self.builders:
+            return False
+        if self.events and packet['event'] not in self.events:
+            return False
+        return True
+
+
+class _LongPollClient(object):
+    """A request waiting for the next matching event"""
+
+    def __init__(self, hub, request, matches, timeout, _reactor=reactor):
+        self.hub = hub
+        self.request = request
+        self.matches = matches
+        self.finished = False
+        hub.addListener(self)
+        self.timer = _reactor.callLater(timeout, self.respond, [])
+        request.notifyFinish().addErrback(lambda _ : self.cleanup())
+
+    def eventAdded(self, packet):
+        if self.matches(packet):
+            self.respond([packet])
+
+    def respond(self, events):
+        if self.finished:
+            return
+        self.cleanup()
+        _writeEvents(self.request, self.hub, events, False)
+
+    def cleanup(self):
+        self.finished = True
+        self.hub.removeListener(self)
+        if self.timer.active():
+            self.timer.cancel()
+
+
+class _EventStreamClient(object):
+    """A request receiving events as a text/event-stream.  While the
+    connection is not accepting data, up to C{max_buffer} events are held;
+    beyond that the stream is closed, and the client must reconnect."""
+    implements(interfaces.IPushProducer)
+
+    def __init__(self, hub, request, matches, max_buffer):
+        self.hub = hub
+        self.request = request
+        self.matches = matches
+        self.max_buffer = max_buffer
+        self.paused = False
+        self.buffer = []
+        request.setHeader("content-type", "text/event-stream")
+        request.setHeader("cache-control", "no-cache")
+        request.registerProducer(self, True)
+        hub.addListener(self)
+        request.notifyFinish().addBoth(lambda _ : self.stopProducing())
+
+    def eventAdded(self, packet):
+        if not self.matches(packet):
+            return
+        if self.paused:
+            self.buffer.append(packet)
+            if len(self.buffer) > self.max_buffer:
+                self.stop()
+        else:
+            self.write(packet)
+
+    def write(self, packet):
+        self.request.write("id: %d\ndata: %s\n\n" %
+                (packet['id'], json.dumps(packet, separators=(',',':'))))
+
+    def stop(self):
+        self.stopProducing()
+        self.request.unregisterProducer()
+        self.request.finish()
+
+    # IPushProducer
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        buffer, self.buffer = self.buffer, []
+        for packet in buffer:
+            self.write(packet)
+
+    def stopProducing(self):
+        self.hub.removeListener(self)
+        self.buffer = []
+
+
+def _writeEvents(request, hub, events, overflow):
+    data = dict(events=events, last=hub.lastId())
+    if overflow:
+        data['overflow'] = True
+    request.setHeader("content-type", "application/json")
+    request.setHeader("Access-Control-Allow-Origin", "*")
+    request.setHeader("cache-control", "no-cache")
+    request.write(json.dumps(data, sort_keys=True, separators=(',',':')))
+    request.finish()
+
+
+class EventsJsonResource(JsonResource):
+    help = """Status events, as they happen.
+
+Each event has an 'id', an 'event' name (buildStarted, buildFinished,
+stepStarted, stepFinished, buildETAUpdate, pendingBuilds or
+builderChangedState), a 'builderName' and a 'payload'.
+
+Without arguments, this returns the id of the latest event.  With
+since=<ID>, it returns the events after that one, waiting up to 'timeout'
+seconds (default 30) for one to happen, as {"events": [...], "last": ID}.
+Poll again with since=<last>.  If events were missed, because the client
+fell too far behind or the master was reconfigured, the reply has
+"overflow": true and the client should re-read the status it needs.
+
+With an "Accept: text/event-stream" header, or stream=1, events are sent as
+server-sent events instead, resuming from the Last-Event-ID header if given.
+
+Events can be limited to some builders with builder=<A_BUILDER>, and to some
+kinds of event with event=<NAME>; both can be given multiple times.
+"""
+    pageTitle = 'Events'
+
+    max_timeout = 300
+    max_buffer = 100
+
+    def getHub(self, request):
+        return request.site.buildbot_service.statusEvents
+
+    def asDict(self, request):
+        return { 'last' : self.getHub(request).lastId() }
+
+    def render_GET(self, request):
+        hub = self.getHub(request)
+        matches = _EventFilter(request)
+
+        accept = request.getHeader('accept') or ''
+        if 'text/event-stream' in accept or \
+                RequestArgToBool(request, 'stream', False):
+            client = _EventStreamClient(hub, request, matches, self.max_buffer)
+            last = request.getHeader('last-event-id')
+            if last and _IS_INT.match(last):
+                events, overflow = hub.getEventsSince(int(last))
+                if overflow:
+                    request.write("event: overflow\ndata: {}\n\n")
+                for packet in events:
+                    client.eventAdded(packet)
+            return server.NOT_DONE_YET
+
+        since = RequestArg(request, 'since', None)
+        if since is None or not _IS_INT.match(since):
+            return JsonResource.render_GET(self, request)
+        events, overflow = hub.getEventsSince(int(since))
+        events = filter(matches, events)
+        if events or overflow:
+            _writeEvents(request, hub, events, overflow)
+            return server.NOT_DONE_YET
+
+        try:
+            timeout = float(RequestArg(request, 'timeout', 30))
+        except ValueError:
+            timeout = 30
+        timeout = max(0, min(timeout, self.max_timeout))
+        _LongPollClient(hub, request, matches, timeout)
+        return server.NOT_DONE_YET
+
+
 class JsonStatusResource(JsonResource):
     """Retrieves all json data."""
     help = """JSON status
@@ -724,6 +1221,7 @@ For help on any sub directory, use url /child/help
         self.putChild('project', ProjectJsonResource(status))
         self.putChild('slaves', SlavesJsonResource(status))
         self.putChild('metrics', MetricsJsonResource(status))
+        self.putChild('events', EventsJsonResource(status))
         # This needs to be called before the first HelpResource().body call.
         self.hackExamples()
 
@@ -21,10 +21,12 @@ import urllib
 
 import time, locale
 import operator
+import bisect
 
 from buildbot import interfaces, util
 from buildbot.status import builder, buildstep, build
 from buildbot.changes import changes
+from buildbot.status.base import StatusReceiver
 
 from buildbot.status.web.base import Box, HtmlResource, IBox, ICurrentBox, \
      ITopBox, build_get_class, path_to_build, path_to_step, path_to_root, \
@@ -326,10 +328,148 @@ class ChangeEventSource(object):
                 continue
             yield change
 
+class _TimelineEntry(object):
+    __slots__ = ('started', 'number', 'branch', 'committers')
+
+    def __init__(self, build):
+        self.started = build.getTimes()[0]
+        self.number = build.getNumber()
+        self.branch = build.getSourceStamp().branch
+        self.committers = tuple([ c.who for c in build.getChanges() ])
+
+class _BuilderTimeline(object):
+    def __init__(self):
+        # parallel lists, oldest build first
+        self.starts = []
+        self.entries = []
+
+class BuildTimeline(StatusReceiver):
+    """
+    An index of each builder's builds by start time, with enough information
+    to apply the waterfall's branch and committer filters.  This lets the
+    waterfall find the builds around a given time, and skip builds it will
+    not show, without loading every more recent build from disk.
+
+    Builds are added as they start, and older builds are added the first
+    time the waterfall walks back through them.  At most C{max_builds}
+    builds are kept for each builder; beyond that, the waterfall loads
+    builds one by one, as L{BuilderStatus.eventGenerator} does.
+    """
+
+    def __init__(self, max_builds=1000):
+        self.max_builds = max_builds
+        self.timelines = {}
+
+    def _getTimeline(self, builderName):
+        if builderName not in self.timelines:
+            self.timelines[builderName] = _BuilderTimeline()
+        return self.timelines[builderName]
+
+    # IStatusReceiver
+
+    def builderAdded(self, builderName, builder):
+        return self # subscribe to this builder
+
+    def builderRemoved(self, builderName):
+        self.timelines.pop(builderName, None)
+
+    def buildStarted(self, builderName, build):
+        tl = self._getTimeline(builderName)
+        entry = _TimelineEntry(build)
+        tl.starts.append(entry.started)
+        tl.entries.append(entry)
+        if len(tl.entries) > self.max_builds:
+            del tl.starts[0]
+            del tl.entries[0]
+
+    # lookups
+
+    def _walkBuilds(self, builder, maxTime):
+        # yield entries for the builds of this builder, newest first,
+        # starting with the newest build that started before maxTime
+        tl = self._getTimeline(builder.getName())
+        if maxTime is None:
+            i = len(tl.starts)
+        else:
+            i = bisect.bisect_right(tl.starts, maxTime)
+        while i > 0:
+            i -= 1
+            yield tl.entries[i]
+
+        # then load older builds, adding them to the index while there is
+        # room and they are contiguous with it
+        if tl.entries:
+            number = tl.entries[0].number - 1
+        else:
+            number = builder.nextBuildNumber - 1
+        newest = number
+        indexing = True
+        while number >= 0:
+            b = builder.getBuild(number)
+            if not b:
+                # the newest build may be in progress but not yet loadable,
+                # as in BuilderStatus.eventGenerator
+                if number == newest:
+                    indexing = False
+                    number -= 1
+                    continue
+                break
+            entry = _TimelineEntry(b)
+            if indexing and len(tl.entries) < self.max_builds:
+                tl.starts.insert(0, entry.started)
+                tl.entries.insert(0, entry)
+            if maxTime is None or entry.started <= maxTime:
+                yield entry
+            number -= 1
+
+    def eventGenerator(self, builder, branches=[], categories=[],
+                       committers=[], minTime=0, maxTime=None):
+        """Like L{BuilderStatus.eventGenerator}, but using the index, and
+        skipping builds which started after C{maxTime}."""
+        showBuilds = not categories or builder.getCategory() in categories
+
+        eventIndex = -1
+        e = builder.getEvent(eventIndex)
+        while e is not None and maxTime is not None \
+                and e.getTimes()[0] > maxTime:
+            eventIndex -= 1
+            e = builder.getEvent(eventIndex)
+
+        if showBuilds:
+            for entry in self._walkBuilds(builder, maxTime):
+                if entry.started < minTime:
+                    break
+                if branches and not entry.branch in branches:
+                    continue
+                if committers and not [ True for c in entry.committers
+                                        if c in committers ]:
+                    continue
+                b = builder.getBuild(entry.number)
+                if not b:
+                    continue
+                steps = b.getSteps()
+                for Ns in range(1, len(steps)+1):
+                    if steps[-Ns].started:
+                        step_start = steps[-Ns].getTimes()[0]
+                        while e is not None and e.getTimes()[0] > step_start:
+                            yield e
+                            eventIndex -= 1
+                            e = builder.getEvent(eventIndex)
+                        yield steps[-Ns]
+                yield b
+        while e is not None:
+            yield e
+            eventIndex -= 1
+            e = builder.getEvent(eventIndex)
+            if e and e.getTimes()[0] < minTime:
+                break
+
 class WaterfallStatusResource(HtmlResource):
     """This builds the main status page, with the waterfall display, and
     all child pages."""
 
+    pageCacheable = True
+
     def __init__(self, categories=None, num_events=200, num_events_max=None):
         HtmlResource.__init__(self)
         self.categories = categories
@@ -591,13 +731,17 @@ class WaterfallStatusResource(HtmlResource):
                 event = None
             return event
 
+        timeline = request.site.buildbot_service.timeline
         for s in sources:
-            gen = insertGaps(s.eventGenerator(filterBranches,
-                                              filterCategories,
-                                              filterCommitters,
-                                              minTime),
-                             showEvents,
-                             lastEventTime)
+            if s is commit_source:
+                events = s.eventGenerator(filterBranches, filterCategories,
+                                          filterCommitters, minTime)
+            else:
+                events = timeline.eventGenerator(s, filterBranches,
+                                                 filterCategories,
+                                                 filterCommitters,
+                                                 minTime, maxTime)
+            gen = insertGaps(events, showEvents, lastEventTime)
             sourceGenerators.append(gen)
             # get the first event
             sourceEvents.append(get_event_from(gen))
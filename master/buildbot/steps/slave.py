@@ -113,17 +113,22 @@ class RemoveDirectory(BuildStep):
     haltOnFailure = True
     flunkOnFailure = True
 
-    def __init__(self, dir, **kwargs):
+    def __init__(self, dir, background=False, **kwargs):
         BuildStep.__init__(self, **kwargs)
-        self.addFactoryArguments(dir = dir)
+        self.addFactoryArguments(dir = dir, background = background)
         self.dir = dir
+        self.background = background
 
     def start(self):
         slavever = self.slaveVersion('rmdir')
         if not slavever:
             raise BuildSlaveTooOldError("slave is too old, does not know "
                                         "about rmdir")
-        cmd = LoggedRemoteCommand('rmdir', {'dir': self.dir })
+        args = {'dir': self.dir }
+        # older slaves ignore this, and remove the directory in the foreground
+        if self.background:
+            args['background'] = True
+        cmd = LoggedRemoteCommand('rmdir', args)
         d = self.runCommand(cmd)
         d.addCallback(lambda res: self.commandComplete(cmd))
         d.addErrback(self.failed)
@@ -72,7 +72,8 @@ class Source(LoggingBuildStep):
     branch = None # the default branch, should be set in __init__
 
     def __init__(self, workdir=None, mode='update', alwaysUseLatest=False,
-                 timeout=20*60, retry=None, **kwargs):
+                 timeout=20*60, retry=None, backgroundClobber=False,
+                 syncMethod='copy', **kwargs):
         """
         @type  workdir: string
         @param workdir: local directory (relative to the Builder's root)
@@ -108,6 +109,14 @@ class Source(LoggingBuildStep):
              (causing CVS errors on update) which are not an issue with
              a full checkout.
 
+           - 'sync': is like 'copy', except that the workdir is not
+             deleted. Instead, it is brought up to date with the copydir,
+             replacing only files whose size, mode or modification time
+             differ, and removing everything else (including build
+             products). This gives the same clean tree as 'copy' while
+             only copying the files that changed. Slaves too old to
+             support this use 'copy' instead.
+
            - 'clobber': specifies that the working directory should be
              deleted each time, necessitating a full checkout for each
              build. This insures a clean build off a complete checkout,
@@ -154,6 +163,20 @@ class Source(LoggingBuildStep):
                       failures that could be handled by simply retrying a
                       couple times.
 
+        @type  backgroundClobber: boolean
+        @param backgroundClobber: if true, the slave clobbers directories by
+                      renaming them aside and deleting them in the background,
+                      so that the checkout can start immediately. Older
+                      slaves ignore this and clobber as usual.
+
+        @type  syncMethod: string
+        @param syncMethod: with mode 'sync', how the slave replaces changed
+                      files: 'copy' (the default) uses reflink copies where
+                      the filesystem supports them and plain copies
+                      otherwise; 'hardlink' uses hard links into the
+                      copydir, which is faster but only safe if the build
+                      never modifies source files in place.
+
         """
 
         LoggingBuildStep.__init__(self, **kwargs)
@@ -162,9 +185,12 @@ class Source(LoggingBuildStep):
                                  alwaysUseLatest=alwaysUseLatest,
                                  timeout=timeout,
                                  retry=retry,
+                                 backgroundClobber=backgroundClobber,
+                                 syncMethod=syncMethod,
                                  )
 
-        assert mode in ("update", "copy", "clobber", "export")
+        assert mode in ("update", "copy", "sync", "clobber", "export")
+        assert syncMethod in ("copy", "hardlink")
         if retry:
             delay, repeats = retry
             assert isinstance(repeats, int)
@@ -174,6 +200,10 @@ class Source(LoggingBuildStep):
                      'retry': retry,
                      'patch': None, # set during .start
                      }
+        if backgroundClobber:
+            self.args['background_clobber'] = True
+        if mode == "sync" and syncMethod != "copy":
+            self.args['sync_method'] = syncMethod
         # This will get added to args later, after properties are rendered
         self.workdir = workdir
 
@@ -250,6 +280,15 @@ class Source(LoggingBuildStep):
             revision = None
         self.startVC(branch, revision, patch)
 
+    def startCommand(self, cmd, errorMessages=[]):
+        if (cmd.args.get('mode') == "sync"
+            and self.slaveVersionIsOlderThan(cmd.remote_command, "2.15")):
+            log.msg("slave %s does not support mode 'sync'; using 'copy'"
+                    % self.getSlaveName())
+            cmd.args['mode'] = "copy"
+            cmd.args.pop('sync_method', None)
+        return LoggingBuildStep.startCommand(self, cmd, errorMessages)
+
     def commandComplete(self, cmd):
         if cmd.updates.has_key("got_revision"):
             got_revision = cmd.updates["got_revision"][-1]
@@ -469,7 +508,7 @@ class CVS(Source):
             # either 'update' or 'copy' modes, it is safer to refuse to
             # build, and tell the user they need to upgrade the buildslave.
             if (branch != self.branch
-                and self.args['mode'] in ("update", "copy")):
+                and self.args['mode'] in ("update", "copy", "sync")):
                 m = ("This buildslave (%s) does not know about multiple "
                      "branches, and using mode=%s would probably build the "
                      "wrong tree. "
@@ -615,7 +654,7 @@ class SVN(Source):
             # either 'update' or 'copy' modes, it is safer to refuse to
             # build, and tell the user they need to upgrade the buildslave.
             if (self.args['branch'] != self.branch
-                and self.args['mode'] in ("update", "copy")):
+                and self.args['mode'] in ("update", "copy", "sync")):
                 m = ("This buildslave (%s) does not know about multiple "
                      "branches, and using mode=%s would probably build the "
                      "wrong tree. "
@@ -761,7 +800,7 @@ class Darcs(Source):
             # either 'update' or 'copy' modes, it is safer to refuse to
             # build, and tell the user they need to upgrade the buildslave.
             if (branch != self.branch
-                and self.args['mode'] in ("update", "copy")):
+                and self.args['mode'] in ("update", "copy", "sync")):
                 m = ("This buildslave (%s) does not know about multiple "
                      "branches, and using mode=%s would probably build the "
                      "wrong tree. "
@@ -802,6 +841,8 @@ class Git(Source):
                  reference=None,
                  shallow=False,
                  progress=False,
+                 sharedCache=False,
+                 submoduleJobs=1,
                  **kwargs):
         """
         @type  repourl: string
@@ -827,6 +868,15 @@ class Git(Source):
         @param progress: Pass the --progress option when fetching. This
                          can solve long fetches getting killed due to
                          lack of output, but requires Git 1.7.2+.
+
+        @type  sharedCache: boolean
+        @param sharedCache: Keep a bare mirror of the repository in the
+                         slave's basedir, shared by all of its builders.
+                         Branches are fetched into the mirror first, and
+                         checkouts use it as an alternate object store.
+
+        @type  submoduleJobs: int
+        @param submoduleJobs: The number of submodules to update at once.
         """
         Source.__init__(self, **kwargs)
         self.repourl = _ComputeRepositoryURL(repourl)
@@ -838,6 +888,8 @@ class Git(Source):
                                  reference=reference,
                                  shallow=shallow,
                                  progress=progress,
+                                 sharedCache=sharedCache,
+                                 submoduleJobs=submoduleJobs,
                                  )
         self.args.update({'submodules': submodules,
                           'ignore_ignores': ignore_ignores,
@@ -845,6 +897,11 @@ class Git(Source):
                           'shallow': shallow,
                           'progress': progress,
                           })
+        # older slaves ignore this, and fetch directly
+        if sharedCache:
+            self.args['shared_cache'] = True
+        if submoduleJobs != 1:
+            self.args['submodule_jobs'] = submoduleJobs
 
     def computeSourceRevision(self, changes):
         if not changes:
@@ -349,6 +349,11 @@ class FakeChangesComponent(FakeDBComponent):
             ch = None
         return defer.succeed(self._ch2chdict(ch))
 
+    def getChanges(self, changeids):
+        return defer.succeed(dict(
+                (changeid, self._ch2chdict(self.changes[changeid]))
+                for changeid in changeids if changeid in self.changes))
+
     # TODO: addChange
     # TODO: getRecentChanges
 
@@ -422,6 +427,16 @@ class FakeSchedulersComponent(FakeDBComponent):
             self.classifications[schedulerid] = {}
         return defer.succeed(None)
 
+    def classifyChangesForSchedulers(self, classifications):
+        for schedulerid, cls in classifications.iteritems():
+            self.classifyChanges(schedulerid, cls)
+        return defer.succeed(None)
+
+    def flushChangeClassificationsForSchedulers(self, flushes):
+        for schedulerid, less_than in flushes.iteritems():
+            self.flushChangeClassifications(schedulerid, less_than)
+        return defer.succeed(None)
+
     def getChangeClassifications(self, schedulerid, branch=-1):
         classifications = self.classifications.setdefault(schedulerid, {})
         if branch is not -1:
@@ -757,7 +772,7 @@ class FakeStateComponent(FakeDBComponent):
             json_value = self.states[objectid][name]
         except KeyError:
             if default is not object:
-                return default
+                return defer.succeed(default)
             raise
         return defer.succeed(json.loads(json_value))
 
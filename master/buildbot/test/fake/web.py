@@ -20,8 +20,8 @@ from twisted.internet import defer
 class MockRequest(Mock):
     """
     A fake Twisted Web Request object, including some pointers to the
-    buildmaster and an addChange method on that master which will append its
-    arguments to self.addedChanges.
+    buildmaster and addChange and addChanges methods on that master which
+    will append their arguments to self.addedChanges.
     """
     def __init__(self, args={}):
         self.args = args
@@ -34,5 +34,81 @@ class MockRequest(Mock):
             self.addedChanges.append(kwargs)
             return defer.succeed(Mock())
         master.addChange = addChange
+        def addChanges(chdicts):
+            self.addedChanges.extend(chdicts)
+            return defer.succeed([ Mock() for chdict in chdicts ])
+        master.addChanges = addChanges
 
         Mock.__init__(self)
+
+class FakeRequest(object):
+    """
+    A fake Twisted Web Request object which records the response headers and
+    everything written to it, for testing resources that write their response
+    asynchronously.  Call C{connectionLost} to simulate the client going away.
+    """
+    def __init__(self, args=None, headers=None, method='GET', prepath=None):
+        self.args = args or {}
+        self.headers = dict((k.lower(), v)
+                            for k, v in (headers or {}).items())
+        self.method = method
+        self.prepath = prepath or []
+        self.postpath = []
+        self.path = '/' + '/'.join(self.prepath)
+        self.site = Mock()
+        self.site.buildbot_service = Mock()
+
+        self.code = 200
+        self.responseHeaders = {}
+        self.written = []
+        self.finished = False
+        self.producer = None
+        self.failure = None
+        self._finishedDeferreds = []
+
+    def getHeader(self, name):
+        return self.headers.get(name.lower())
+
+    def childLink(self, name):
+        return name
+
+    def setHeader(self, name, value):
+        self.responseHeaders[name.lower()] = value
+
+    def setResponseCode(self, code, message=None):
+        self.code = code
+
+    def write(self, data):
+        assert not self.finished, "write after finish"
+        self.written.append(data)
+
+    def getWritten(self):
+        return ''.join(self.written)
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def notifyFinish(self):
+        if self.finished:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._finishedDeferreds.append(d)
+        return d
+
+    def finish(self):
+        self.finished = True
+        for d in self._finishedDeferreds:
+            d.callback(None)
+        self._finishedDeferreds = []
+
+    def processingFailed(self, reason):
+        self.failure = reason
+        self.finish()
+
+    def connectionLost(self):
+        for d in self._finishedDeferreds:
+            d.errback(Exception("connection lost"))
+        self._finishedDeferreds = []
@@ -13,11 +13,61 @@
 #
 # Copyright Buildbot Team Members
 
+import thread
 from twisted.trial import unittest
 from twisted.internet import defer, reactor, task
 from buildbot.test.util import changesource, compat
 from buildbot.changes import base
 
+class TestChangeSource(changesource.ChangeSourceMixin, unittest.TestCase):
+
+    def setUp(self):
+        d = self.setUpChangeSource()
+        def create_changesource(_):
+            self.attachChangeSource(base.ChangeSource())
+        d.addCallback(create_changesource)
+        return d
+
+    def tearDown(self):
+        return self.tearDownChangeSource()
+
+    def test_submitChanges(self):
+        d = self.changesource.submitChanges([ dict(author='a'),
+                                              dict(author='b') ])
+        def check(changes):
+            self.assertEqual(len(changes), 2)
+            self.assertEqual(self.changes_added,
+                             [ dict(author='a'), dict(author='b') ])
+        d.addCallback(check)
+        return d
+
+class TestParserPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = base.ParserPool()
+
+    def tearDown(self):
+        if self.pool._stop_evt:
+            reactor.removeSystemEventTrigger(self.pool._stop_evt)
+            self.pool._stop()
+
+    def test_deferToPool(self):
+        self.assertFalse(self.pool.started)
+        d = self.pool.deferToPool(lambda x, y=0 : (x + y, thread.get_ident()),
+                                  1, y=2)
+        def check((res, ident)):
+            self.assertEqual(res, 3)
+            self.assertNotEqual(ident, thread.get_ident())
+            self.assertTrue(self.pool.started)
+        d.addCallback(check)
+        return d
+
+    def test_deferToPool_exception(self):
+        def fail():
+            raise RuntimeError("oh noes")
+        d = self.pool.deferToPool(fail)
+        return self.assertFailure(d, RuntimeError)
+
 class TestPollingChangeSource(changesource.ChangeSourceMixin, unittest.TestCase):
     class Subclass(base.PollingChangeSource):
         pass
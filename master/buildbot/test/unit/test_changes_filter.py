@@ -123,3 +123,19 @@ class ChangeFilter(unittest.TestCase):
         self.yes(Change(project='p', repository='r', branch='b', category='c', ff=True),
                 "all match and fn returns True -> False")
         self.check()
+
+    def test_getExactMatches(self):
+        self.setfilter(branch='br', project=['p1', 'p2'], category_re='c.*')
+        self.assertEqual(self.filt.getExactMatches(),
+                         dict(branch=['br'], project=['p1', 'p2']))
+
+    def test_getExactMatches_default_branch(self):
+        self.setfilter(branch=None)
+        self.assertEqual(self.filt.getExactMatches(), dict(branch=[None]))
+
+    def test_getExactMatches_subclass(self):
+        class MyFilter(filter.ChangeFilter):
+            def filter_change(self, change):
+                return True
+        self.filt = MyFilter(branch='br')
+        self.assertEqual(self.filt.getExactMatches(), {})
@@ -169,3 +169,108 @@ class TestGitPoller(gpo.GetProcessOutputMixin,
         d.addCallback(check)
 
         return d
+
+class TestGitPollerBranches(gpo.GetProcessOutputMixin,
+                            changesource.ChangeSourceMixin,
+                            unittest.TestCase):
+
+    def setUp(self):
+        self.setUpGetProcessOutput()
+        d = self.setUpChangeSource()
+        def create_poller(_):
+            self.poller = gitpoller.GitPoller('git@example.com:foo/baz.git',
+                                              branches=['master', 'release'])
+            self.poller.master = self.master
+        d.addCallback(create_poller)
+        return d
+
+    def tearDown(self):
+        self.tearDownGetProcessOutput()
+        return self.tearDownChangeSource()
+
+    def add_heads(self, remote, seen):
+        lines = [ '%s refs/remotes/origin/%s' % (rev, branch)
+                  for branch, rev in remote ]
+        lines += [ '%s refs/buildbot/heads/%s' % (rev, branch)
+                   for branch, rev in seen ]
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'fetch'), '')
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'for-each-ref'),
+                '\n'.join(lines) + '\n')
+
+    def add_update_refs(self, count):
+        self.updated = []
+        def update_ref(bin, args, **kwargs):
+            self.updated.append(args[1:])
+            return ('', '', 0)
+        for i in range(count):
+            self.addGetProcessOutputAndValueResult(
+                    self.gpoSubcommandPattern('git', 'update-ref'), update_ref)
+
+    def log_output(self, *commits):
+        return ''.join([ '\x00%s\n1273258009\n%s\nsubject %s\n\x00\n\n%s\n'
+                         % (rev, who, rev, '\n'.join(files))
+                         for rev, who, files in commits ])
+
+    def test_describe(self):
+        self.assertSubstring("master, release", self.poller.describe())
+
+    def test_parse_branch_log(self):
+        chdicts = self.poller._parse_branch_log('release',
+                self.log_output(('abc', 'bob@example.com', ['a', 'b c']),
+                                ('def', 'sue@example.com', [])))
+        self.assertEqual([ (c['revision'], c['author'], c['files'],
+                            c['comments'], c['branch']) for c in chdicts ],
+                [ ('abc', 'bob@example.com', ['a', 'b c'], 'subject abc',
+                   'release'),
+                  ('def', 'sue@example.com', [], 'subject def', 'release') ])
+        self.assertEqual(chdicts[0]['when_timestamp'],
+                         epoch2datetime(1273258009))
+
+    def test_poll_first(self):
+        self.add_heads([ ('HEAD', 'aaa'), ('master', 'aaa'),
+                         ('release', 'bbb'), ('other', 'ccc') ], [])
+        self.add_update_refs(2)
+        d = self.poller.poll()
+        def check(_):
+            self.assertEqual(self.changes_added, [])
+            self.assertEqual(self.updated,
+                    [ ['refs/buildbot/heads/master', 'aaa'],
+                      ['refs/buildbot/heads/release', 'bbb'] ])
+        d.addCallback(check)
+        return d
+
+    def test_poll(self):
+        self.poller.branches = True
+        self.add_heads([ ('master', 'ccc'), ('release', 'bbb'),
+                         ('feature', 'ddd') ],
+                       [ ('master', 'aaa'), ('release', 'bbb'),
+                         ('gone', 'eee') ])
+        def log(bin, args, **kwargs):
+            rev = args[args.index('--not') - 1]
+            exclude = args[args.index('--not') + 1:]
+            exclude.sort()
+            if rev == 'ccc':
+                self.assertEqual(exclude, ['aaa'])
+                return self.log_output(('bbb2', 'bob', ['x']),
+                                       ('ccc', 'bob', ['y']))
+            self.assertEqual(exclude, ['aaa', 'bbb', 'eee'])
+            return self.log_output(('ddd', 'sue', ['z']))
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'log'), log)
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'log'), log)
+        self.add_update_refs(3)
+        d = self.poller.poll()
+        def check(_):
+            self.assertEqual([ (c['branch'], c['revision'])
+                               for c in self.changes_added ],
+                    [ ('feature', 'ddd'), ('master', 'bbb2'),
+                      ('master', 'ccc') ])
+            self.assertEqual(self.updated,
+                    [ ['refs/buildbot/heads/feature', 'ddd'],
+                      ['refs/buildbot/heads/master', 'ccc'],
+                      ['-d', 'refs/buildbot/heads/gone'] ])
+        d.addCallback(check)
+        return d
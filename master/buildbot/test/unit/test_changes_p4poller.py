@@ -215,6 +215,29 @@ class TestP4Poller(changesource.ChangeSourceMixin,
         d.addCallbacks(cb, eb)
         return d
 
+    def test_poll_failed_describe_adds_nothing(self):
+        # changes are added in one batch, so a failure describing change 3
+        # means change 2 will be described again next time, not lost
+        self.attachChangeSource(
+                P4Source(p4port=None, p4user=None,
+                         p4base='//depot/myproject/',
+                         split_file=lambda x: x.split('/', 1)))
+        self.add_p4_changes_result(second_p4changes)
+        self.add_p4_describe_result(3, 'Perforce client error:\n...')
+        self.update_p4_describe_results(p4change)
+
+        self.changesource.last_change = 1
+
+        d = self.changesource._poll()
+        def cb(_):
+            self.fail("_poll should have failed")
+        def eb(f):
+            f.trap(P4PollerError)
+            self.assertEquals(self.changes_added, [])
+            self.assertEquals(self.changesource.last_change, 1)
+        d.addCallbacks(cb, eb)
+        return d
+
     def test_poll_split_file(self):
         """Make sure split file works on branch only changes"""
         self.attachChangeSource(
@@ -14,10 +14,10 @@
 # Copyright Buildbot Team Members
 
 import os
-import xml.dom.minidom
 from twisted.internet import defer
 from twisted.trial import unittest
 from buildbot.test.util import changesource, gpo, compat
+from buildbot.test.fake import fakedb
 from buildbot.changes import svnpoller
 
 # this is the output of "svn info --xml
@@ -232,10 +232,10 @@ def make_changes_output(maxrevision):
     output = changes_output_template % ("".join(logs))
     return output
 
-def make_logentry_elements(maxrevision):
-    "return the corresponding logentry elements for the given revisions"
-    doc = xml.dom.minidom.parseString(make_changes_output(maxrevision))
-    return doc.getElementsByTagName("logentry")
+def make_logentries(maxrevision):
+    "return the corresponding LogEntry instances for the given revisions"
+    parser = svnpoller.LogParser()
+    return parser.feed(make_changes_output(maxrevision), final=True)
 
 def split_file(path):
     pieces = path.split("/")
@@ -252,7 +252,11 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
 
     def setUp(self):
         self.setUpGetProcessOutput()
-        return self.setUpChangeSource()
+        d = self.setUpChangeSource()
+        def setup_db(_):
+            self.master.db = fakedb.FakeDBConnector(self)
+        d.addCallback(setup_db)
+        return d
 
     def tearDown(self):
         self.tearDownGetProcessOutput()
@@ -310,13 +314,28 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
     def test_log_parsing(self):
         s = self.attachSVNPoller('file:///foo')
         output = make_changes_output(4)
-        entries = s.parse_logs(output)
-        # no need for elaborate assertions here; this is minidom's logic
-        self.assertEqual(len(entries), 4)
+        entries = list(s.parse_logs(output))
+        self.assertEqual([ e.revision for e in entries ], [4, 3, 2, 1])
+        self.assertEqual(entries[0].author, 'warner')
+        self.assertEqual(entries[0].msg, 'revised_to_2')
+        self.assertEqual(entries[0].paths,
+                         [ ('M', '/sample/trunk/version.c') ])
+
+    def test_log_parser_pieces(self):
+        output = make_changes_output(6)
+        parser = svnpoller.LogParser()
+        chunked = []
+        for i in range(0, len(output), 7):
+            chunked.extend(parser.feed(output[i:i+7]))
+        chunked.extend(parser.feed('', final=True))
+        chunked = [ (e.revision, e.author, e.msg, e.paths) for e in chunked ]
+        whole = [ (e.revision, e.author, e.msg, e.paths)
+                  for e in make_logentries(6) ]
+        self.assertEqual(chunked, whole)
 
     def test_get_new_logentries(self):
         s = self.attachSVNPoller('file:///foo')
-        entries = make_logentry_elements(4)
+        entries = make_logentries(4)
 
         s.last_change = 4
         new = s.get_new_logentries(entries)
@@ -331,7 +350,13 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
         s.last_change = 1
         new = s.get_new_logentries(entries)
         self.assertEqual(s.last_change, 4)
-        self.assertEqual(len(new), 3)
+        self.assertEqual([ e.revision for e in new ], [2, 3, 4])
+
+        # entries may arrive oldest first, as with --revision=N:HEAD
+        s.last_change = 2
+        new = s.get_new_logentries(reversed(entries))
+        self.assertEqual(s.last_change, 4)
+        self.assertEqual([ e.revision for e in new ], [3, 4])
 
         # special case: if last_change is None, then no new changes are queued
         s.last_change = None
@@ -345,7 +370,7 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
         s = self.attachSVNPoller(base, split_file=split_file)
         s._prefix = "sample"
 
-        logentries = dict(zip(xrange(1, 7), reversed(make_logentry_elements(6))))
+        logentries = dict(zip(xrange(1, 7), reversed(make_logentries(6))))
         changes = s.create_changes(reversed([ logentries[3], logentries[2] ]))
         self.failUnlessEqual(len(changes), 2)
         # note that parsing occurs in reverse
@@ -418,7 +443,10 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
         # and again with both r3 and r4 appearing together
         def setup_fourth(_):
             self.changes_added = []
-            self.add_svn_command_result('log', make_changes_output(4))
+            def log_output(bin, args, **kwargs):
+                self.assertIn('--revision=2:HEAD', args)
+                return make_changes_output(4)
+            self.add_svn_command_result('log', log_output)
         d.addCallback(setup_fourth)
         d.addCallback(lambda _ : s.poll())
         def check_fourth(_):
@@ -434,10 +462,29 @@ class TestSVNPoller(gpo.GetProcessOutputMixin,
             self.failUnlessEqual(c['files'], ["version.c"])
             self.failUnlessEqual(c['comments'], "revised_to_2")
             self.failUnlessEqual(s.last_change, 4)
+            self.master.db.state.assertState(s._objectid, last_change=4)
         d.addCallback(check_fourth)
 
         return d
 
+    def test_poll_restores_state(self):
+        self.master.db.state.fakeState(sample_base,
+                'buildbot.changes.svnpoller.SVNPoller', last_change=2)
+        s = self.attachSVNPoller(sample_base, split_file=split_file)
+
+        self.add_svn_command_result('info', sample_info_output)
+        def log_output(bin, args, **kwargs):
+            self.assertIn('--revision=2:HEAD', args)
+            return make_changes_output(4)
+        self.add_svn_command_result('log', log_output)
+        d = s.poll()
+        def check(_):
+            self.assertEqual([ c['revision'] for c in self.changes_added ],
+                             [ '3', '4' ])
+            self.failUnlessEqual(s.last_change, 4)
+        d.addCallback(check)
+        return d
+
     def test_cachepath_empty(self):
         cachepath = os.path.abspath('revcache')
         if os.path.exists(cachepath):
@@ -159,6 +159,27 @@ class TestChangesConnectorComponent(
         d.addCallback(check14)
         return d
 
+    def test_getChanges(self):
+        self.db.changes.getChangesChunkSize = 1
+        d = self.insertTestData(self.change13_rows + self.change14_rows)
+        d.addCallback(lambda _ : self.db.changes.getChanges([14, 13, 99]))
+        def check(chdicts):
+            self.assertEqual(sorted(chdicts), [13, 14])
+            self.assertEqual(chdicts[14], self.change14_dict)
+            self.assertEqual(sorted(chdicts[13]['links']),
+                    ['http://buildbot.net', 'http://sf.net/projects/buildbot'])
+            self.assertEqual(sorted(chdicts[13]['files']),
+                    ['master/README.txt', 'slave/README.txt'])
+            self.assertEqual(chdicts[13]['properties'],
+                    dict(notest=('no', 'Change')))
+        d.addCallback(check)
+        return d
+
+    def test_getChanges_empty(self):
+        d = self.db.changes.getChanges([])
+        d.addCallback(self.assertEqual, {})
+        return d
+
     def test_getLatestChangeid(self):
         d = self.insertTestData(self.change13_rows)
         def get(_):
@@ -251,6 +272,35 @@ class TestChangesConnectorComponent(
         d.addCallback(check_change_properties)
         return d
 
+    def test_addChanges(self):
+        d = self.db.changes.addChanges([
+            dict(author=u'dustin', files=[u'a.txt', u'b.txt'],
+                 comments=u'one', links=[u'http://slashdot.org'],
+                 revision=u'1', when_timestamp=epoch2datetime(266738400),
+                 branch=u'master', properties={u'p': (u'x', 'Change')}),
+            dict(author=u'warner', files=[u'c.txt'], comments=u'two',
+                 revision=u'2', when_timestamp=epoch2datetime(266738401),
+                 branch=u'master'),
+            ])
+        def check(changeids):
+            self.assertEqual(changeids, [1, 2])
+            return self.db.changes.getChanges(changeids)
+        d.addCallback(check)
+        def check_chdicts(chdicts):
+            self.assertEqual([ (c['author'], c['comments'], sorted(c['files']),
+                                c['links'], c['properties'])
+                               for c in [ chdicts[1], chdicts[2] ] ],
+                [ (u'dustin', u'one', [u'a.txt', u'b.txt'],
+                   [u'http://slashdot.org'], {u'p': (u'x', u'Change')}),
+                  (u'warner', u'two', [u'c.txt'], [], {}) ])
+        d.addCallback(check_chdicts)
+        return d
+
+    def test_addChanges_empty(self):
+        d = self.db.changes.addChanges([])
+        d.addCallback(self.assertEqual, [])
+        return d
+
     def test_addChange_when_timestamp_None(self):
         clock = task.Clock()
         clock.advance(1239898353)
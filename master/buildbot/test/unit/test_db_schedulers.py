@@ -163,6 +163,44 @@ class TestSchedulersConnectorComponent(
         d.addCallback(check)
         return d
 
+    def getClassificationRows(self):
+        def thd(conn):
+            tbl = self.db.model.scheduler_changes
+            q = tbl.select(order_by=[tbl.c.schedulerid, tbl.c.changeid])
+            return [ (row.schedulerid, row.changeid, row.important)
+                     for row in conn.execute(q).fetchall() ]
+        return self.db.pool.do(thd)
+
+    def test_classifyChangesForSchedulers(self):
+        d = self.insertTestData([
+            self.change3, self.change4, self.scheduler24,
+            fakedb.Scheduler(schedulerid=25),
+            fakedb.SchedulerChange(schedulerid=24, changeid=3, important=0),
+        ])
+        d.addCallback(lambda _ :
+                self.db.schedulers.classifyChangesForSchedulers({
+                    24 : { 3 : True, 4 : False },
+                    25 : { 4 : True } }))
+        d.addCallback(lambda _ : self.getClassificationRows())
+        d.addCallback(self.assertEqual,
+                [ (24, 3, 1), (24, 4, 0), (25, 4, 1) ])
+        return d
+
+    def test_flushChangeClassificationsForSchedulers(self):
+        d = self.insertTestData([ self.change3, self.change4,
+                                  self.change5, self.scheduler24,
+                                  fakedb.Scheduler(schedulerid=25),
+                                  fakedb.Scheduler(schedulerid=26) ])
+        d.addCallback(self.addClassifications, 24, (3, 1), (4, 0), (5, 1))
+        d.addCallback(self.addClassifications, 25, (3, 1), (5, 1))
+        d.addCallback(self.addClassifications, 26, (4, 1))
+        d.addCallback(lambda _ :
+            self.db.schedulers.flushChangeClassificationsForSchedulers(
+                    { 24 : 5, 25 : None }))
+        d.addCallback(lambda _ : self.getClassificationRows())
+        d.addCallback(self.assertEqual, [ (24, 5, 1), (26, 4, 1) ])
+        return d
+
     def test_flushChangeClassifications(self):
         d = self.insertTestData([ self.change3, self.change4,
                                   self.change5, self.scheduler24 ])
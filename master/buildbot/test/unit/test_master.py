@@ -90,6 +90,44 @@ class Subscriptions(dirs.DirsMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_addChanges(self):
+        chdicts = { 14 : dict(changeid=14), 15 : dict(changeid=15) }
+        self.master.db = mock.Mock()
+        self.master.db.changes.addChanges.return_value = \
+            defer.succeed([15, 14])
+        self.master.db.changes.getChanges.return_value = \
+            defer.succeed(chdicts)
+        self.patch(changes.Change, 'fromChdict',
+                classmethod(lambda cls, master, chdict :
+                                defer.succeed('change%d' % chdict['changeid'])))
+
+        delivered = []
+        self.master.subscribeToChanges(delivered.append)
+
+        d = self.master.addChanges([ dict(who='me'),
+                                     dict(author='you', when=892293875) ])
+        def check(changelist):
+            args, kwargs = self.master.db.changes.addChanges.call_args
+            self.assertEqual([ (c['author'], c['when_timestamp'])
+                               for c in args[0] ],
+                             [ ('me', None),
+                               ('you', epoch2datetime(892293875)) ])
+            self.master.db.changes.getChanges.assert_called_with([15, 14])
+            # changes come back in the order they were added
+            self.assertEqual(changelist, ['change15', 'change14'])
+            self.assertEqual(delivered, ['change15', 'change14'])
+        d.addCallback(check)
+        return d
+
+    def test_addChanges_empty(self):
+        self.master.db = mock.Mock()
+        d = self.master.addChanges([])
+        def check(changelist):
+            self.assertEqual(changelist, [])
+            self.assertFalse(self.master.db.changes.addChanges.called)
+        d.addCallback(check)
+        return d
+
     def do_test_addChange_args(self, args=(), kwargs={}, exp_db_kwargs={}):
         # add default arguments
         default_db_kwargs = dict(files=None, comments=None, author=None,
@@ -19,7 +19,7 @@ from twisted.trial import unittest
 from twisted.python import failure
 from twisted.internet import defer
 from buildbot.test.fake import fakedb, fakemaster
-from buildbot.process import builder, buildrequest
+from buildbot.process import builder
 from buildbot.db import buildrequests
 from buildbot.util import epoch2datetime
 
@@ -433,7 +433,7 @@ class TestBuilderBuildCreation(unittest.TestCase):
 
         fn = self.bldr._getMergeRequestsFn()
 
-        if fn == buildrequest.BuildRequest.canBeMergedWith:
+        if fn == builder.Builder._defaultMergeRequestFn:
             fn = "cbmw"
         elif fn is cble:
             fn = 'callable'
@@ -505,6 +505,38 @@ class TestBuilderBuildCreation(unittest.TestCase):
         yield wfd
         self.assertEqual(wfd.getResult(), [ brdicts[1] ])
 
+    @defer.deferredGenerator
+    def test_mergeRequests_default(self):
+        self.makeBuilder()
+        self.master.botmaster.mergeRequests = None
+        wfd = defer.waitForDeferred(
+            self.db.insertTestData([
+                fakedb.SourceStamp(id=234),
+                fakedb.Buildset(id=30, sourcestampid=234, reason='foo',
+                    submitted_at=1300305712, results=-1),
+                fakedb.BuildRequest(id=19, buildsetid=30, buildername='bldr',
+                    priority=13, submitted_at=1300305712, results=-1),
+                fakedb.BuildRequest(id=20, buildsetid=30, buildername='bldr',
+                    priority=13, submitted_at=1300305712, results=-1),
+            ]))
+        yield wfd
+        wfd.getResult()
+
+        wfd = defer.waitForDeferred(
+            defer.gatherResults([
+                self.db.buildrequests.getBuildRequest(id)
+                for id in (19, 20)
+            ]))
+        yield wfd
+        brdicts = wfd.getResult()
+
+        # requests for the same source stamp can be merged
+        wfd = defer.waitForDeferred(
+            self.bldr._mergeRequests(brdicts[0], brdicts,
+                                     self.bldr._getMergeRequestsFn()))
+        yield wfd
+        self.assertEqual(wfd.getResult(), brdicts)
+
     def test_mergeRequests_no_merging(self):
         self.makeBuilder()
         breq = dict(dummy=1)
@@ -132,6 +132,30 @@ class BaseBasicScheduler(CommonStuffMixin,
         d.addCallback(lambda _ : sched.stopService())
         return d
 
+    def test_startService_treeStableTimer_recovers_in_bulk(self):
+        sched = self.makeScheduler(self.Subclass, treeStableTimer=10)
+        sched.getTimerNameForChange = lambda change : change.branch
+        self.db.insertTestData([
+            fakedb.Change(changeid=20, branch='a'),
+            fakedb.Change(changeid=21, branch='a'),
+            fakedb.Change(changeid=22, branch='b'),
+        ])
+        self.db.schedulers.fakeClassifications(self.SCHEDULERID,
+                { 20 : False, 21 : True, 22 : False, 23 : True })
+        self.db.changes.getChange = lambda changeid : self.fail("getChange")
+        self.db.schedulers.classifyChanges = \
+                lambda *args : self.fail("classifyChanges")
+
+        d = sched.startService(_returnDeferred=True)
+        def check(_):
+            # only the timer with an important change is running, and the
+            # missing change 23 was ignored
+            self.assertEqual(sorted(k for k, v in sched._stable_timers.items()
+                                    if v), ['a'])
+        d.addCallback(check)
+        d.addCallback(lambda _ : sched.stopService())
+        return d
+
     def test_gotChange_no_treeStableTimer_unimportant(self):
         sched = self.makeScheduler(self.Subclass, treeStableTimer=None, branch='master')
 
@@ -17,6 +17,9 @@ import mock
 from twisted.trial import unittest
 from twisted.internet import defer
 from buildbot.schedulers import manager, base
+from buildbot.changes import filter
+from buildbot.test.fake import fakedb
+from buildbot.util import eventual
 
 class SchedulerManager(unittest.TestCase):
 
@@ -116,3 +119,134 @@ class SchedulerManager(unittest.TestCase):
         d.addCallback(check4)
 
         return d
+
+
+class ChangeClassifications(unittest.TestCase):
+
+    def setUp(self):
+        self.master = mock.Mock()
+        self.db = self.master.db = fakedb.FakeDBConnector(self)
+        self.writes = []
+        def classifyChangesForSchedulers(classifications):
+            self.writes.append(('classify', classifications))
+            return fakedb.FakeSchedulersComponent.classifyChangesForSchedulers(
+                    self.db.schedulers, classifications)
+        self.db.schedulers.classifyChangesForSchedulers = \
+                classifyChangesForSchedulers
+        self.sm = manager.SchedulerManager(self.master)
+
+    def test_batched(self):
+        fired = []
+        for schedulerid in 10, 11, 12:
+            d = self.sm.classifyChanges(schedulerid, { 3 : True })
+            d.addCallback(fired.append)
+        self.assertEqual(fired, [])
+        d = eventual.flushEventualQueue()
+        def check(_):
+            self.assertEqual(fired, [None] * 3)
+            self.assertEqual(self.writes, [
+                ('classify', { 10 : { 3 : True }, 11 : { 3 : True },
+                               12 : { 3 : True } }) ])
+            self.db.schedulers.assertClassifications(11, { 3 : True })
+        d.addCallback(check)
+        return d
+
+    def test_flush_drops_pending(self):
+        self.db.schedulers.fakeClassifications(10, { 1 : True })
+        self.sm.classifyChanges(10, { 2 : False, 3 : True })
+        self.sm.flushChangeClassifications(10, less_than=3)
+        self.sm.classifyChanges(10, { 4 : True })
+        d = eventual.flushEventualQueue()
+        def check(_):
+            self.assertEqual(self.writes, [
+                ('classify', { 10 : { 3 : True, 4 : True } }) ])
+            self.db.schedulers.assertClassifications(10,
+                                                     { 3 : True, 4 : True })
+        d.addCallback(check)
+        return d
+
+    def test_scheduler_uses_manager(self):
+        sch = base.BaseScheduler(name='s', builderNames=['x'], properties={})
+        sch._setUpScheduler(10, self.master, self.sm)
+        sch.classifyChanges({ 5 : False })
+        self.assertEqual(self.writes, [])
+        d = eventual.flushEventualQueue()
+        d.addCallback(lambda _ :
+            self.db.schedulers.assertClassifications(10, { 5 : False }))
+        return d
+
+
+class ChangeDispatcher(unittest.TestCase):
+
+    class Change(object):
+        def __init__(self, **kwargs):
+            self.project = self.repository = self.category = ''
+            self.branch = None
+            self.__dict__.update(kwargs)
+
+    def setUp(self):
+        self.master = mock.Mock()
+        self.dispatcher = manager.ChangeDispatcher(self.master)
+        self.got = []
+        self.filters_run = 0
+
+    def subscribe(self, name, **kwargs):
+        f = None
+        if kwargs:
+            # count the filters run, using filter_fn
+            def count(change):
+                self.filters_run += 1
+                return True
+            f = filter.ChangeFilter(filter_fn=count, **kwargs)
+        return self.dispatcher.subscribe(
+                lambda ch : self.got.append(name), f)
+
+    def test_indexed(self):
+        for i in range(10):
+            self.subscribe('b%d' % i, branch='b%d' % i)
+        self.subscribe('proj', project='p', branch_re='b.*')
+        self.subscribe('all')
+        self.dispatcher.deliver(self.Change(branch='b3', project='p'))
+        self.assertEqual(sorted(self.got), ['all', 'b3', 'proj'])
+        # only the candidates' filters were run
+        self.assertEqual(self.filters_run, 2)
+
+    def test_full_filter_still_applies(self):
+        self.subscribe('x', branch='b', project_re='p$')
+        self.dispatcher.deliver(self.Change(branch='b', project='q'))
+        self.assertEqual(self.got, [])
+
+    def test_subscribes_to_master(self):
+        sub1 = self.subscribe('a', branch='b')
+        sub2 = self.subscribe('b')
+        self.assertEqual(self.master.subscribeToChanges.call_count, 1)
+        sub1.unsubscribe()
+        self.assertFalse(self.master.subscribeToChanges.return_value.
+                         unsubscribe.called)
+        sub2.unsubscribe()
+        self.assertTrue(self.master.subscribeToChanges.return_value.
+                        unsubscribe.called)
+        self.assertEqual(self.dispatcher.index['branch'], {})
+
+    def test_scheduler_subscribes_through_manager(self):
+        sm = manager.SchedulerManager(self.master)
+        sch = base.BaseScheduler(name='s', builderNames=['x'], properties={})
+        sch._setUpScheduler(10, self.master, sm)
+        changes = []
+        def gotChange(change, important):
+            changes.append(change.branch)
+        sch.gotChange = gotChange
+        sch.startConsumingChanges(
+                change_filter=filter.ChangeFilter(branch='b'))
+        deliver = self.master.subscribeToChanges.call_args[0][0]
+        deliver(self.Change(branch='x'))
+        deliver(self.Change(branch='b'))
+        self.assertEqual(changes, ['b'])
+
+    def test_scheduler_timers_use_wheel(self):
+        sm = manager.SchedulerManager(self.master)
+        sch = base.BaseScheduler(name='s', builderNames=['x'], properties={})
+        sch._setUpScheduler(10, self.master, sm)
+        t = sch.callLater(10, lambda : None)
+        self.assertEqual(sm.timers.getDelayedCalls(), [t])
+        t.cancel()
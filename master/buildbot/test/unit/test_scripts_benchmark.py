@@ -0,0 +1,107 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+import textwrap
+from twisted.trial import unittest
+from buildbot.test.util import dirs
+from buildbot.scripts import benchmark
+from buildbot.util import json, epoch2datetime
+
+class Percentiles(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(benchmark.percentiles([]),
+                dict(count=0, max=None, p50=None, p90=None, p99=None))
+
+    def test_nearest_rank(self):
+        summary = benchmark.percentiles(range(100, 0, -1))
+        self.assertEqual(summary,
+                dict(count=100, max=100, p50=50, p90=90, p99=99))
+
+    def test_single(self):
+        self.assertEqual(benchmark.percentiles([3], points=(1, 50)),
+                dict(count=1, max=3, p1=3, p50=3))
+
+
+class Changes(dirs.DirsMixin, unittest.TestCase):
+
+    def setUp(self):
+        return self.setUpDirs('changes')
+
+    def tearDown(self):
+        return self.tearDownDirs()
+
+    def test_syntheticChanges(self):
+        changes = list(benchmark.syntheticChanges(3, branches=['a', 'b']))
+        self.assertEqual([ (c['revision'], c['branch']) for c in changes ],
+                         [ (u'1', 'a'), (u'2', 'b'), (u'3', 'a') ])
+
+    def test_loadChanges(self):
+        fn = os.path.join('changes', 'changes.json')
+        json.dump([ dict(author='me', files=['x'], when=1300000000) ],
+                  open(fn, 'w'))
+        self.assertEqual(benchmark.loadChanges(fn),
+                [ dict(author='me', files=['x'],
+                       when_timestamp=epoch2datetime(1300000000)) ])
+
+
+class Benchmark(dirs.DirsMixin, unittest.TestCase):
+
+    def setUp(self):
+        return self.setUpDirs('bmdir')
+
+    def tearDown(self):
+        return self.tearDownDirs()
+
+    def test_run(self):
+        configFile = os.path.join('bmdir', 'master.cfg')
+        open(configFile, 'w').write(textwrap.dedent("""\
+            from buildbot.buildslave import BuildSlave
+            from buildbot.schedulers.basic import SingleBranchScheduler
+            from buildbot.process.factory import BuildFactory
+            from buildbot.config import BuilderConfig
+            c = BuildmasterConfig = {}
+            c['slaves'] = [ BuildSlave('sl', 'pw', max_builds=1) ]
+            c['slavePortnum'] = 0
+            c['schedulers'] = [
+                SingleBranchScheduler(name='sched', branch='trunk',
+                        treeStableTimer=None, builderNames=['a', 'b']) ]
+            c['builders'] = [
+                BuilderConfig(name=n, slavenames=['sl'],
+                              factory=BuildFactory())
+                for n in 'ab' ]
+            """))
+        changes = list(benchmark.syntheticChanges(4,
+                                        branches=['trunk', 'other']))
+        bm = benchmark.Benchmark(configFile, changes, rate=0, settle=0.1)
+        d = bm.run()
+        def check(report):
+            self.assertEqual((report['changes'], report['buildsets'],
+                              report['buildrequests']), (4, 2, 4))
+            # every request was claimed and started
+            for stage in ('change-buildset', 'buildset-claim',
+                          'claim-start', 'change-start'):
+                self.assertNotEqual(report['latency'][stage]['count'], 0)
+            self.assertEqual(report['latency']['change-start']['count'], 4)
+            self.assertEqual(report['db']['changes']['addChanges'], 4)
+            self.assertTrue(report['db']['buildrequests']
+                                        ['claimBuildRequests'] >= 1)
+            self.assertNotEqual(report['reactor_lag']['count'], 0)
+            self.assertTrue('latency:' in benchmark.formatReport(report))
+            # the temporary basedir is gone
+            self.assertFalse(os.path.exists(bm.basedir))
+        d.addCallback(check)
+        return d
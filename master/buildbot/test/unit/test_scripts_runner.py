@@ -283,6 +283,43 @@ class TestCheckConfigOptions(unittest.TestCase):
         exp = dict(quiet=True, configFile='master.cfg')
         self.assertEqual(dict([(k, opts[k]) for k in exp]), exp)
 
+class TestBenchmarkOptions(unittest.TestCase):
+
+    def setUp(self):
+        self.options_file = {}
+        self.patch(runner, 'loadOptionsFile', lambda : self.options_file)
+
+    def parse(self, *args):
+        self.opts = runner.BenchmarkOptions()
+        self.opts.parseOptions(args)
+        return self.opts
+
+    def test_synopsis(self):
+        opts = runner.BenchmarkOptions()
+        self.assertIn('buildbot benchmark', opts.getSynopsis())
+
+    def test_defaults(self):
+        opts = self.parse()
+        exp = dict(configFile='master.cfg', changes=100, rate=10.0,
+                   branches=None, replay=None, json=False)
+        self.assertEqual(dict([(k, opts[k]) for k in exp]), exp)
+
+    def test_args(self):
+        opts = self.parse('-n', '5', '--rate', '0', '--branches', 'a,b',
+                          '--build-time', '1.5', 'foo.cfg')
+        exp = dict(configFile='foo.cfg', changes=5, rate=0.0,
+                   branches=['a', 'b'], **{'build-time' : 1.5})
+        self.assertEqual(dict([(k, opts[k]) for k in exp]), exp)
+
+    def test_basedir(self):
+        opts = self.parse(os.getcwd())
+        self.assertEqual(opts['configFile'],
+                         os.path.join(os.getcwd(), 'master.cfg'))
+
+    def test_bad_number(self):
+        self.assertRaises(runner.usage.UsageError,
+                          lambda : self.parse('--rate', 'fast'))
+
 class TestCheckConfig(unittest.TestCase):
 
     class FakeConfigLoader(object):
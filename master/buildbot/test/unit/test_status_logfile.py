@@ -13,11 +13,15 @@
 #
 # Copyright Buildbot Team Members
 
+import os
 import mock
 import cStringIO
+import cPickle
 from twisted.trial import unittest
 from twisted.internet import defer
 from buildbot.status import logfile
+from buildbot.util import eventual
+from buildbot.test.util import dirs
 
 class TestLogFileProducer(unittest.TestCase):
     def make_static_logfile(self, contents):
@@ -42,3 +46,100 @@ class TestLogFileProducer(unittest.TestCase):
 
     # Remainder of LogFileProduer has a wacky interface that's not
     # well-defined, so it's not tested yet
+
+
+class ChunkCollector(object):
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+    def unregisterProducer(self):
+        self.producer = None
+    def writeChunk(self, chunk):
+        self.chunks.append(chunk)
+    def finish(self):
+        self.finished = True
+
+class TestLogFileRanges(dirs.DirsMixin, unittest.TestCase):
+    def setUp(self):
+        self.setUpDirs('TestLogFileRanges')
+        step = mock.Mock()
+        step.build.builder.basedir = os.path.abspath('TestLogFileRanges')
+        self.lf = logfile.LogFile(step, 'stdio', 'log')
+        self.lf.chunkSize = 4
+        self.lf.addHeader('hdr\n')
+        self.lf.addStdout('0123456789')
+        self.lf.addStderr('err')
+
+    def tearDown(self):
+        return self.tearDownDirs()
+
+    def test_getTextLength(self):
+        self.assertEqual(self.lf.getTextLength(), 17)
+        self.assertEqual(self.lf.getTextLength([logfile.STDOUT]), 10)
+        # still-unmerged entries are counted too
+        self.lf.addStdout('ab')
+        self.assertEqual(self.lf.getTextLength([logfile.STDOUT]), 12)
+
+    def test_index_incremental(self):
+        self.lf.getTextLength()
+        indexed = len(self.lf._index)
+        self.lf.addStdout('abcdefgh')
+        self.lf.finish()
+        self.assertEqual(self.lf.getTextLength([logfile.STDOUT]), 18)
+        self.assertEqual(len(self.lf._index), indexed + 3)
+
+    def test_findTextOffset(self):
+        self.lf.finish()
+        offset, skip = self.lf.findTextOffset(6, [logfile.STDOUT])
+        f = self.lf.getFile()
+        f.seek(offset)
+        self.assertEqual(f.read(7), '5:04567')
+        self.assertEqual(skip, 2)
+
+    def subscribe(self, *args):
+        consumer = ChunkCollector()
+        self.lf.subscribeConsumer(consumer, *args)
+        d = eventual.flushEventualQueue()
+        d.addCallback(lambda _ : consumer)
+        return d
+
+    def test_subscribe_range(self):
+        self.lf.finish()
+        d = self.subscribe(3, 9, [logfile.STDOUT, logfile.STDERR])
+        def check(consumer):
+            self.assertEqual(consumer.chunks,
+                    [ (0, '3'), (0, '4567'), (0, '8') ])
+            self.assertTrue(consumer.finished)
+        d.addCallback(check)
+        return d
+
+    def test_subscribe_range_running(self):
+        d = self.subscribe(12, 100)
+        def check(consumer):
+            # the range ends with what has been logged so far
+            self.assertEqual(consumer.chunks, [ (0, '89'), (1, 'err') ])
+            self.assertTrue(consumer.finished)
+        d.addCallback(check)
+        return d
+
+    def test_subscribe_from_start_follows(self):
+        d = self.subscribe(15)
+        def check(consumer):
+            self.assertEqual(consumer.chunks, [ (1, 'rr') ])
+            self.assertFalse(consumer.finished)
+            self.lf.addStdout('more')
+            self.lf.finish()
+            self.assertEqual(consumer.chunks[1:], [ (0, 'more') ])
+            self.assertTrue(consumer.finished)
+        d.addCallback(check)
+        return d
+
+    def test_index_not_pickled(self):
+        self.lf.finish()
+        self.lf.getTextLength()
+        state = self.lf.__getstate__()
+        self.assertFalse('_index' in state)
+        cPickle.dumps(state)
+
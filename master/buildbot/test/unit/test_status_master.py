@@ -15,9 +15,41 @@
 
 import mock
 from twisted.trial import unittest
-from buildbot.status import master
+from buildbot.status import master, builder
+from buildbot.status.results import SUCCESS, FAILURE
 from buildbot.test.fake import fakedb
 
+class FakeBuild(object):
+    def __init__(self, number, finished, results, branch=None, slave='s1'):
+        self.number = number
+        self.finished = finished
+        self.results = results
+        self.ss = mock.Mock()
+        self.ss.branch = branch
+        self.slave = slave
+    def getNumber(self):
+        return self.number
+    def isFinished(self):
+        return True
+    def getTimes(self):
+        return (self.finished - 1, self.finished)
+    def getResults(self):
+        return self.results
+    def getSourceStamp(self):
+        return self.ss
+    def getSlavename(self):
+        return self.slave
+
+def makeBuilder(name, builds):
+    bs = builder.BuilderStatus(name)
+    bs.nextBuildNumber = len(builds)
+    bs.loaded = []
+    def getBuildByNumber(number):
+        bs.loaded.append(number)
+        return builds[number]
+    bs.getBuildByNumber = getBuildByNumber
+    return bs
+
 class TestStatus(unittest.TestCase):
 
     def makeStatus(self):
@@ -43,3 +75,58 @@ class TestStatus(unittest.TestCase):
             self.assertEqual([ bs.id for bs in bslist ], [ 91 ])
         d.addCallback(check)
         return d
+
+
+class TestGenerateFinishedBuilds(unittest.TestCase):
+
+    def setUp(self):
+        self.a = makeBuilder('a', [
+                FakeBuild(0, 10, SUCCESS),
+                FakeBuild(1, 30, FAILURE, branch='rel'),
+                FakeBuild(2, 50, FAILURE, slave='s2'),
+            ])
+        self.b = makeBuilder('b', [
+                FakeBuild(0, 20, FAILURE),
+                FakeBuild(1, 40, SUCCESS, branch='rel'),
+            ])
+        self.status = master.Status(mock.Mock(name='master'))
+        builders = dict(a=self.a, b=self.b)
+        self.status.getBuilderNames = lambda : sorted(builders)
+        self.status.getBuilder = builders.get
+
+    def generate(self, **kwargs):
+        return [ (b.getSlavename(), b.finished) for b in
+                 self.status.generateFinishedBuilds(**kwargs) ]
+
+    def test_merged(self):
+        self.assertEqual([ f for _, f in self.generate() ],
+                         [50, 40, 30, 20, 10])
+        self.assertEqual([ f for _, f in self.generate(num_builds=2) ],
+                         [50, 40])
+
+    def test_filters(self):
+        self.assertEqual(self.generate(results=[FAILURE]),
+                         [('s2', 50), ('s1', 30), ('s1', 20)])
+        self.assertEqual(self.generate(branches=['rel']),
+                         [('s1', 40), ('s1', 30)])
+        self.assertEqual(self.generate(slavenames=['s2']), [('s2', 50)])
+        self.assertEqual(self.generate(builders=['b'], finished_before=40),
+                         [('s1', 20)])
+
+    def test_filtered_builds_not_loaded(self):
+        self.generate()
+        self.a.loaded = []
+        self.b.loaded = []
+        self.generate(results=[FAILURE], branches=['rel'])
+        self.assertEqual((self.a.loaded, self.b.loaded), ([1], []))
+
+    def test_indexBuild(self):
+        self.a.indexBuild(FakeBuild(3, 60, FAILURE))
+        self.assertEqual(self.a.finishedIndex[3], (60, None, FAILURE, 's1'))
+
+    def test_indexBuild_capped(self):
+        self.a.finishedIndexSize = 2
+        for n in range(5):
+            self.a.nextBuildNumber = n + 1
+            self.a.indexBuild(FakeBuild(n, 10 * n, SUCCESS))
+        self.assertEqual(sorted(self.a.finishedIndex), [3, 4])
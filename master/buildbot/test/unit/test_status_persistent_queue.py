@@ -19,7 +19,7 @@ from twisted.trial import unittest
 from buildbot.test.util import dirs
 
 from buildbot.status.persistent_queue import MemoryQueue, DiskQueue, \
-    IQueue, PersistentQueue, WriteFile
+    IQueue, PersistentQueue, SegmentedDiskQueue, WriteFile
 
 class test_Queues(dirs.DirsMixin, unittest.TestCase):
 
@@ -144,4 +144,86 @@ class test_Queues(dirs.DirsMixin, unittest.TestCase):
         self._test_helper(PersistentQueue(MemoryQueue(3),
                                           DiskQueue('fake_dir', 5)))
 
+    def testSegmentedDiskQueue(self):
+        self._test_helper(SegmentedDiskQueue('fake_dir', maxItems=8,
+                                             segmentSize=3, syncInterval=2))
+
+    def testSegmentedPersistentQueue(self):
+        self._test_helper(PersistentQueue(MemoryQueue(3),
+                SegmentedDiskQueue('fake_dir', 5, segmentSize=2)))
+
+    def testSegmentedReload(self):
+        q = SegmentedDiskQueue('fake_dir', 10, segmentSize=3)
+        for i in range(7):
+            q.pushItem(i)
+        self.assertEqual([0, 1, 2, 3], q.popChunk(4))
+        q.save()
+        self.assertEqual(['1.seg', '2.seg', 'head'],
+                         sorted(os.listdir('fake_dir')))
+        q = SegmentedDiskQueue('fake_dir', 10, segmentSize=3)
+        self.assertEqual(3, q.nbItems())
+        self.assertEqual([4, 5, 6], q.items())
+        # Pushing continues in the last segment.
+        q.pushItem(7)
+        self.assertEqual([4, 5, 6, 7], q.popChunk())
+
+    def testSegmentedTornWrite(self):
+        q = SegmentedDiskQueue('fake_dir', 10)
+        q.pushItem('a')
+        q.pushItem('b')
+        q.save()
+        f = open(os.path.join('fake_dir', '0.seg'), 'ab')
+        f.write('\0\0\1\0partial')
+        f.close()
+        q = SegmentedDiskQueue('fake_dir', 10)
+        self.assertEqual(['a', 'b'], q.items())
+        q.pushItem('c')
+        self.assertEqual(['a', 'b', 'c'], q.popChunk())
+
+    def testSegmentedInsertBackPopped(self):
+        q = SegmentedDiskQueue('fake_dir', 10)
+        for i in range(4):
+            q.pushItem(['item', i])
+        chunk = q.popChunk(2)
+        self.assertEqual(None, q.insertBackChunk(chunk))
+        # The popped items were only stepped back over.
+        self.assertEqual(['0.seg', 'head'], sorted(os.listdir('fake_dir')))
+        self.assertEqual([['item', i] for i in range(4)], q.popChunk())
+
+    def testSegmentedInsertBackCrash(self):
+        q = SegmentedDiskQueue('fake_dir', 10)
+        for i in range(4):
+            q.pushItem(i)
+        self.assertEqual([0, 1], q.popChunk(2))
+        q.save()
+        compactHead = q._compactHead
+        def crash():
+            compactHead()
+            raise RuntimeError('crash')
+        q._compactHead = crash
+        self.assertRaises(RuntimeError, q.insertBackChunk, ['x'])
+        # The compacted segment is not skipped into.
+        q = SegmentedDiskQueue('fake_dir', 10)
+        self.assertEqual([2, 3], q.popChunk())
+
+    def testSegmentedPersistentQueueSave(self):
+        q = PersistentQueue(MemoryQueue(2),
+                SegmentedDiskQueue('fake_dir', 20))
+        for i in range(10):
+            q.pushItem(i)
+        self.assertEqual([0, 1, 2, 3, 4], q.popChunk(5))
+        # The memory queue is empty, so save only has to sync the disk queue.
+        q.save()
+        q = PersistentQueue(MemoryQueue(2),
+                SegmentedDiskQueue('fake_dir', 20))
+        self.assertEqual([5, 6, 7, 8, 9], q.items())
+        self.assertEqual([5, 6, 7, 8, 9], q.popChunk(5))
+
+    def testSegmentedImportsDiskQueue(self):
+        WriteFile(os.path.join('fake_dir', '3'), 'foo3')
+        WriteFile(os.path.join('fake_dir', '5'), 'foo5')
+        q = SegmentedDiskQueue('fake_dir', 5, pickleFn=str, unpickleFn=str)
+        self.assertEqual(['0.seg', 'head'], sorted(os.listdir('fake_dir')))
+        self.assertEqual(['foo3', 'foo5'], q.popChunk())
+
 # vim: set ts=4 sts=4 sw=4 et:
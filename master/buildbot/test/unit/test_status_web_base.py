@@ -14,7 +14,8 @@
 # Copyright Buildbot Team Members
 
 import mock
-from buildbot.status.web import base
+from buildbot.status.web import base, pagecache
+from buildbot.test.fake import web
 from twisted.internet import defer
 from twisted.trial import unittest
 
@@ -80,3 +81,27 @@ class ActionResource(unittest.TestCase):
         d.addErrback(check)
         return d
 
+class HtmlResource(unittest.TestCase):
+
+    def test_pageHeaders_cached(self):
+        class MyResource(base.HtmlResource):
+            pageCacheable = True
+            pageHeaders = {'Cache-Control' : 'no-cache'}
+            def getContext(self, request):
+                return {}
+            def content(self, request, cxt):
+                return 'page'
+
+        rsrc = MyResource()
+        cache = pagecache.PageCache()
+        requests = []
+        for i in range(2):
+            request = web.FakeRequest(prepath=['page'])
+            request.site.buildbot_service.pageCache = cache
+            rsrc.render(request)
+            requests.append(request)
+        self.assertEqual(cache.hits, 1)
+        for request in requests:
+            self.assertEqual(request.getWritten(), 'page')
+            self.assertEqual(request.responseHeaders['cache-control'],
+                             'no-cache')
@@ -0,0 +1,187 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+from twisted.trial import unittest
+from buildbot.status import builder
+from buildbot.status.web import console
+from buildbot.test.fake.web import FakeRequest
+
+class FakeChange(object):
+    def __init__(self, revision, when):
+        self.revision = revision
+        self.when = when
+
+class FakeLog(object):
+    def getName(self):
+        return 'stdio'
+
+class FakeStep(object):
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+    def getName(self):
+        return self.name
+    def getResults(self):
+        return (self.results, [self.name])
+    def getText(self):
+        return [self.name, '<b>failed</b>']
+    def getLogs(self):
+        return [FakeLog()]
+
+class FakeBuild(object):
+    def __init__(self, number, revision, results=builder.SUCCESS,
+                 finished=True):
+        self.number = number
+        self.results = results
+        self.finished = finished
+        self.properties = dict(got_revision=revision)
+        self.changes = [FakeChange(revision, 100 + number)]
+        self.steps = [ FakeStep('compile', results) ]
+    def getNumber(self):
+        return self.number
+    def getResults(self):
+        return self.results
+    def isFinished(self):
+        return self.finished
+    def getText(self):
+        return ['build']
+    def getETA(self):
+        return None
+    def getTimes(self):
+        return (100 + self.number, None)
+    def getProperty(self, name):
+        return self.properties[name]
+    def getChanges(self):
+        return self.changes
+    def getSteps(self):
+        return self.steps
+    def getLogs(self):
+        return [ l for s in self.steps for l in s.getLogs() ]
+
+class FakeBuilder(object):
+    def __init__(self, builds):
+        self.builds = dict((b.number, b) for b in builds)
+        self.nextBuildNumber = len(builds)
+        self.current = []
+        self.loaded = []
+    def getBuild(self, number):
+        self.loaded.append(number)
+        return self.builds.get(number)
+    def getCurrentBuilds(self):
+        return self.current
+
+class BuildSummary(unittest.TestCase):
+
+    def test_summary(self):
+        s = console.BuildSummary('bldr', FakeBuild(3, '30', builder.FAILURE))
+        self.assertEqual((s.getNumber(), s.getResults(), s.isFinished()),
+                         (3, builder.FAILURE, True))
+        self.assertEqual(s.getProperty('got_revision'), '30')
+        self.assertRaises(KeyError, lambda : s.getProperty('revision'))
+        self.assertEqual([ (c.revision, c.when) for c in s.getChanges() ],
+                         [ ('30', 103) ])
+        self.assertEqual(s.failures, dict(buildername='bldr',
+                status='compile failed', reason=['compile'],
+                logs=[dict(name='stdio', path='../builders/bldr/builds/3/'
+                                               'steps/compile/logs/stdio')]))
+
+    def test_no_failures(self):
+        s = console.BuildSummary('bldr', FakeBuild(3, '30'))
+        self.assertEqual(s.failures, {})
+
+class ConsoleIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = console.ConsoleIndex(max_builds=3)
+        self.builder = FakeBuilder([ FakeBuild(n, str(n * 10))
+                                     for n in range(5) ])
+
+    def numbers(self):
+        return [ s.getNumber()
+                 for s in self.index.getBuilds('bldr', self.builder) ]
+
+    def test_loads_history_once(self):
+        self.assertEqual(self.numbers(), [4, 3, 2, 1, 0])
+        self.builder.loaded = []
+        gen = self.index.getBuilds('bldr', self.builder)
+        self.assertEqual([ gen.next().getNumber() for i in range(3) ],
+                         [4, 3, 2])
+        # only max_builds are kept, but those are not loaded again
+        self.assertEqual(self.builder.loaded, [])
+
+    def test_buildFinished(self):
+        self.numbers()
+        b = FakeBuild(5, '50')
+        self.builder.builds[5] = b
+        self.builder.nextBuildNumber = 6
+        self.builder.loaded = []
+        self.index.buildFinished('bldr', b, builder.SUCCESS)
+        self.assertEqual(self.numbers()[:3], [5, 4, 3])
+        self.assertEqual(self.builder.loaded[:1], [2])
+
+    def test_running_builds_not_kept(self):
+        b = FakeBuild(5, '50', finished=False)
+        self.builder.builds[5] = b
+        self.builder.current = [b]
+        self.builder.nextBuildNumber = 6
+        self.assertEqual(self.numbers()[:2], [5, 4])
+        self.assertFalse(5 in self.index.builders['bldr'])
+        self.assertFalse(5 in self.builder.loaded)
+
+    def test_history_reset(self):
+        self.numbers()
+        self.index.checked.clear()
+        self.builder = FakeBuilder([ FakeBuild(0, 'x') ])
+        self.assertEqual(self.numbers(), [0])
+        self.assertEqual(self.builder.loaded, [0])
+
+    def test_save_load(self):
+        self.numbers()
+        filename = os.path.abspath('console.index')
+        self.index.save(filename)
+        index = console.ConsoleIndex()
+        index.load(filename)
+        self.builder.loaded = []
+        self.assertEqual([ (s.getNumber(), s.getChanges()[0].revision)
+                           for s in index.getBuilds('bldr', self.builder) ][:3],
+                         [ (4, '40'), (3, '30'), (2, '20') ])
+        self.assertEqual(self.builder.loaded[:1], [1])
+
+    def test_load_bad_file(self):
+        filename = os.path.abspath('console.index')
+        open(filename, 'w').write('garbage')
+        self.index.load(filename)
+        self.assertEqual(self.index.builders, {})
+        self.flushLoggedErrors()
+
+class ConsoleStatusResource(unittest.TestCase):
+
+    def test_getBuildsForRevision(self):
+        builds = [ FakeBuild(n, str(n * 10)) for n in range(5) ]
+        builds[3].results = builder.FAILURE
+        builds[3].steps = [ FakeStep('test', builder.FAILURE) ]
+        bldr = FakeBuilder(builds)
+        req = FakeRequest(prepath=['console'])
+        req.site.buildbot_service.consoleIndex = console.ConsoleIndex()
+        resource = console.ConsoleStatusResource()
+        debugInfo = dict(builds_scanned=0)
+        devBuilds = resource.getBuildsForRevision(req, bldr, 'bldr', '25',
+                                                  3, debugInfo)
+        self.assertEqual([ b.number for b in devBuilds ], [4, 3, 2])
+        self.assertEqual(debugInfo['builds_scanned'], 3)
+        self.assertEqual(devBuilds[1].details['logs'][0]['name'], 'stdio')
+        self.assertEqual(devBuilds[1].details['logs'][0]['url'],
+                '../builders/bldr/builds/3/steps/test/logs/stdio')
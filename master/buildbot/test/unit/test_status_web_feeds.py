@@ -0,0 +1,231 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+from twisted.trial import unittest
+from buildbot.status.builder import SUCCESS, FAILURE
+from buildbot.status.web import feeds, base
+from buildbot.test.fake.web import FakeRequest
+
+class FakeLog(object):
+    def __init__(self, text):
+        self.text = text
+        self.reads = 0
+    def getName(self):
+        return 'stdio'
+    def getText(self):
+        self.reads += 1
+        return self.text
+
+class FakeStep(object):
+    def __init__(self, name, results, logs=()):
+        self.name = name
+        self.results = results
+        self.logs = list(logs)
+    def getName(self):
+        return self.name
+    def getResults(self):
+        return (self.results, [])
+    def getLogs(self):
+        return self.logs
+
+class FakeSourceStamp(object):
+    branch = 'trunk'
+    revision = '12'
+    patch = None
+    changes = ()
+
+class FakeBuild(object):
+    def __init__(self, number, results, steps=()):
+        self.number = number
+        self.results = results
+        self.steps = list(steps)
+    def getNumber(self):
+        return self.number
+    def getTimes(self):
+        return (100 * self.number, 100 * self.number + 50)
+    def getResults(self):
+        return self.results
+    def isFinished(self):
+        return True
+    def getResponsibleUsers(self):
+        return ['bob']
+    def getSourceStamp(self):
+        return FakeSourceStamp()
+    def getProperty(self, name):
+        raise KeyError(name)
+    def getSteps(self):
+        return self.steps
+
+class FakeBuilder(object):
+    def __init__(self, name, results, category=None):
+        self.name = name
+        self.category = category
+        self.builds = [ FakeBuild(n, r) for n, r in enumerate(results) ]
+        self.nextBuildNumber = len(results)
+        self.loaded = []
+    def getBuild(self, number):
+        self.loaded.append(number)
+        return self.builds[number]
+
+class FakeStatus(object):
+    def __init__(self, builders):
+        self.builders = dict((b.name, b) for b in builders)
+    def getTitle(self):
+        return 'Project'
+    def getBuildbotURL(self):
+        return 'http://bb/'
+    def getBuilderNames(self, categories=None):
+        return [ n for n in sorted(self.builders)
+                 if not categories or self.builders[n].category in categories ]
+    def getBuilder(self, name):
+        return self.builders[name]
+
+class FeedEntry(unittest.TestCase):
+
+    def test_failure(self):
+        log = FakeLog('\n'.join([ 'line %d' % i for i in range(40) ]))
+        build = FakeBuild(3, FAILURE, [ FakeStep('compile', SUCCESS),
+                                        FakeStep('test', FAILURE, [log]) ])
+        entry = feeds.FeedEntry('bldr', build)
+        self.assertEqual(entry.failedSteps, ['test'])
+        self.assertEqual(entry.logLines[:2],
+                         ['Last lines of build log "stdio":', []])
+        self.assertEqual(entry.logLines[2:], [ u'line %d' % i
+                                               for i in range(10, 40) ])
+        self.assertEqual(entry.pageTitle,
+                'Branch trunk Revision 12  failed on "bldr"')
+        self.assertEqual(log.reads, 1)
+
+    def test_missing_log(self):
+        log = FakeLog(None)
+        def getText():
+            raise IOError
+        log.getText = getText
+        build = FakeBuild(3, FAILURE, [ FakeStep('test', FAILURE, [log]) ])
+        entry = feeds.FeedEntry('bldr', build)
+        self.assertEqual(entry.logLines[-1], u'** log file not available **')
+
+class FeedIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = feeds.FeedIndex(max_builds=2)
+
+    def finish(self, builderName, build):
+        self.index.buildFinished(builderName, build, build.getResults())
+
+    def test_keeps_failures(self):
+        for n, r in enumerate([FAILURE, SUCCESS, FAILURE, SUCCESS, SUCCESS]):
+            self.finish('b', FakeBuild(n, r))
+        self.assertEqual([ e.number for e in self.index.getEntries('b') ],
+                         [4, 3])
+        self.assertEqual([ e.number for e in
+                           self.index.getEntries('b', failures_only=True) ],
+                         [2, 0])
+        self.assertEqual(sorted(self.index.builders['b']), [0, 2, 3, 4])
+
+    def test_backfill(self):
+        builder = FakeBuilder('b', [FAILURE, SUCCESS, SUCCESS, SUCCESS,
+                                    SUCCESS])
+        d = self.index.backfill(FakeStatus([builder]), max_depth=4)
+        def check(_):
+            self.assertEqual(builder.loaded, [4, 3, 2, 1])
+            self.assertEqual([ e.number for e in self.index.getEntries('b') ],
+                             [4, 3])
+            self.assertFalse(self.index.backfilling)
+        d.addCallback(check)
+        return d
+
+    def test_backfill_stops_when_full(self):
+        self.finish('b', FakeBuild(0, FAILURE))
+        self.finish('b', FakeBuild(1, FAILURE))
+        builder = FakeBuilder('b', [FAILURE, FAILURE, SUCCESS, SUCCESS])
+        d = self.index.backfill(FakeStatus([builder]))
+        def check(_):
+            self.assertEqual(builder.loaded, [3, 2])
+        d.addCallback(check)
+        return d
+
+    def test_backfill_stale_index(self):
+        # an index saved before builds 2 and 3 finished
+        self.finish('b', FakeBuild(0, FAILURE))
+        self.finish('b', FakeBuild(1, FAILURE))
+        builder = FakeBuilder('b', [FAILURE, FAILURE, SUCCESS, FAILURE])
+        d = self.index.backfill(FakeStatus([builder]))
+        def check(_):
+            self.assertEqual(builder.loaded, [3, 2])
+            self.assertEqual([ e.number for e in self.index.getEntries('b') ],
+                             [3, 2])
+        d.addCallback(check)
+        return d
+
+    def test_backfill_failure(self):
+        builder = FakeBuilder('b', [SUCCESS])
+        def getBuild(number):
+            raise RuntimeError("oops")
+        builder.getBuild = getBuild
+        d = self.index.backfill(FakeStatus([builder]))
+        def check(_):
+            self.assertFalse(self.index.backfilling)
+            self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+        d.addCallback(check)
+        return d
+
+    def test_save_load(self):
+        self.finish('b', FakeBuild(0, FAILURE))
+        filename = os.path.abspath('feeds.index')
+        self.index.save(filename)
+        index = feeds.FeedIndex()
+        index.load(filename)
+        self.assertEqual([ e.number for e in index.getEntries('b') ], [0])
+
+class FeedResource(unittest.TestCase):
+
+    def setUp(self):
+        self.builders = [ FakeBuilder('a', [SUCCESS, FAILURE, SUCCESS]),
+                          FakeBuilder('b', [FAILURE, SUCCESS],
+                                      category='x') ]
+        self.status = FakeStatus(self.builders)
+        self.index = feeds.FeedIndex()
+        for b in self.builders:
+            for build in b.builds:
+                self.index.buildFinished(b.name, build, build.getResults())
+
+    def makeRequest(self, args={}):
+        req = FakeRequest(args=args)
+        req.site.buildbot_service.feedIndex = self.index
+        req.site.buildbot_service.templates = base.createJinjaEnv()
+        return req
+
+    def getBuilds(self, args={}):
+        resource = feeds.Rss20StatusResource(self.status)
+        return [ (e.builderName, e.number)
+                 for e in resource.getBuilds(self.makeRequest(args)) ]
+
+    def test_getBuilds(self):
+        self.assertEqual(self.getBuilds(),
+                [('a', 2), ('a', 1), ('b', 1), ('a', 0), ('b', 0)])
+        self.assertEqual(self.getBuilds({'failures_only' : ['true']}),
+                         [('a', 1), ('b', 0)])
+        self.assertEqual(self.getBuilds({'category' : ['x']}),
+                         [('b', 1), ('b', 0)])
+        # nothing was loaded from the builders
+        self.assertEqual([ b.loaded for b in self.builders ], [[], []])
+
+    def test_content(self):
+        resource = feeds.Atom10StatusResource(self.status)
+        xml = resource.content(self.makeRequest({'builder' : ['b']}))
+        self.assertIn('http://bb/builders/b/builds/1', xml)
+        self.assertNotIn('builders/a/builds', xml)
@@ -0,0 +1,126 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.trial import unittest
+from buildbot.sourcestamp import SourceStamp
+from buildbot.status import build, builder
+from buildbot.status.web import grid
+from buildbot.test.fake.web import FakeRequest
+
+class FakeBuild(build.BuildStatus):
+    # build_get_class needs a real BuildStatus
+    def __init__(self, bldr, number, revision, branch=None, finished=True):
+        self.builder = bldr
+        self.number = number
+        self.started = 100 * int(revision) + number
+        self.source = SourceStamp(branch=branch, revision=revision)
+        self.finished = finished
+        self.results = builder.SUCCESS
+        self.text = ['build', 'successful']
+    def getText(self):
+        return self.text
+    def isFinished(self):
+        return self.finished
+    def getSourceStamp(self, absolute=False):
+        return self.source
+    def getTimes(self):
+        return (self.started, None)
+
+class FakeBuilder(object):
+    category = None
+    def __init__(self, name, revisions):
+        self.name = name
+        self.builds = dict((n, FakeBuild(self, n, rev))
+                           for n, rev in enumerate(revisions))
+        self.nextBuildNumber = len(revisions)
+        self.loaded = []
+    def getName(self):
+        return self.name
+    def getBuild(self, number):
+        self.loaded.append(number)
+        return self.builds.get(number)
+    def getCurrentBuilds(self):
+        return [ b for b in self.builds.values() if not b.finished ]
+
+class FakeStatus(object):
+    def __init__(self, builders):
+        self.builders = dict((b.name, b) for b in builders)
+    def getBuilderNames(self):
+        return sorted(self.builders)
+    def getBuilder(self, name):
+        return self.builders[name]
+
+class GridStatusMixin(unittest.TestCase):
+
+    def setUp(self):
+        self.b1 = FakeBuilder('b1', ['1', '2', '2', '3'])
+        self.b2 = FakeBuilder('b2', ['1', '3'])
+        self.status = FakeStatus([self.b1, self.b2])
+        self.index = grid.GridIndex()
+        self.mixin = grid.GridStatusMixin()
+
+    def getGrid(self, numBuilds=5, branch=grid.ANYBRANCH):
+        req = FakeRequest()
+        req.site.buildbot_service.gridIndex = self.index
+        return self.mixin.getGrid(req, self.status, numBuilds, [], branch)
+
+    def test_grid(self):
+        stamps, cells = self.getGrid()
+        self.assertEqual([ ss.revision for ss in stamps ], ['1', '2', '3'])
+        # the newest build of each stamp
+        self.assertEqual([ e and e.getNumber() for e in cells['b1'] ],
+                         [0, 2, 3])
+        self.assertEqual([ e and e.getNumber() for e in cells['b2'] ],
+                         [0, None, 1])
+
+    def test_width(self):
+        stamps, cells = self.getGrid(numBuilds=2)
+        self.assertEqual([ ss.revision for ss in stamps ], ['2', '3'])
+        self.assertEqual([ e and e.getNumber() for e in cells['b2'] ],
+                         [None, 1])
+
+    def test_builds_loaded_once(self):
+        self.getGrid()
+        self.b1.loaded = []
+        self.getGrid()
+        self.assertEqual(self.b1.loaded, [])
+
+    def test_new_build(self):
+        self.getGrid()
+        b = FakeBuild(self.b2, 2, '4', finished=False)
+        self.b2.builds[2] = b
+        self.b2.nextBuildNumber = 3
+        stamps, cells = self.getGrid()
+        self.assertEqual(stamps[-1].revision, '4')
+        self.assertFalse(cells['b2'][-1].isFinished())
+        b.finished = True
+        self.index.buildFinished('b2', b, builder.SUCCESS)
+        self.b2.loaded = []
+        stamps, cells = self.getGrid()
+        self.assertTrue(cells['b2'][-1].isFinished())
+        self.assertEqual(self.b2.loaded, [])
+
+    def test_branch(self):
+        self.b1.builds[3].source.branch = 'rel'
+        stamps, cells = self.getGrid(branch='rel')
+        self.assertEqual([ ss.revision for ss in stamps ], ['3'])
+        self.assertEqual(cells['b2'], [None])
+
+    def test_build_cxt(self):
+        stamps, cells = self.getGrid()
+        req = FakeRequest(prepath=['grid'])
+        cxt = self.mixin.build_cxt(req, cells['b1'][0])
+        self.assertEqual(cxt, dict(name='b1', url='builders/b1/builds/0',
+                                   text=['OK'], **{'class' : 'success'}))
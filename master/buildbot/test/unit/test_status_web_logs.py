@@ -0,0 +1,191 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+import re
+import zlib
+import mock
+from twisted.trial import unittest
+from buildbot.status import logfile
+from buildbot.status.web import logs
+from buildbot.status.web.base import createJinjaEnv
+from buildbot.test.fake.web import FakeRequest
+from buildbot.util import eventual
+
+class TextLog(unittest.TestCase):
+
+    chunks = [ (logfile.HEADER, 'running "make"\n'),
+               (logfile.STDOUT, 'a < b && c > d\n'),
+               (logfile.STDERR, 'oops\n') ]
+
+    def setUp(self):
+        self.basedir = os.path.abspath('TextLog')
+        self.logs = 0
+
+    def makeLog(self, chunks, finished=True):
+        step = mock.Mock()
+        step.build.builder.basedir = self.basedir
+        self.logs += 1
+        log = logfile.LogFile(step, 'stdio', 'log%d' % self.logs)
+        # store the text in several chunks
+        log.chunkSize = 4
+        for channel, text in chunks:
+            log.addEntry(channel, text)
+        if finished:
+            log.finish()
+        return log
+
+    def render(self, log, asText=False, args={}, headers={}, pageSize=None):
+        req = FakeRequest(args=args, headers=headers)
+        req.site.buildbot_service.templates = createJinjaEnv()
+        resource = logs.TextLog(log)
+        if pageSize:
+            resource.pageSize = pageSize
+        if asText:
+            resource = resource.getChild('text', req)
+        resource.render_GET(req)
+        d = eventual.flushEventualQueue()
+        d.addCallback(lambda _ : req)
+        return d
+
+    def test_text(self):
+        d = self.render(self.makeLog(self.chunks), asText=True)
+        def check(req):
+            self.assertTrue(req.finished)
+            self.assertEqual(req.getWritten(), 'a < b && c > d\noops\n')
+            self.assertFalse('content-encoding' in req.responseHeaders)
+        d.addCallback(check)
+        return d
+
+    def test_html(self):
+        d = self.render(self.makeLog(self.chunks))
+        def check(req):
+            page = req.getWritten()
+            text = re.sub('</?span[^>]*>', '', page.split('<pre>')[1])
+            self.assertTrue(text.startswith('running &quot;make&quot;\n'
+                                            'a &lt; b &amp;&amp; c &gt; d\n'))
+            self.assertIn('<span class="stderr">oops</span>', page)
+            self.assertNotIn('load', page)
+            self.assertTrue(page.rstrip().endswith('</html>'))
+        d.addCallback(check)
+        return d
+
+    def test_html_unicode(self):
+        d = self.render(self.makeLog([ (logfile.STDOUT, u'\u2603') ]))
+        d.addCallback(lambda req :
+            self.assertIn('\xe2\x98\x83', req.getWritten()))
+        return d
+
+    def test_gzip(self):
+        d = self.render(self.makeLog(self.chunks), asText=True,
+                        headers={'Accept-Encoding' : 'gzip'})
+        def check(req):
+            self.assertEqual(req.responseHeaders['content-encoding'], 'gzip')
+            self.assertEqual(
+                    zlib.decompress(req.getWritten(), 16 + zlib.MAX_WBITS),
+                    'a < b && c > d\noops\n')
+        d.addCallback(check)
+        return d
+
+    def test_gzip_running_log(self):
+        log = self.makeLog(self.chunks[:2], finished=False)
+        d = self.render(log, asText=True, headers={'Accept-Encoding' : 'gzip'})
+        def check(req):
+            # what has been sent so far can be decompressed already
+            dec = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self.assertEqual(dec.decompress(req.getWritten()),
+                             'a < b && c > d\n')
+            log.addStderr('oops\n')
+            log.finish()
+            self.assertEqual(
+                    zlib.decompress(req.getWritten(), 16 + zlib.MAX_WBITS),
+                    'a < b && c > d\noops\n')
+        d.addCallback(check)
+        return d
+
+    def test_html_tail(self):
+        log = self.makeLog([ (logfile.STDOUT, 'abcdefghijklmnop') ])
+        d = self.render(log, pageSize=5)
+        def check(req):
+            page = req.getWritten()
+            self.assertIn('?start=6', page)
+            self.assertIn('11 bytes not shown', page)
+            self.assertEqual(page.count('<span'), 2)
+            self.assertIn('<span class="stdout">l</span>'
+                          '<span class="stdout">mnop</span>', page)
+        d.addCallback(check)
+        return d
+
+    def test_html_page(self):
+        log = self.makeLog([ (logfile.STDOUT, 'abcdefghijklmnop') ])
+        d = self.render(log, args={'start' : ['6']}, pageSize=5)
+        def check(req):
+            page = req.getWritten()
+            self.assertIn('<span class="stdout">gh</span>'
+                          '<span class="stdout">ijk</span>', page)
+            self.assertIn('href="?start=1"', page)
+            self.assertIn('href="?start=11">(load more)', page)
+        d.addCallback(check)
+        return d
+
+    def test_text_tail(self):
+        d = self.render(self.makeLog(self.chunks), asText=True,
+                        args={'tail' : ['7']})
+        d.addCallback(lambda req :
+                self.assertEqual(req.getWritten(), ' > d\noops\n'[-7:]))
+        return d
+
+    def test_range(self):
+        d = self.render(self.makeLog(self.chunks), asText=True,
+                        headers={'Range' : 'bytes=2-6',
+                                 'Accept-Encoding' : 'gzip'})
+        def check(req):
+            self.assertEqual(req.code, 206)
+            self.assertEqual(req.getWritten(), '< b &')
+            self.assertEqual(req.responseHeaders['content-range'],
+                             'bytes 2-6/20')
+            self.assertFalse('content-encoding' in req.responseHeaders)
+            self.assertTrue(req.finished)
+        d.addCallback(check)
+        return d
+
+    def test_range_suffix(self):
+        d = self.render(self.makeLog(self.chunks), asText=True,
+                        headers={'Range' : 'bytes=-3'})
+        def check(req):
+            self.assertEqual(req.getWritten(), 'ps\n')
+            self.assertEqual(req.responseHeaders['content-range'],
+                             'bytes 17-19/20')
+        d.addCallback(check)
+        return d
+
+    def test_range_unsatisfiable(self):
+        d = self.render(self.makeLog(self.chunks), asText=True,
+                        headers={'Range' : 'bytes=20-'})
+        def check(req):
+            self.assertEqual(req.code, 416)
+            self.assertEqual(req.responseHeaders['content-range'],
+                             'bytes */20')
+        d.addCallback(check)
+        return d
+
+    def test_parseRange(self):
+        self.assertEqual(logs._parseRange('bytes=0-', 10), (0, 9))
+        self.assertEqual(logs._parseRange('bytes=5-100', 10), (5, 9))
+        self.assertEqual(logs._parseRange('bytes=-20', 10), (0, 9))
+        self.assertEqual(logs._parseRange('bytes=0-1,4-5', 10), None)
+        self.assertEqual(logs._parseRange('lines=0-1', 10), None)
+        self.assertEqual(logs._parseRange('bytes=x-1', 10), None)
+        self.assertEqual(logs._parseRange('bytes=-0', 10), ())
@@ -0,0 +1,129 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+from twisted.trial import unittest
+from twisted.internet import defer, task
+from buildbot.status.web import pagecache
+
+class PageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.cache = pagecache.PageCache(max_age=60, max_size=3,
+                                         _reactor=self.clock)
+        self.computed = []
+
+    def compute(self, page):
+        def fn():
+            self.computed.append(page)
+            return page
+        return fn
+
+    def test_getKey(self):
+        req1 = mock.Mock()
+        req1.prepath = ['waterfall']
+        req1.args = { 'builder' : ['a', 'b'], 'reload' : ['30'] }
+        req2 = mock.Mock()
+        req2.prepath = ['waterfall']
+        req2.args = { 'reload' : ['30'], 'builder' : ['a', 'b'] }
+        self.assertEqual(self.cache.getKey(req1), self.cache.getKey(req2))
+        req2.args['builder'] = ['b', 'a']
+        self.assertNotEqual(self.cache.getKey(req1), self.cache.getKey(req2))
+
+    @defer.deferredGenerator
+    def test_cached(self):
+        wfd = defer.waitForDeferred(self.cache.get('k', self.compute('p1')))
+        yield wfd
+        self.assertEqual(wfd.getResult(), 'p1')
+        wfd = defer.waitForDeferred(self.cache.get('k', self.compute('p2')))
+        yield wfd
+        self.assertEqual(wfd.getResult(), 'p1')
+        self.assertEqual(self.computed, ['p1'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    @defer.deferredGenerator
+    def test_invalidated_by_events(self):
+        for event in [
+                lambda : self.cache.buildStarted('b', mock.Mock()),
+                lambda : self.cache.stepFinished(mock.Mock(), mock.Mock(), 0),
+                lambda : self.cache.buildFinished('b', mock.Mock(), 0),
+                lambda : self.cache.changeAdded(mock.Mock()),
+                lambda : self.cache.requestSubmitted(mock.Mock()),
+                ]:
+            wfd = defer.waitForDeferred(self.cache.get('k', self.compute('p')))
+            yield wfd
+            wfd.getResult()
+            event()
+        self.assertEqual(self.computed, ['p'] * 5)
+
+    def test_subscribes(self):
+        self.assertIdentical(self.cache.builderAdded('b', mock.Mock()),
+                             self.cache)
+        self.assertIdentical(self.cache.buildStarted('b', mock.Mock()),
+                             self.cache)
+
+    @defer.deferredGenerator
+    def test_expires(self):
+        wfd = defer.waitForDeferred(self.cache.get('k', self.compute('p1')))
+        yield wfd
+        wfd.getResult()
+        self.clock.advance(61)
+        wfd = defer.waitForDeferred(self.cache.get('k', self.compute('p2')))
+        yield wfd
+        self.assertEqual(wfd.getResult(), 'p2')
+
+    def test_concurrent(self):
+        d = defer.Deferred()
+        d1 = self.cache.get('k', lambda : d)
+        d2 = self.cache.get('k', self.compute('other'))
+        results = []
+        d1.addCallback(results.append)
+        d2.addCallback(results.append)
+        d.callback('p')
+        self.assertEqual(results, ['p', 'p'])
+        self.assertEqual(self.computed, [])
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_concurrent_failure(self):
+        d = defer.Deferred()
+        d1 = self.cache.get('k', lambda : d)
+        d2 = self.cache.get('k', self.compute('other'))
+        d.errback(RuntimeError("oops"))
+        self.assertFailure(d1, RuntimeError)
+        self.assertFailure(d2, RuntimeError)
+        # and the failure is not cached
+        d3 = self.cache.get('k', self.compute('p'))
+        d3.addCallback(self.assertEqual, 'p')
+        return defer.gatherResults([d1, d2, d3])
+
+    def test_invalidated_during_computation(self):
+        d = defer.Deferred()
+        self.cache.get('k', lambda : d)
+        self.cache.changeAdded(mock.Mock())
+        d.callback('stale')
+        d2 = self.cache.get('k', self.compute('fresh'))
+        d2.addCallback(self.assertEqual, 'fresh')
+        return d2
+
+    @defer.deferredGenerator
+    def test_max_size(self):
+        for i, key in enumerate('abcd'):
+            self.clock.advance(1)
+            wfd = defer.waitForDeferred(
+                    self.cache.get(key, self.compute(key)))
+            yield wfd
+            wfd.getResult()
+        self.assertEqual(sorted(self.cache.pages.keys()), ['b', 'c', 'd'])
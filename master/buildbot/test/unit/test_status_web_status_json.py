@@ -0,0 +1,308 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import gzip
+import mock
+import cStringIO
+from twisted.trial import unittest
+from twisted.internet import defer, reactor, task
+from buildbot.status.web import status_json
+from buildbot.test.fake.web import FakeRequest
+from buildbot.util import json
+
+class StatusEventHub(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = status_json.StatusEventHub(max_events=3)
+
+    def test_push_and_since(self):
+        for i in range(2):
+            self.hub.builderChangedState('b%d' % i, 'idle')
+        events, overflow = self.hub.getEventsSince(0)
+        self.assertEqual([ e['id'] for e in events ], [1, 2])
+        self.assertFalse(overflow)
+        events, overflow = self.hub.getEventsSince(1)
+        self.assertEqual([ e['builderName'] for e in events ], ['b1'])
+        self.assertEqual(events[0]['payload'], dict(state='idle'))
+        self.assertEqual(self.hub.getEventsSince(2), ([], False))
+
+    def test_overflow(self):
+        for i in range(5):
+            self.hub.builderChangedState('b', 'idle')
+        self.assertEqual(len(self.hub.events), 3)
+        self.assertEqual(self.hub.getEventsSince(1), ([], True))
+        events, overflow = self.hub.getEventsSince(2)
+        self.assertEqual([ e['id'] for e in events ], [3, 4, 5])
+        # an id from before a reconfig
+        self.assertEqual(self.hub.getEventsSince(10), ([], True))
+
+    def test_buildStarted_subscribes_with_eta(self):
+        builder = mock.Mock()
+        builder.getPendingBuildRequestStatuses.return_value = \
+                defer.succeed([1, 2])
+        self.hub.builderAdded('b', builder)
+        build = mock.Mock()
+        build.getNumber.return_value = 7
+        build.getText.return_value = ['building']
+        build.getResults.return_value = None
+        build.getTimes.return_value = (10, None)
+        build.getETA.return_value = 30
+        self.assertEqual(self.hub.buildStarted('b', build),
+                         (self.hub, self.hub.eta_interval))
+        self.assertEqual([ (e['event'], e['payload'].get('number'),
+                            e['payload'].get('count'))
+                           for e in self.hub.events ],
+                         [ ('buildStarted', 7, None),
+                           ('pendingBuilds', None, 2) ])
+
+
+class EventsJsonResource(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = status_json.StatusEventHub()
+        self.resource = status_json.EventsJsonResource(mock.Mock())
+
+    def makeRequest(self, args={}, headers={}):
+        req = FakeRequest(args=args, headers=headers)
+        req.site.buildbot_service.statusEvents = self.hub
+        req.site.buildbot_service.jsonCache = status_json.JsonCache()
+        return req
+
+    def render(self, req):
+        self.resource.render_GET(req)
+        if req.finished:
+            return json.loads(req.getWritten())
+
+    def test_immediate(self):
+        self.hub.builderChangedState('a', 'idle')
+        self.hub.builderChangedState('b', 'idle')
+        data = self.render(self.makeRequest({'since' : ['0'],
+                                             'builder' : ['b']}))
+        self.assertEqual([ e['builderName'] for e in data['events'] ], ['b'])
+        self.assertEqual(data['last'], 2)
+
+    def test_long_poll(self):
+        req = self.makeRequest({'since' : ['0'], 'event' : ['buildFinished']})
+        self.assertEqual(self.render(req), None)
+        self.hub.builderChangedState('a', 'idle')
+        self.assertFalse(req.finished)
+        build = mock.Mock()
+        build.getNumber.return_value = 3
+        build.getText.return_value = ['build', 'successful']
+        build.getResults.return_value = 0
+        build.getTimes.return_value = (10, 20)
+        build.getETA.return_value = None
+        self.hub.buildFinished('a', build, 0)
+        self.assertTrue(req.finished)
+        data = json.loads(req.getWritten())
+        self.assertEqual(data['events'][0]['payload']['number'], 3)
+        self.assertEqual(data['last'], 2)
+        self.assertEqual(self.hub.listeners, [])
+
+    def test_long_poll_timeout(self):
+        req = self.makeRequest({'since' : ['0'], 'timeout' : ['0']})
+        self.render(req)
+        d = defer.Deferred()
+        reactor.callLater(0.01, d.callback, None)
+        def check(_):
+            self.assertTrue(req.finished)
+            self.assertEqual(json.loads(req.getWritten()),
+                             dict(events=[], last=0))
+            self.assertEqual(self.hub.listeners, [])
+        d.addCallback(check)
+        return d
+
+    def test_long_poll_disconnect(self):
+        req = self.makeRequest({'since' : ['0']})
+        self.render(req)
+        req.connectionLost()
+        self.assertEqual(self.hub.listeners, [])
+
+    def test_overflow(self):
+        self.hub.max_events = 1
+        self.hub.builderChangedState('a', 'idle')
+        self.hub.builderChangedState('a', 'building')
+        data = self.render(self.makeRequest({'since' : ['0']}))
+        self.assertEqual(data, dict(events=[], last=2, overflow=True))
+
+    def test_last(self):
+        self.hub.builderChangedState('a', 'idle')
+        req = self.makeRequest()
+        self.resource.render_GET(req)
+        d = req.notifyFinish()
+        d.addCallback(lambda _ :
+                self.assertEqual(json.loads(req.getWritten()), dict(last=1)))
+        return d
+
+    def test_stream(self):
+        self.hub.builderChangedState('a', 'idle')
+        self.hub.builderChangedState('a', 'building')
+        req = self.makeRequest(headers={'Accept' : 'text/event-stream',
+                                        'Last-Event-ID' : '1'})
+        self.resource.render_GET(req)
+        self.assertEqual(req.responseHeaders['content-type'],
+                         'text/event-stream')
+        self.hub.builderChangedState('a', 'idle')
+        written = req.getWritten().split('\n\n')
+        self.assertEqual([ w.split('\n')[0] for w in written if w ],
+                         [ 'id: 2', 'id: 3' ])
+        req.connectionLost()
+        self.assertEqual(self.hub.listeners, [])
+
+    def test_stream_slow_client(self):
+        self.resource.max_buffer = 2
+        req = self.makeRequest({'stream' : ['1']})
+        self.resource.render_GET(req)
+        req.producer.pauseProducing()
+        self.hub.builderChangedState('a', 'idle')
+        self.hub.builderChangedState('a', 'building')
+        self.assertEqual(req.written, [])
+        req.producer.resumeProducing()
+        self.assertEqual(len(req.written), 2)
+        req.producer.pauseProducing()
+        for i in range(3):
+            self.hub.builderChangedState('a', 'idle')
+        # the buffer overflowed, so the stream was closed
+        self.assertTrue(req.finished)
+        self.assertEqual(len(req.written), 2)
+        self.assertEqual(self.hub.listeners, [])
+
+
+class FakeBuilderStatus(object):
+    slavenames = []
+    def __init__(self):
+        self.state = 'idle'
+    def getName(self):
+        return 'bldr'
+    def asDict_async(self):
+        return defer.succeed(dict(state=self.state))
+
+
+class JsonCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.cache = status_json.JsonCache(max_size=2, _reactor=self.clock)
+        self.builder = FakeBuilderStatus()
+        self.resource = status_json.BuilderJsonResource(mock.Mock(),
+                                                        self.builder)
+        self.calls = 0
+        asDict = self.resource.asDict
+        def countingAsDict(request):
+            self.calls += 1
+            return asDict(request)
+        self.resource.asDict = countingAsDict
+
+    def render(self, args={}, headers={}):
+        req = FakeRequest(args=args, headers=headers)
+        req.prepath = ['json', 'builders', 'bldr']
+        req.site.buildbot_service.jsonCache = self.cache
+        self.resource.render_GET(req)
+        self.assertTrue(req.finished)
+        return req
+
+    def test_memoized(self):
+        req1 = self.render()
+        req2 = self.render()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(req1.getWritten(), req2.getWritten())
+        self.assertEqual(json.loads(req2.getWritten()), dict(state='idle'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_args_are_part_of_key(self):
+        self.render()
+        req = self.render({'as_text' : ['1']})
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(req.responseHeaders['content-type'], 'text/plain')
+
+    def test_invalidated_by_builder_events(self):
+        self.render()
+        self.cache.builderChangedState('other', 'building')
+        self.render()
+        self.assertEqual(self.calls, 1)
+        self.builder.state = 'building'
+        self.cache.builderChangedState('bldr', 'building')
+        req = self.render()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(json.loads(req.getWritten()), dict(state='building'))
+
+    def test_select_uses_global_generation(self):
+        self.resource.putChild('x', status_json.BuilderJsonResource(
+                                        mock.Mock(), self.builder))
+        self.render({'select' : ['x']})
+        self.render({'select' : ['x']})
+        self.cache.changeAdded(mock.Mock())
+        self.render({'select' : ['x']})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_expires(self):
+        self.render()
+        self.clock.advance(self.resource.cache_seconds)
+        self.render()
+        self.assertEqual(self.calls, 2)
+
+    def test_etag(self):
+        etag = self.render().responseHeaders['etag']
+        req = self.render(headers={'If-None-Match' : '"x", %s' % etag})
+        self.assertEqual(req.code, 304)
+        self.assertEqual(req.getWritten(), '')
+        self.cache.builderChangedState('bldr', 'building')
+        self.builder.state = 'building'
+        req = self.render(headers={'If-None-Match' : etag})
+        self.assertNotEqual(req.code, 304)
+        self.assertNotEqual(req.responseHeaders['etag'], etag)
+
+    def test_gzip(self):
+        plain = self.render()
+        req = self.render(headers={'Accept-Encoding' : 'gzip, deflate'})
+        self.assertEqual(req.responseHeaders['content-encoding'], 'gzip')
+        self.assertNotEqual(req.responseHeaders['etag'],
+                            plain.responseHeaders['etag'])
+        body = gzip.GzipFile(
+                fileobj=cStringIO.StringIO(req.getWritten())).read()
+        self.assertEqual(body, plain.getWritten())
+
+    def test_max_size(self):
+        for i, key in enumerate('abc'):
+            self.clock.advance(1)
+            self.cache.put(key, 1, 'body', {})
+        self.assertEqual(sorted(self.cache.entries.keys()), ['b', 'c'])
+
+    def test_finished_build_generation(self):
+        build = mock.Mock()
+        build.isFinished.return_value = True
+        build.getSourceStamp.return_value.changes = []
+        resource = status_json.BuildJsonResource(mock.Mock(), build)
+        req = FakeRequest(prepath=['json', 'builders', 'bldr', 'builds', '7'])
+        g = resource.getGeneration(self.cache, req)
+        self.cache.buildStarted('bldr', build)
+        self.assertEqual(resource.getGeneration(self.cache, req), g)
+        build.isFinished.return_value = False
+        build.getBuilder.return_value = self.builder
+        g = resource.getGeneration(self.cache, req)
+        self.cache.stepFinished(build, mock.Mock(), 0)
+        self.assertNotEqual(resource.getGeneration(self.cache, req), g)
+
+    def test_relative_build_generation(self):
+        build = mock.Mock()
+        build.isFinished.return_value = True
+        build.getBuilder.return_value = self.builder
+        build.getSourceStamp.return_value.changes = []
+        resource = status_json.BuildJsonResource(mock.Mock(), build)
+        req = FakeRequest(prepath=['json', 'builders', 'bldr', 'builds', '-1'])
+        g = resource.getGeneration(self.cache, req)
+        # a newer build finishing changes what builds/-1 refers to
+        self.cache.buildFinished('bldr', mock.Mock(), 0)
+        self.assertNotEqual(resource.getGeneration(self.cache, req), g)
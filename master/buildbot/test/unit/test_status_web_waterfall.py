@@ -0,0 +1,144 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+from twisted.trial import unittest
+from buildbot.status.web import waterfall
+
+class FakeStep(object):
+    def __init__(self, started):
+        self.started = started
+    def getTimes(self):
+        return (self.started, None)
+
+class FakeChange(object):
+    def __init__(self, who):
+        self.who = who
+
+class FakeBuild(object):
+    def __init__(self, number, started, branch=None, who=()):
+        self.number = number
+        self.started = started
+        self.ss = mock.Mock()
+        self.ss.branch = branch
+        self.changes = [ FakeChange(w) for w in who ]
+        self.steps = [ FakeStep(started + 1), FakeStep(started + 2) ]
+    def getNumber(self):
+        return self.number
+    def getTimes(self):
+        return (self.started, None)
+    def getSourceStamp(self):
+        return self.ss
+    def getChanges(self):
+        return self.changes
+    def getSteps(self):
+        return self.steps
+
+class FakeBuilder(object):
+    def __init__(self, builds, category=None):
+        self.builds = dict((b.number, b) for b in builds)
+        self.nextBuildNumber = len(builds)
+        self.category = category
+        self.events = []
+        self.loaded = []
+    def getName(self):
+        return 'bldr'
+    def getCategory(self):
+        return self.category
+    def getBuild(self, number):
+        self.loaded.append(number)
+        return self.builds.get(number)
+    def getEvent(self, number):
+        try:
+            return self.events[number]
+        except IndexError:
+            return None
+
+class BuildTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.timeline = waterfall.BuildTimeline(max_builds=5)
+        self.builds = [ FakeBuild(n, 100 * n,
+                                  branch=['trunk', 'rel'][n % 2],
+                                  who=[n % 3 and 'bob' or 'sue'])
+                        for n in range(10) ]
+        self.builder = FakeBuilder(self.builds)
+
+    def boxes(self, **kwargs):
+        return list(self.timeline.eventGenerator(self.builder, **kwargs))
+
+    def test_order(self):
+        boxes = self.boxes()
+        b9, b8 = self.builds[9], self.builds[8]
+        self.assertEqual(boxes[:6],
+                [ b9.steps[1], b9.steps[0], b9, b8.steps[1], b8.steps[0], b8 ])
+        self.assertEqual(len(boxes), 30)
+
+    def test_indexed(self):
+        self.boxes()
+        tl = self.timeline.timelines['bldr']
+        self.assertEqual([ e.number for e in tl.entries ], [5, 6, 7, 8, 9])
+
+    def test_buildStarted(self):
+        self.boxes()
+        b = FakeBuild(10, 1000)
+        self.builder.builds[10] = b
+        self.builder.nextBuildNumber = 11
+        self.timeline.buildStarted('bldr', b)
+        tl = self.timeline.timelines['bldr']
+        self.assertEqual([ e.number for e in tl.entries ], [6, 7, 8, 9, 10])
+        self.assertIdentical(self.boxes()[2], b)
+
+    def test_maxTime_skips_newer_builds(self):
+        self.boxes()
+        self.builder.loaded = []
+        boxes = self.boxes(maxTime=750)
+        self.assertIdentical(boxes[2], self.builds[7])
+        # builds 8 and 9 were never loaded
+        self.assertEqual(self.builder.loaded[:2], [7, 6])
+
+    def test_branch_filter(self):
+        self.boxes()
+        self.builder.loaded = []
+        boxes = self.boxes(branches=['rel'])
+        self.assertEqual([ b.number for b in boxes if b in self.builds ],
+                         [9, 7, 5, 3, 1])
+        # indexed builds on other branches are not loaded
+        self.assertFalse(8 in self.builder.loaded)
+
+    def test_committer_filter(self):
+        boxes = self.boxes(committers=['sue'])
+        self.assertEqual([ b.number for b in boxes if b in self.builds ],
+                         [9, 6, 3, 0])
+
+    def test_category_filter(self):
+        self.builder.category = 'x'
+        event = mock.Mock()
+        event.getTimes.return_value = (50, None)
+        self.builder.events.append(event)
+        self.assertEqual(self.boxes(categories=['y']), [event])
+
+    def test_minTime(self):
+        boxes = self.boxes(minTime=700)
+        self.assertEqual([ b.number for b in boxes if b in self.builds ],
+                         [9, 8, 7])
+
+    def test_events_interleaved(self):
+        event = mock.Mock()
+        event.getTimes.return_value = (850, None)
+        self.builder.events.append(event)
+        boxes = self.boxes()
+        self.assertIdentical(boxes[3], event)
+        self.assertIdentical(boxes[4], self.builds[8].steps[1])
@@ -17,7 +17,8 @@ from twisted.trial import unittest
 
 from buildbot.interfaces import IRenderable
 from buildbot.process.properties import Properties, WithProperties
-from buildbot.steps.source import _ComputeRepositoryURL
+from buildbot.process.buildstep import LoggingBuildStep, LoggedRemoteCommand
+from buildbot.steps.source import _ComputeRepositoryURL, Source
 
 class SourceStamp(object):
     repository = "test"
@@ -70,3 +71,35 @@ class RepoURL(unittest.TestCase):
         self.assertEquals(self.build.render(url), "testbar")
 
 
+
+
+class SyncMode(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+        def startCommand(step, cmd, errorMessages=[]):
+            self.started.append(cmd)
+        self.patch(LoggingBuildStep, 'startCommand', startCommand)
+
+    def startSync(self, slave_version, **kwargs):
+        step = Source(mode='sync', **kwargs)
+        build = Build()
+        build.getSlaveCommandVersion = lambda cmd, oldversion: slave_version
+        build.getSlaveName = lambda : 'slave'
+        step.build = build
+        step.startCommand(LoggedRemoteCommand("git", step.args))
+        return self.started[0].args
+
+    def test_sync(self):
+        args = self.startSync("2.15", syncMethod='hardlink')
+        self.assertEqual(args['mode'], 'sync')
+        self.assertEqual(args['sync_method'], 'hardlink')
+
+    def test_sync_default_method(self):
+        args = self.startSync("2.15")
+        self.assertFalse('sync_method' in args)
+
+    def test_sync_old_slave(self):
+        args = self.startSync("2.14", syncMethod='hardlink')
+        self.assertEqual(args['mode'], 'copy')
+        self.assertFalse('sync_method' in args)
@@ -0,0 +1,109 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.trial import unittest
+from twisted.internet import task, error
+from buildbot.util import timerwheel
+
+class TimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = task.Clock()
+        self.wheel = timerwheel.TimerWheel(resolution=1, _reactor=self.clock)
+        self.fired = []
+
+    def fire(self, name):
+        self.fired.append((name, self.clock.seconds()))
+
+    def test_single_reactor_timer(self):
+        for i in range(100):
+            self.wheel.callLater(10 + i % 5, self.fire, i)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(10)
+        self.assertEqual([ n for n, t in self.fired ], range(0, 100, 5))
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.pump([1] * 4)
+        self.assertEqual(len(self.fired), 100)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_rounded_up(self):
+        self.clock.advance(0.5)
+        t = self.wheel.callLater(1.2, self.fire, 'a')
+        self.assertEqual(t.getTime(), 2)
+        self.clock.advance(1.2)
+        self.assertEqual(self.fired, [])
+        self.clock.advance(0.3)
+        self.assertEqual(self.fired, [('a', 2)])
+        self.assertFalse(t.active())
+
+    def test_earlier_timer_resets_reactor_timer(self):
+        self.wheel.callLater(10, self.fire, 'late')
+        self.wheel.callLater(2, self.fire, 'early')
+        self.clock.advance(2)
+        self.assertEqual(self.fired, [('early', 2)])
+        self.clock.advance(8)
+        self.assertEqual(self.fired, [('early', 2), ('late', 10)])
+
+    def test_cancel(self):
+        t1 = self.wheel.callLater(5, self.fire, 'a')
+        t2 = self.wheel.callLater(5, self.fire, 'b')
+        t1.cancel()
+        self.assertRaises(error.AlreadyCancelled, t1.cancel)
+        self.assertEqual(self.wheel.getDelayedCalls(), [t2])
+        t2.cancel()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.clock.advance(5)
+        self.assertEqual(self.fired, [])
+
+    def test_cancel_in_same_tick(self):
+        timers = []
+        def cancelOther():
+            self.fire('a')
+            timers[1].cancel()
+        timers.append(self.wheel.callLater(5, cancelOther))
+        timers.append(self.wheel.callLater(5, self.fire, 'b'))
+        self.clock.advance(5)
+        self.assertEqual(self.fired, [('a', 5)])
+        self.assertFalse(timers[1].active())
+
+    def test_rearm_churn(self):
+        # repeatedly re-arming a timer, as a tree-stable timer does
+        t = None
+        for i in range(50):
+            if t:
+                t.cancel()
+            t = self.wheel.callLater(10, self.fire, i)
+            self.clock.advance(0.25)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.clock.advance(11)
+        self.assertEqual([ n for n, _ in self.fired ], [49])
+
+    def test_call_from_timer(self):
+        def fire_and_add():
+            self.fire('a')
+            self.wheel.callLater(0, self.fire, 'b')
+        self.wheel.callLater(1, fire_and_add)
+        self.clock.advance(1)
+        self.clock.advance(0)
+        self.assertEqual(self.fired, [('a', 1), ('b', 1)])
+
+    def test_exception(self):
+        def fail():
+            raise RuntimeError("oops")
+        self.wheel.callLater(1, fail)
+        self.wheel.callLater(1, self.fire, 'a')
+        self.clock.advance(1)
+        self.assertEqual(self.fired, [('a', 1)])
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
@@ -22,7 +22,8 @@ class ChangeSourceMixin(object):
 
      - starting and stopping a ChangeSource service
      - a fake C{self.master.addChange}, which adds its args
-       to the list C{self.changes_added}
+       to the list C{self.changes_added}, and C{self.master.addChanges},
+       which adds each of its dictionaries
     """
 
     changesource = None
@@ -35,8 +36,12 @@ class ChangeSourceMixin(object):
             self.changes_added.append(kwargs)
             change = mock.Mock()
             return defer.succeed(change)
+        def addChanges(chdicts):
+            self.changes_added.extend(chdicts)
+            return defer.succeed([ mock.Mock() for chdict in chdicts ])
         self.master = mock.Mock()
         self.master.addChange = addChange
+        self.master.addChanges = addChanges
         return defer.succeed(None)
 
     def tearDownChangeSource(self):
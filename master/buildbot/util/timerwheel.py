@@ -0,0 +1,141 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import heapq, math
+from twisted.internet import reactor, error
+from twisted.python import log
+
+class WheelTimer(object):
+    """
+    A call scheduled with L{TimerWheel.callLater}.  Like an IDelayedCall, it
+    can be cancelled, and tested with C{active}.
+    """
+
+    def __init__(self, wheel, tick, seq, fn, args, kwargs):
+        self.wheel = wheel
+        self.tick = tick
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.called = False
+        self.cancelled = False
+
+    def getTime(self):
+        return self.tick * self.wheel.resolution
+
+    def active(self):
+        return not (self.called or self.cancelled)
+
+    def cancel(self):
+        if self.cancelled:
+            raise error.AlreadyCancelled
+        if self.called:
+            raise error.AlreadyCalled
+        self.cancelled = True
+        self.wheel._remove(self)
+
+class TimerWheel(object):
+    """
+    A timer wheel, for keeping many deadlines without a reactor DelayedCall
+    for each.
+
+    Deadlines are rounded up to the next multiple of C{resolution} seconds,
+    and kept in a bucket for that tick.  A heap holds the ticks with buckets,
+    and a single reactor timer is set for the earliest of them; when it
+    fires, every deadline that has expired is called, in the order they
+    were scheduled.  Scheduling and cancelling a deadline are constant-time
+    operations on its bucket, and never touch the reactor unless the
+    deadline is the earliest one.
+    """
+
+    def __init__(self, resolution=1, _reactor=reactor):
+        self.resolution = resolution
+        self._reactor = _reactor
+        # tick -> set of WheelTimers
+        self.buckets = {}
+        # heap of ticks; ticks whose buckets are gone are dropped lazily
+        self.ticks = []
+        self._seq = 0
+        # the reactor's DelayedCall, and the tick it was set for
+        self._timer = None
+        self._timerTick = None
+
+    def callLater(self, delay, fn, *args, **kwargs):
+        """Like C{reactor.callLater}, but the call may be up to
+        C{resolution} seconds late; returns a L{WheelTimer}."""
+        when = self._reactor.seconds() + delay
+        tick = int(math.ceil(when / self.resolution))
+        self._seq += 1
+        timer = WheelTimer(self, tick, self._seq, fn, args, kwargs)
+        bucket = self.buckets.get(tick)
+        if bucket is None:
+            bucket = self.buckets[tick] = set()
+            heapq.heappush(self.ticks, tick)
+        bucket.add(timer)
+        self._schedule()
+        return timer
+
+    def getDelayedCalls(self):
+        """Return the active L{WheelTimer}s"""
+        return [ t for bucket in self.buckets.itervalues() for t in bucket ]
+
+    def _remove(self, timer):
+        bucket = self.buckets.get(timer.tick)
+        if bucket is None:
+            return
+        bucket.discard(timer)
+        if not bucket:
+            del self.buckets[timer.tick]
+            # the reactor timer is left alone; if it fires with nothing due,
+            # it is simply set again
+            if not self.buckets and self._timer:
+                self._timer.cancel()
+                self._timer = None
+                self.ticks = []
+
+    def _schedule(self):
+        while self.ticks and self.ticks[0] not in self.buckets:
+            heapq.heappop(self.ticks)
+        if not self.ticks:
+            return
+        tick = self.ticks[0]
+        if self._timer:
+            if self._timerTick <= tick:
+                return
+            self._timer.cancel()
+        delay = max(0, tick * self.resolution - self._reactor.seconds())
+        self._timer = self._reactor.callLater(delay, self._fire)
+        self._timerTick = tick
+
+    def _fire(self):
+        self._timer = None
+        now = self._reactor.seconds()
+        due = []
+        while self.ticks and self.ticks[0] * self.resolution <= now:
+            bucket = self.buckets.pop(heapq.heappop(self.ticks), None)
+            if bucket:
+                due.extend(bucket)
+        due.sort(key=lambda t : (t.tick, t.seq))
+        for timer in due:
+            # an earlier call may have cancelled it
+            if timer.cancelled:
+                continue
+            timer.called = True
+            try:
+                timer.fn(*timer.args, **timer.kwargs)
+            except:
+                log.err(None, "while firing timer %r" % (timer.fn,))
+        self._schedule()
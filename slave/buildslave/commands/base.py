@@ -17,7 +17,6 @@
 import os
 from base64 import b64encode
 import sys
-import shutil
 
 from zope.interface import implements
 from twisted.internet import reactor, defer
@@ -27,12 +26,13 @@ from buildslave.interfaces import ISlaveCommand
 from buildslave import runprocess
 from buildslave.exceptions import AbandonChain
 from buildslave.commands import utils
+from buildslave.commands.fsengine import engine
 from buildslave import util
 
 # this used to be a CVS $-style "Revision" auto-updated keyword, but since I
 # moved to Darcs as the primary repository, this is updated manually each
 # time this file is changed. The last cvs_ver that was here was 1.51 .
-command_version = "2.13"
+command_version = "2.15"
 
 # version history:
 #  >=1.17: commands are interruptable
@@ -62,6 +62,9 @@ command_version = "2.13"
 #  >= 2.11: Arch, Bazaar, and Monotone removed
 #  >= 2.12: SlaveShellCommand no longer accepts 'keep_stdin_open'
 #  >= 2.13: SlaveFileUploadCommand supports option 'keepstamp'
+#  >= 2.14: rmdir accepts 'background', and source commands accept
+#           'background_clobber'; filesystem commands run in threads
+#  >= 2.15: source commands accept mode 'sync' and 'sync_method'
 
 class Command:
     implements(ISlaveCommand)
@@ -205,7 +208,16 @@ class SourceBaseCommand(Command):
         - ['workdir']:  (required) the subdirectory where the buildable sources
                         should be placed
 
-        - ['mode']:     one of update/copy/clobber/export, defaults to 'update'
+        - ['mode']:     one of update/copy/sync/clobber/export, defaults to
+                        'update'. 'sync' is like 'copy', but only replaces
+                        the files in the workdir which differ from those in
+                        the pristine source tree, rather than clobbering it
+
+        - ['sync_method']: for mode 'sync', how files are replaced: 'copy'
+                        (the default) makes reflink copies where the
+                        filesystem supports them and plain copies otherwise;
+                        'hardlink' links to the pristine tree, which is only
+                        safe if the build never modifies sources in place
 
         - ['revision']: (required) If not None, this is an int or string which indicates
                         which sources (along a time-like axis) should be used.
@@ -233,6 +245,10 @@ class SourceBaseCommand(Command):
                         reattempted, up to REPEATS times, after a delay of
                         DELAY seconds. This is intended to deal with slaves
                         that experience transient network failures.
+
+        - ['background_clobber']: if true, directories are clobbered by
+                        renaming them aside and removing them in the
+                        background, so the checkout can start immediately
     """
 
     sourcedata = ""
@@ -251,6 +267,8 @@ class SourceBaseCommand(Command):
         self.timeout = args.get('timeout', 120)
         self.maxTime = args.get('maxTime', None)
         self.retry = args.get('retry')
+        self.backgroundClobber = args.get('background_clobber', False)
+        self.syncMethod = args.get('sync_method', 'copy')
         self._commandPaths = {}
         # VC-specific subclasses should override this to extract more args.
         # Make sure to upcall!
@@ -273,7 +291,7 @@ class SourceBaseCommand(Command):
         self.command = None
 
         # self.srcdir is where the VC system should put the sources
-        if self.mode == "copy":
+        if self.mode in ("copy", "sync"):
             self.srcdir = "source" # hardwired directory name, sorry
         else:
             self.srcdir = self.workdir
@@ -304,6 +322,8 @@ class SourceBaseCommand(Command):
 
         if self.mode == "copy":
             d.addCallback(self.doCopy)
+        elif self.mode == "sync":
+            d.addCallback(self.doSync)
         if self.patch:
             d.addCallback(self.doPatch)
         d.addCallbacks(self._sendRC, self._checkAbandoned)
@@ -473,30 +493,14 @@ class SourceBaseCommand(Command):
         return res
 
     def doClobber(self, dummy, dirname, chmodDone=False):
-        # TODO: remove the old tree in the background
-##         workdir = os.path.join(self.builder.basedir, self.workdir)
-##         deaddir = self.workdir + ".deleting"
-##         if os.path.isdir(workdir):
-##             try:
-##                 os.rename(workdir, deaddir)
-##                 # might fail if deaddir already exists: previous deletion
-##                 # hasn't finished yet
-##                 # start the deletion in the background
-##                 # TODO: there was a solaris/NetApp/NFS problem where a
-##                 # process that was still running out of the directory we're
-##                 # trying to delete could prevent the rm-rf from working. I
-##                 # think it stalled the rm, but maybe it just died with
-##                 # permission issues. Try to detect this.
-##                 os.commands("rm -rf %s &" % deaddir)
-##             except:
-##                 # fall back to sequential delete-then-checkout
-##                 pass
         d = os.path.join(self.builder.basedir, dirname)
+        if self.backgroundClobber:
+            return self._runEngine(engine.removeDirectoryInBackground(d),
+                                   "rmdir")
         if runtime.platformType != "posix":
-            # if we're running on w32, use rmtree instead. It will block,
-            # but hopefully it won't take too long.
-            utils.rmdirRecursive(d)
-            return defer.succeed(0)
+            # there's no rm -rf here, so remove the tree in the filesystem
+            # engine's threads
+            return self._runEngine(engine.removeDirectory(d), "rmdir")
         command = ["rm", "-rf", d]
         c = runprocess.RunProcess(self.builder, command, self.builder.basedir,
                          sendRC=0, timeout=self.timeout, maxTime=self.maxTime,
@@ -546,10 +550,10 @@ class SourceBaseCommand(Command):
         if runtime.platformType != "posix":
             self.sendStatus({'header': "Since we're on a non-POSIX platform, "
             "we're not going to try to execute cp in a subprocess, but instead "
-            "use shutil.copytree(), which will block until it is complete.  "
+            "copy the tree in a thread.  "
             "fromdir: %s, todir: %s\n" % (fromdir, todir)})
-            shutil.copytree(fromdir, todir)
-            return defer.succeed(0)
+            return self._runEngine(engine.copyDirectory(fromdir, todir),
+                                   "copy")
 
         if not os.path.exists(os.path.dirname(todir)):
             os.makedirs(os.path.dirname(todir))
@@ -566,6 +570,29 @@ class SourceBaseCommand(Command):
         d.addCallback(self._abandonOnFailure)
         return d
 
+    def doSync(self, res):
+        # bring the workdir up to date with the pristine tree, replacing only
+        # the files that have changed
+        fromdir = os.path.join(self.builder.basedir, self.srcdir)
+        todir = os.path.join(self.builder.basedir, self.workdir)
+        self.sendStatus({'header': "synchronizing %s with %s\n"
+                                   % (todir, fromdir)})
+        d = engine.syncDirectory(fromdir, todir, method=self.syncMethod)
+        def done(count):
+            self.sendStatus({'header': "%d files updated\n" % count})
+        d.addCallback(done)
+        return self._runEngine(d, "sync")
+
+    def _runEngine(self, d, what):
+        # adapt a filesystem engine Deferred to the rc convention used by the
+        # rest of the VC chain
+        def eb(f):
+            f.trap(OSError, IOError)
+            self.sendStatus({'stderr': "%s failed: %s\n" % (what, f.value)})
+            raise AbandonChain(1)
+        d.addCallbacks(lambda _ : 0, eb)
+        return d
+
     def doPatch(self, res):
         patchlevel = self.patch[0]
         diff = self.patch[1]
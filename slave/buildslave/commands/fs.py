@@ -15,13 +15,26 @@
 
 import os
 import sys
-import shutil
 
 from twisted.internet import defer
 from twisted.python import runtime, log
 
 from buildslave import runprocess
-from buildslave.commands import base, utils
+from buildslave.exceptions import AbandonChain
+from buildslave.commands import base
+from buildslave.commands.fsengine import engine
+
+def _reportProgress(command, verb):
+    def progress(count):
+        command.sendStatus({'header': "%s %d files\n" % (verb, count)})
+    return progress
+
+def _abandonOnError(command, what):
+    def eb(f):
+        f.trap(OSError, IOError)
+        command.sendStatus({'stderr': "%s failed: %s\n" % (what, f.value)})
+        raise AbandonChain(1)
+    return eb
 
 class MakeDirectory(base.Command):
     """This is a Command which creates a directory. The args dict contains
@@ -42,12 +55,10 @@ class MakeDirectory(base.Command):
         assert args['dir'] is not None
         dirname = os.path.join(self.builder.basedir, args['dir'])
 
-        try:
-            if not os.path.isdir(dirname):
-                os.makedirs(dirname)
-            self.sendStatus({'rc': 0})
-        except:
-            self.sendStatus({'rc': 1})
+        d = engine.makeDirectory(dirname)
+        d.addCallbacks(lambda _ : self.sendStatus({'rc': 0}),
+                       lambda _ : self.sendStatus({'rc': 1}))
+        return d
 
 class RemoveDirectory(base.Command):
     """This is a Command which removes a directory. The args dict contains
@@ -61,6 +72,10 @@ class RemoveDirectory(base.Command):
 
         - ['maxTime']:  seconds before we kill off the command
 
+        - ['background']: if true, rename the directory aside and remove it
+                          in the background, so that the command completes
+                          almost immediately
+
 
     RemoveDirectory creates the following status messages:
         - {'rc': rc} : when the process has terminated
@@ -77,13 +92,17 @@ class RemoveDirectory(base.Command):
         self.timeout = args.get('timeout', 120)
         self.maxTime = args.get('maxTime', None)
 
-        # TODO: remove the old tree in the background
         self.dir = os.path.join(self.builder.basedir, dirname)
-        if runtime.platformType != "posix":
-            # if we're running on w32, use rmtree instead. It will block,
-            # but hopefully it won't take too long.
-            utils.rmdirRecursive(self.dir)
-            d = defer.succeed(0)
+        if args.get('background'):
+            d = engine.removeDirectoryInBackground(self.dir,
+                            progress=_reportProgress(self, "removed"))
+            d.addErrback(_abandonOnError(self, "rmdir"))
+        elif runtime.platformType != "posix":
+            # there's no rm -rf here, so remove the tree in the filesystem
+            # engine's threads
+            d = engine.removeDirectory(self.dir,
+                            progress=_reportProgress(self, "removed"))
+            d.addErrback(_abandonOnError(self, "rmdir"))
         else:
             d = self._clobber(None)
 
@@ -171,10 +190,11 @@ class CopyDirectory(base.Command):
         if runtime.platformType != "posix":
             self.sendStatus({'header': "Since we're on a non-POSIX platform, "
             "we're not going to try to execute cp in a subprocess, but instead "
-            "use shutil.copytree(), which will block until it is complete.  "
+            "copy the tree in a thread.  "
             "fromdir: %s, todir: %s\n" % (fromdir, todir)})
-            shutil.copytree(fromdir, todir)
-            d = defer.succeed(0)
+            d = engine.copyDirectory(fromdir, todir,
+                            progress=_reportProgress(self, "copied"))
+            d.addErrback(_abandonOnError(self, "copy"))
         else:
             if not os.path.exists(os.path.dirname(todir)):
                 os.makedirs(os.path.dirname(todir))
@@ -212,9 +232,9 @@ class StatFile(base.Command):
         assert args['file'] is not None
         filename = os.path.join(self.builder.basedir, args['file'])
 
-        try:
-            stat = os.stat(filename)
-            self.sendStatus({'stat': tuple(stat)})
+        d = engine.statFile(filename)
+        def sendStat(stat):
+            self.sendStatus({'stat': stat})
             self.sendStatus({'rc': 0})
-        except:
-            self.sendStatus({'rc': 1})
+        d.addCallbacks(sendStat, lambda _ : self.sendStatus({'rc': 1}))
+        return d
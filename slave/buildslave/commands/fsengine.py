@@ -0,0 +1,512 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+"""
+Filesystem operations that run in a thread pool, so that removing or copying
+large trees does not block the reactor (and with it, the keepalives and output
+of every other builder on this slave).
+"""
+
+import os
+import sys
+import stat
+import errno
+import shutil
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from twisted.internet import reactor, defer, threads
+from twisted.python import threadpool, log
+
+class Progress(object):
+    """
+    Count work done in the pool threads, and report it to C{callback} in the
+    reactor thread no more than once every C{interval} seconds.
+    """
+
+    def __init__(self, callback, interval, _reactor=reactor):
+        self.callback = callback
+        self.interval = interval
+        self.count = 0
+        self.last_report = time.time()
+        self.lock = threading.Lock()
+        self._reactor = _reactor
+
+    def update(self, n=1):
+        self.lock.acquire()
+        try:
+            self.count += n
+            now = time.time()
+            if self.callback is None or now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            count = self.count
+        finally:
+            self.lock.release()
+        self._reactor.callFromThread(self.callback, count)
+
+class FilesystemEngine(object):
+    """
+    Run filesystem operations in a private thread pool.  All methods return
+    Deferreds which fire in the reactor thread.  The pool is started on first
+    use and stopped when the reactor shuts down.
+    """
+
+    # maximum number of threads doing filesystem work at once
+    MAX_THREADS = 4
+
+    # number of files unlinked or copied by a single job in the pool
+    BATCH_SIZE = 500
+
+    # minimum number of seconds between progress reports
+    PROGRESS_INTERVAL = 5
+
+    # suffix used for directories that are being deleted in the background
+    DELETING_SUFFIX = ".buildbot-deleting"
+
+    _reactor = reactor
+
+    def __init__(self, maxthreads=None):
+        self.maxthreads = maxthreads or self.MAX_THREADS
+        self.pool = None
+        self.background = set()
+        self._serial = 0
+
+    def _getPool(self):
+        if self.pool is None:
+            self.pool = threadpool.ThreadPool(minthreads=0,
+                        maxthreads=self.maxthreads, name="buildslave-fs")
+            self.pool.start()
+            self._reactor.addSystemEventTrigger('during', 'shutdown',
+                        self.stop)
+        return self.pool
+
+    def stop(self):
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.stop()
+
+    def _run(self, f, *args, **kwargs):
+        return threads.deferToThreadPool(self._reactor, self._getPool(),
+                                         f, *args, **kwargs)
+
+    def _progress(self, callback):
+        return Progress(callback, self.PROGRESS_INTERVAL,
+                        _reactor=self._reactor)
+
+    def _batches(self, items):
+        for i in xrange(0, len(items), self.BATCH_SIZE):
+            yield items[i:i+self.BATCH_SIZE]
+
+    def _runBatches(self, f, items, *args):
+        """Run f(batch, *args) for each batch of items, in parallel"""
+        dl = [ self._run(f, batch, *args) for batch in self._batches(items) ]
+        if not dl:
+            return defer.succeed(None)
+        d = defer.DeferredList(dl, fireOnOneErrback=True, consumeErrors=True)
+        def unwrapFirstError(f):
+            f.trap(defer.FirstError)
+            return f.value.subFailure
+        d.addErrback(unwrapFirstError)
+        return d
+
+    # simple operations
+
+    def makeDirectory(self, path):
+        """Create C{path} and any missing parents"""
+        def mkdir():
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        return self._run(mkdir)
+
+    def statFile(self, path):
+        """Return the result of os.stat(C{path}), as a tuple"""
+        return self._run(lambda : tuple(os.stat(path)))
+
+    # removal
+
+    def removeDirectory(self, path, progress=None):
+        """
+        Remove the tree at C{path}, unlinking its files in parallel.  If
+        C{progress} is given, it is called periodically with the number of
+        files removed so far.  Missing paths are not an error.
+        """
+        prog = self._progress(progress)
+        d = self._run(_scanTree, path)
+        def unlinkFiles((files, dirs)):
+            d = self._runBatches(_unlinkFiles, files, prog)
+            d.addCallback(lambda _ : self._run(_removeDirs, dirs))
+            return d
+        d.addCallback(unlinkFiles)
+        d.addCallback(lambda _ : prog.count)
+        return d
+
+    def removeDirectoryInBackground(self, path, progress=None):
+        """
+        Rename C{path} out of the way and remove it in the background, so
+        that C{path} is free for re-use as soon as the returned Deferred
+        fires.  Trees left over from earlier background removals of the same
+        path (for example, if the slave was restarted) are removed as well.
+        If the rename fails, this falls back to L{removeDirectory}.
+        """
+        parent, name = os.path.split(os.path.abspath(path))
+        self._serial += 1
+        trash = os.path.join(parent, "%s%s.%d.%d" % (name,
+                            self.DELETING_SUFFIX, os.getpid(), self._serial))
+
+        def rename():
+            if not os.path.lexists(path):
+                return False
+            os.rename(path, trash)
+            return True
+        d = self._run(rename)
+
+        def renamed(res):
+            if res:
+                self._removeTrash(trash)
+            return self._removeLeftovers(parent, name)
+        def renameFailed(f):
+            f.trap(OSError)
+            log.msg("could not rename %s aside (%s); removing it in place"
+                    % (path, f.value))
+            return self.removeDirectory(path, progress)
+        d.addCallbacks(renamed, renameFailed)
+        return d
+
+    def _removeTrash(self, trash):
+        if trash in self.background:
+            return
+        self.background.add(trash)
+        d = self.removeDirectory(trash)
+        def done(res):
+            self.background.discard(trash)
+            return res
+        d.addBoth(done)
+        d.addErrback(log.err, "while removing %s in the background" % trash)
+
+    def _removeLeftovers(self, parent, name):
+        prefix = name + self.DELETING_SUFFIX + "."
+        def find():
+            try:
+                return [ os.path.join(parent, n) for n in os.listdir(parent)
+                         if n.startswith(prefix) ]
+            except OSError:
+                return []
+        d = self._run(find)
+        def removeAll(trashes):
+            for trash in trashes:
+                self._removeTrash(trash)
+        d.addCallback(removeAll)
+        d.addErrback(log.err, "while looking for old trees to remove")
+        return d
+
+    # copying
+
+    def copyDirectory(self, fromdir, todir, progress=None):
+        """
+        Copy the tree at C{fromdir} to C{todir}, which must not exist,
+        preserving symlinks, modes, and timestamps (like C{cp -R -P -p}).
+        Files are copied in parallel.  If C{progress} is given, it is called
+        periodically with the number of files copied so far.
+        """
+        prog = self._progress(progress)
+        d = self._run(_prepareCopy, fromdir, todir)
+        def copyFiles((files, dirs)):
+            d = self._runBatches(_copyFiles, files, prog)
+            # copy directory metadata last, since creating their contents
+            # changes their timestamps
+            d.addCallback(lambda _ : self._run(_copyDirStats, dirs))
+            return d
+        d.addCallback(copyFiles)
+        d.addCallback(lambda _ : prog.count)
+        return d
+
+    # synchronizing
+
+    def syncDirectory(self, fromdir, todir, method='copy', progress=None):
+        """
+        Make the tree at C{todir} identical to the tree at C{fromdir},
+        replacing only the files whose size, mode or modification time
+        differ, and removing anything in C{todir} that is not in C{fromdir}.
+
+        If C{method} is C{'copy'}, files are replaced with reflink copies
+        where the filesystem supports them, and with ordinary copies
+        otherwise.  If it is C{'hardlink'}, they are replaced with hard links
+        to the files in C{fromdir}; this is only safe if the build never
+        modifies source files in place.
+
+        If C{progress} is given, it is called periodically with the number
+        of files replaced so far.  The Deferred fires with the total.
+        """
+        assert method in ('copy', 'hardlink')
+        hardlink = (method == 'hardlink')
+        prog = self._progress(progress)
+        d = self._run(_prepareSync, fromdir, todir, hardlink)
+        def sync((stale_files, stale_dirs, mkdirs, links, files, dirs)):
+            d = self._runBatches(_unlinkFiles, stale_files, Progress(None, 0))
+            d.addCallback(lambda _ : self._run(_removeDirs, stale_dirs))
+            d.addCallback(lambda _ : self._run(_makeDirsAndLinks,
+                                               mkdirs, links))
+            d.addCallback(lambda _ : self._runBatches(_syncFiles, files,
+                                                      hardlink, prog))
+            d.addCallback(lambda _ : self._run(_copyDirStats, dirs))
+            return d
+        d.addCallback(sync)
+        d.addCallback(lambda _ : prog.count)
+        return d
+
+# the following functions run in the pool threads
+
+def _makeWritable(path):
+    # the directory containing a file must be writable to unlink it, and on
+    # Windows the file itself must be writable as well
+    for p in (os.path.dirname(path), path):
+        try:
+            os.chmod(p, 0700)
+        except OSError:
+            pass
+
+def _scanTree(path):
+    """
+    Return (files, dirs) for the tree at path, where files contains every
+    non-directory (including symlinks to directories), and dirs contains
+    every directory, children before their parents.
+    """
+    files = []
+    dirs = []
+    if not os.path.lexists(path):
+        return files, dirs
+    if os.path.islink(path) or not os.path.isdir(path):
+        return [path], dirs
+    stack = [path]
+    while stack:
+        dir = stack.pop()
+        try:
+            names = os.listdir(dir)
+        except OSError, e:
+            if e.errno not in (errno.EACCES, errno.EPERM):
+                raise
+            _makeWritable(dir)
+            names = os.listdir(dir)
+        dirs.append(dir)
+        for name in names:
+            full = os.path.join(dir, name)
+            if os.path.isdir(full) and not os.path.islink(full):
+                stack.append(full)
+            else:
+                files.append(full)
+    # every directory was appended before its children
+    dirs.reverse()
+    return files, dirs
+
+def _retryWritable(fn, path):
+    try:
+        fn(path)
+    except OSError, e:
+        if e.errno == errno.ENOENT:
+            return
+        if e.errno not in (errno.EACCES, errno.EPERM):
+            raise
+        _makeWritable(path)
+        fn(path)
+
+def _unlinkFiles(files, progress):
+    for path in files:
+        _retryWritable(os.remove, path)
+    progress.update(len(files))
+
+def _removeDirs(dirs):
+    for path in dirs:
+        _retryWritable(os.rmdir, path)
+
+def _prepareCopy(fromdir, todir):
+    """
+    Create the directory structure and symlinks of fromdir under todir, and
+    return (files, dirs): the (src, dst) pairs of regular files still to be
+    copied, and of the directories whose metadata should be copied.
+    """
+    if os.path.lexists(todir):
+        raise OSError(errno.EEXIST, "copy target already exists", todir)
+    files = []
+    dirs = []
+    stack = [(fromdir, todir)]
+    while stack:
+        src, dst = stack.pop()
+        os.mkdir(dst)
+        dirs.append((src, dst))
+        for name in os.listdir(src):
+            srcname = os.path.join(src, name)
+            dstname = os.path.join(dst, name)
+            if os.path.islink(srcname):
+                os.symlink(os.readlink(srcname), dstname)
+            elif os.path.isdir(srcname):
+                stack.append((srcname, dstname))
+            else:
+                files.append((srcname, dstname))
+    dirs.reverse()
+    return files, dirs
+
+def _copyFiles(files, progress):
+    for src, dst in files:
+        shutil.copy2(src, dst)
+    progress.update(len(files))
+
+def _copyDirStats(dirs):
+    for src, dst in dirs:
+        shutil.copystat(src, dst)
+
+def _collectStale(path, stale_files, stale_dirs):
+    files, dirs = _scanTree(path)
+    stale_files.extend(files)
+    stale_dirs.extend(dirs)
+
+def _unchanged(src_st, dst_st, hardlink):
+    if not stat.S_ISREG(dst_st.st_mode):
+        return False
+    same_file = (src_st.st_ino == dst_st.st_ino
+                 and src_st.st_dev == dst_st.st_dev)
+    if hardlink:
+        return same_file
+    # a hard link left over from an earlier sync with method='hardlink' is
+    # replaced, so that the build cannot modify the pristine tree
+    if same_file and src_st.st_ino != 0:
+        return False
+    return (src_st.st_size == dst_st.st_size
+            and int(src_st.st_mtime) == int(dst_st.st_mtime)
+            and stat.S_IMODE(src_st.st_mode) == stat.S_IMODE(dst_st.st_mode))
+
+def _prepareSync(fromdir, todir, hardlink):
+    """
+    Compare the trees at fromdir and todir, and return the work needed to
+    make todir match fromdir: (stale_files, stale_dirs, mkdirs, links, files,
+    dirs), where stale_files and stale_dirs are to be removed from todir,
+    mkdirs are directories to create, links are (target, path) symlinks to
+    create, files are (src, dst) pairs of files to replace, and dirs are the
+    (src, dst) pairs of directories whose metadata should be copied.
+    """
+    stale_files, stale_dirs = [], []
+    mkdirs, links, files, dirs = [], [], [], []
+
+    if os.path.lexists(todir) and (os.path.islink(todir)
+                                   or not os.path.isdir(todir)):
+        _collectStale(todir, stale_files, stale_dirs)
+    if not os.path.isdir(todir) or os.path.islink(todir):
+        mkdirs.append(todir)
+    created = set(mkdirs)
+
+    stack = [(fromdir, todir)]
+    while stack:
+        src, dst = stack.pop()
+        dirs.append((src, dst))
+        srcnames = os.listdir(src)
+        if dst in created:
+            dstnames = []
+        else:
+            dstnames = os.listdir(dst)
+        for name in set(dstnames) - set(srcnames):
+            _collectStale(os.path.join(dst, name), stale_files, stale_dirs)
+
+        for name in srcnames:
+            srcname = os.path.join(src, name)
+            dstname = os.path.join(dst, name)
+            src_st = os.lstat(srcname)
+            if dst in created:
+                dst_st = None
+            else:
+                try:
+                    dst_st = os.lstat(dstname)
+                except OSError:
+                    dst_st = None
+
+            if stat.S_ISLNK(src_st.st_mode):
+                target = os.readlink(srcname)
+                if dst_st is not None:
+                    if (stat.S_ISLNK(dst_st.st_mode)
+                            and os.readlink(dstname) == target):
+                        continue
+                    _collectStale(dstname, stale_files, stale_dirs)
+                links.append((target, dstname))
+            elif stat.S_ISDIR(src_st.st_mode):
+                if dst_st is not None and not stat.S_ISDIR(dst_st.st_mode):
+                    _collectStale(dstname, stale_files, stale_dirs)
+                    dst_st = None
+                if dst_st is None:
+                    mkdirs.append(dstname)
+                    created.add(dstname)
+                stack.append((srcname, dstname))
+            else:
+                if dst_st is not None:
+                    if _unchanged(src_st, dst_st, hardlink):
+                        continue
+                    _collectStale(dstname, stale_files, stale_dirs)
+                files.append((srcname, dstname))
+
+    # mkdirs is in parent-first order; dirs should have children first
+    dirs.reverse()
+    return stale_files, stale_dirs, mkdirs, links, files, dirs
+
+def _makeDirsAndLinks(mkdirs, links):
+    for path in mkdirs:
+        os.mkdir(path)
+    for target, path in links:
+        os.symlink(target, path)
+
+# from linux/fs.h
+FICLONE = 0x40049409
+
+def _cloneFile(src, dst):
+    """Make dst a reflink copy of src, sharing its data blocks, if the
+    platform and filesystem support it.  Return True on success."""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    srcf = open(src, 'rb')
+    try:
+        dstf = open(dst, 'wb')
+        try:
+            try:
+                fcntl.ioctl(dstf.fileno(), FICLONE, srcf.fileno())
+            except IOError:
+                cloned = False
+            else:
+                cloned = True
+        finally:
+            dstf.close()
+    finally:
+        srcf.close()
+    if not cloned:
+        os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+def _syncFiles(files, hardlink, progress):
+    for src, dst in files:
+        if hardlink:
+            try:
+                os.link(src, dst)
+                continue
+            except (OSError, AttributeError):
+                # different filesystems, or no os.link on this platform
+                pass
+        if not _cloneFile(src, dst):
+            shutil.copy2(src, dst)
+    progress.update(len(files))
+
+# the engine shared by all commands on this slave
+engine = FilesystemEngine()
@@ -14,13 +14,27 @@
 # Copyright Buildbot Team Members
 
 import os
+import re
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
 
 from twisted.internet import defer
 
 from buildslave.commands.base import SourceBaseCommand
-from buildslave import runprocess
+from buildslave import runprocess, util
 from buildslave.commands.base import AbandonChain
 
+# All builders on a slave run in the same process, so an in-memory lock per
+# shared cache directory is enough to keep them from fetching into it at the
+# same time.
+_cacheLocks = {}
+
+# the time at which the last successful fetch of each (cachedir, refspec)
+# into a shared cache was started
+_cacheFetchTimes = {}
+
 
 class Git(SourceBaseCommand):
     """Git specific VC operation. In addition to the arguments
@@ -41,8 +55,18 @@ class Git(SourceBaseCommand):
                                    requires Git 1.7.2 or later.
     ['shallow'] (optional):        if true, use shallow clones that do not
                                    also fetch history
+    ['shared_cache'] (optional):   if true, keep a bare mirror of the
+                                   repository in the slave's basedir, shared
+                                   by all builders, fetch into it first, and
+                                   use it as an alternate object store
+                                   (submodules get mirrors of their own)
+    ['submodule_jobs'] (optional): number of submodules to update at once.
+                                   Default: 1.
     """
 
+    # name of the directory, in the slave's basedir, holding shared caches
+    SHARED_CACHE_DIR = "git-cache"
+
     header = "git operation"
 
     def setup(self, args):
@@ -56,6 +80,9 @@ class Git(SourceBaseCommand):
         self.ignore_ignores = args.get('ignore_ignores', True)
         self.reference = args.get('reference', None)
         self.gerrit_branch = args.get('gerrit_branch', None)
+        self.sharedCache = args.get('shared_cache', False)
+        self.submoduleJobs = args.get('submodule_jobs', 1)
+        self._running = set()
 
     def _fullSrcdir(self):
         return os.path.join(self.builder.basedir, self.srcdir)
@@ -63,18 +90,33 @@ class Git(SourceBaseCommand):
     def sourcedirIsUpdateable(self):
         return os.path.isdir(os.path.join(self._fullSrcdir(), ".git"))
 
-    def _dovccmd(self, command, cb=None, **kwargs):
+    def _dovccmd(self, command, cb=None, workdir=None, **kwargs):
         git = self.getCommand("git")
-        c = runprocess.RunProcess(self.builder, [git] + command, self._fullSrcdir(),
+        if workdir is None:
+            workdir = self._fullSrcdir()
+        c = runprocess.RunProcess(self.builder, [git] + command, workdir,
                          sendRC=False, timeout=self.timeout,
                          maxTime=self.maxTime, usePTY=False, **kwargs)
         self.command = c
+        # several commands may be running at once, e.g. submodule updates, so
+        # keep track of all of them for interrupt()
+        self._running.add(c)
         d = c.start()
+        def finished(res):
+            self._running.discard(c)
+            return res
+        d.addBoth(finished)
         if cb:
             d.addCallback(self._abandonOnFailure)
             d.addCallback(cb)
         return d
 
+    def interrupt(self):
+        SourceBaseCommand.interrupt(self)
+        for c in list(self._running):
+            if c is not self.command:
+                c.kill("command interrupted")
+
     def sourcedataMatches(self):
         # If the repourl matches the sourcedata file, then we can say that the
         # sourcedata matches.  We can ignore branch changes, since Git can work
@@ -94,8 +136,97 @@ class Git(SourceBaseCommand):
         return self._dovccmd(command)
 
     def _updateSubmodules(self, res):
+        if self.submoduleJobs > 1 or self.sharedCache:
+            d = self._listSubmodules()
+            d.addCallback(self._updateSubmodulesInParallel)
+            d.addCallback(self._cleanSubmodules)
+            return d
         return self._dovccmd(['submodule', 'update'], self._cleanSubmodules)
 
+    def _getConfigRegexp(self, regexp, configfile=None):
+        # return a list of (name, value) for config keys of the form
+        # submodule.NAME.SUFFIX matching regexp
+        command = ['config']
+        if configfile:
+            command.extend(['-f', configfile])
+        command.extend(['--get-regexp', regexp])
+        d = self._dovccmd(command, keepStdout=True)
+        def parse(rc):
+            # git config exits with 1 if there are no matching keys
+            if rc == 1:
+                return []
+            self._abandonOnFailure(rc)
+            values = []
+            for line in self.command.stdout.splitlines():
+                mo = re.match(r'^submodule\.(.*)\.[a-z]+ (.*)$', line)
+                if mo:
+                    values.append(mo.groups())
+            return values
+        d.addCallback(parse)
+        return d
+
+    def _listSubmodules(self):
+        """Return a Deferred that fires with a list of (name, path, url) for
+        the submodules of this checkout"""
+        result = {}
+        d = self._getConfigRegexp(r'^submodule\..*\.path$', '.gitmodules')
+        def gotPaths(paths):
+            result['paths'] = paths
+            if not self.sharedCache:
+                return []
+            # 'submodule init' has copied the (resolved) urls to .git/config
+            return self._getConfigRegexp(r'^submodule\..*\.url$')
+        d.addCallback(gotPaths)
+        def gotUrls(urls):
+            urls = dict(urls)
+            return [ (name, path, urls.get(name))
+                     for name, path in result['paths'] ]
+        d.addCallback(gotUrls)
+        return d
+
+    def _updateSubmodulesInParallel(self, submodules):
+        jobs = max(1, self.submoduleJobs)
+        self.sendStatus({'header': "updating %d submodules, %d at a time\n"
+                                        % (len(submodules), jobs)})
+        sem = defer.DeferredSemaphore(jobs)
+        dl = [ sem.run(self._updateSubmodule, name, path, url)
+               for name, path, url in submodules ]
+        if not dl:
+            return defer.succeed(0)
+        d = defer.DeferredList(dl, fireOnOneErrback=True, consumeErrors=True)
+        def unwrapFirstError(f):
+            f.trap(defer.FirstError)
+            return f.value.subFailure
+        d.addCallbacks(lambda _ : 0, unwrapFirstError)
+        return d
+
+    def _updateSubmodule(self, name, path, url):
+        if self.interrupted:
+            raise AbandonChain(1)
+        started = util.now(self._reactor)
+        self.sendStatus({'header': "updating submodule %s\n" % (path,)})
+        if self.sharedCache and url:
+            d = self._updateSharedCache(url,
+                    '+refs/heads/*:%s' % self._sharedCacheRef('heads/*'))
+        else:
+            d = defer.succeed(False)
+        def update(cached):
+            command = ['submodule', 'update']
+            if cached:
+                command.extend(['--reference', self._sharedCacheDir(url)])
+            command.extend(['--', path])
+            return self._dovccmd(command)
+        d.addCallback(update)
+        def done(rc):
+            if rc != 0:
+                self.sendStatus({'header': "submodule %s failed\n" % (path,)})
+                raise AbandonChain(rc)
+            self.sendStatus({'header': "submodule %s updated in %0.1f secs\n"
+                        % (path, util.now(self._reactor) - started)})
+            return rc
+        d.addCallback(done)
+        return d
+
     def _initSubmodules(self, res):
         if self.submodules:
             return self._dovccmd(['submodule', 'init'], self._updateSubmodules)
@@ -144,9 +275,23 @@ class Git(SourceBaseCommand):
         return self._didClean(None)
 
     def _doFetch(self, dummy, branch):
+        if self.sharedCache:
+            d = self._updateSharedCache(self.repourl,
+                    '+%s:%s' % (branch, self._sharedCacheRef(branch)))
+            d.addCallback(lambda cached : self._fetch(branch, cached))
+            return d
+        return self._fetch(branch, False)
+
+    def _fetch(self, branch, fromCache):
         # The plus will make sure the repo is moved to the branch's
         # head even if it is not a simple "fast-forward"
-        command = ['fetch', '-t', self.repourl, '+%s' % branch]
+        if fromCache:
+            # the shared cache is up to date, so fetching from it is a
+            # local operation
+            command = ['fetch', '-t', self._sharedCacheDir(self.repourl),
+                       '+%s' % self._sharedCacheRef(branch)]
+        else:
+            command = ['fetch', '-t', self.repourl, '+%s' % branch]
         # If the 'progress' option is set, tell git fetch to output
         # progress information to the log. This can solve issues with
         # long fetches killed due to lack of output, but only works
@@ -154,9 +299,74 @@ class Git(SourceBaseCommand):
         if self.args.get('progress'):
             command.append('--progress')
         self.sendStatus({"header": "fetching branch %s from %s\n"
-                                        % (branch, self.repourl)})
+                                        % (branch, command[2])})
         return self._dovccmd(command, self._didFetch, keepStderr=True)
 
+    def _sharedCacheDir(self, repourl):
+        # the cache lives in the slave's basedir, not the builder's, so that
+        # all builders can use it
+        bot = getattr(self.builder, 'bot', None)
+        if bot is not None:
+            basedir = bot.basedir
+        else:
+            basedir = os.path.dirname(os.path.abspath(self.builder.basedir))
+        return os.path.abspath(os.path.join(basedir, self.SHARED_CACHE_DIR,
+                                            sha1(repourl).hexdigest()))
+
+    def _sharedCacheRef(self, branch):
+        # fetched branches are kept under their own namespace in the cache,
+        # so that 'git gc' there never drops objects the builders rely on
+        return 'refs/buildbot/%s' % branch
+
+    def _updateSharedCache(self, repourl, refspec):
+        """Fetch REFSPEC from REPOURL into its shared cache, and return a
+        Deferred that fires with True if the cache is now up to date, or False
+        if it could not be updated and the fetch should go directly to the
+        repository"""
+        cachedir = self._sharedCacheDir(repourl)
+        lock = _cacheLocks.setdefault(cachedir, defer.DeferredLock())
+        requested = util.now(self._reactor)
+        return lock.run(self._doUpdateSharedCache, cachedir, repourl, refspec,
+                        requested)
+
+    def _doUpdateSharedCache(self, cachedir, repourl, refspec, requested):
+        # if another builder started this fetch after we asked for it, while
+        # we waited for the lock, then the cache is already current
+        if _cacheFetchTimes.get((cachedir, refspec), -1) >= requested:
+            self.sendStatus({"header": "shared git cache %s is up to date\n"
+                                            % (cachedir,)})
+            return defer.succeed(True)
+
+        parent = os.path.dirname(cachedir)
+        d = defer.succeed(None)
+        if not os.path.isdir(cachedir):
+            d.addCallback(lambda _ :
+                    self._dovccmd(['init', '--bare', cachedir], workdir=parent))
+            d.addCallback(self._abandonOnFailure)
+
+        started = util.now(self._reactor)
+        command = ['--git-dir', cachedir, 'fetch', '-t', repourl, refspec]
+        if self.args.get('progress'):
+            command.append('--progress')
+        def fetch(_):
+            self.sendStatus({"header": "updating shared git cache %s\n"
+                                            % (cachedir,)})
+            return self._dovccmd(command, workdir=parent, keepStderr=True)
+        d.addCallback(fetch)
+        d.addCallback(self._abandonOnFailure)
+        def fetched(_):
+            _cacheFetchTimes[(cachedir, refspec)] = started
+            return True
+        def failed(f):
+            f.trap(AbandonChain)
+            if self.interrupted:
+                return f
+            self.sendStatus({"header": "could not update shared git cache; "
+                                       "fetching directly\n"})
+            return False
+        d.addCallbacks(fetched, failed)
+        return d
+
     def _didClean(self, dummy):
         branch = self.gerrit_branch or self.branch
 
@@ -174,11 +384,17 @@ class Git(SourceBaseCommand):
             return self._doFetch(None, branch)
 
     def _didInit(self, res):
-        # If we have a reference repository specified, we need to also set that
-        # up after the 'git init'.
+        # If we have a reference repository or shared cache specified, we
+        # need to also set that up after the 'git init'.
+        alternates = []
         if self.reference:
+            alternates.append(os.path.join(self.reference, 'objects'))
+        if self.sharedCache:
+            alternates.append(os.path.join(
+                        self._sharedCacheDir(self.repourl), 'objects'))
+        if alternates:
             git_alts_path = os.path.join(self._fullSrcdir(), '.git', 'objects', 'info', 'alternates')
-            git_alts_content = os.path.join(self.reference, 'objects')
+            git_alts_content = "\n".join(alternates)
             self.setFileContents(git_alts_path, git_alts_content)
         return self.doVCUpdate()
 
@@ -186,8 +402,10 @@ class Git(SourceBaseCommand):
         git = self.getCommand("git")
 
         # If they didn't ask for a specific revision, we can get away with a
-        # shallow clone.
-        if not self.args.get('revision') and self.args.get('shallow'):
+        # shallow clone.  With a shared cache, a full history is nearly free,
+        # and shallow repositories cannot use it anyway.
+        if (not self.args.get('revision') and self.args.get('shallow')
+                and not self.sharedCache):
             cmd = [git, 'clone', '--depth', '1']
             # If we have a reference repository, pass it to the clone command
             if self.reference:
@@ -27,8 +27,12 @@ import traceback
 import stat
 from collections import deque
 
-from twisted.python import runtime, log
+from twisted.python import runtime, log, filepath
 from twisted.internet import reactor, defer, protocol, task, error
+try:
+    from twisted.internet import inotify
+except ImportError:
+    inotify = None
 
 from buildslave import util
 from buildslave.exceptions import AbandonChain
@@ -61,6 +65,13 @@ def shell_quote(cmd_list):
 class LogFileWatcher:
     POLL_INTERVAL = 2
 
+    # amount of data to read from the logfile in one go
+    READ_SIZE = 64*1024
+
+    # on platforms with inotify, watch for changes to the logfile rather than
+    # polling it with os.stat.  Set this to False to always poll.
+    USE_INOTIFY = True
+
     def __init__(self, command, name, logfile, follow=False):
         self.command = command
         self.name = name
@@ -77,11 +88,52 @@ class LogFileWatcher:
         # added since we started watching
         self.follow = follow
 
-        # every 2 seconds we check on the file again
+        # every 2 seconds we check on the file again, unless inotify is
+        # available, in which case we are told when it changes
         self.poller = task.LoopingCall(self.poll)
+        self.notifier = None
 
     def start(self):
-        self.poller.start(self.POLL_INTERVAL).addErrback(self._cleanupPoll)
+        if self.USE_INOTIFY and inotify is not None:
+            self.notifier = self._startNotifier()
+        if self.notifier is None:
+            self.poller.start(self.POLL_INTERVAL).addErrback(self._cleanupPoll)
+        else:
+            self.poller = None
+            # pick up anything written before the watch was established
+            self.poll()
+
+    def _startNotifier(self):
+        # watch the directory containing the logfile, since the file itself
+        # may not exist yet, or may be deleted and re-created by the build
+        dirname, self._basename = os.path.split(os.path.abspath(self.logfile))
+        notifier = None
+        try:
+            notifier = inotify.INotify()
+            notifier.startReading()
+            notifier.watch(filepath.FilePath(dirname),
+                           mask=(inotify.IN_MODIFY | inotify.IN_CREATE
+                               | inotify.IN_MOVED_TO | inotify.IN_CLOSE_WRITE
+                               | inotify.IN_ATTRIB),
+                           callbacks=[self._notified])
+        except Exception, e:
+            # no inotify support in the kernel, the directory does not exist
+            # yet, or we are out of watches; fall back to polling
+            log.msg("LogFileWatcher falling back to polling %s: %s"
+                    % (self.logfile, e))
+            if notifier is not None:
+                notifier.loseConnection()
+            return None
+        return notifier
+
+    def _notified(self, ignored, path, mask):
+        # events may still be delivered in the same batch after stop()
+        if self.notifier is None or path.basename() != self._basename:
+            return
+        try:
+            self.poll()
+        except Exception:
+            log.err(None, "while reading %s" % (self.logfile,))
 
     def _cleanupPoll(self, err):
         log.err(err, msg="Polling error")
@@ -89,6 +141,9 @@ class LogFileWatcher:
 
     def stop(self):
         self.poll()
+        if self.notifier is not None:
+            self.notifier.loseConnection()
+            self.notifier = None
         if self.poller is not None:
             self.poller.stop()
         if self.started:
@@ -120,7 +175,7 @@ class LogFileWatcher:
             self.started = True
         self.f.seek(self.f.tell(), 0)
         while True:
-            data = self.f.read(10000)
+            data = self.f.read(self.READ_SIZE)
             if not data:
                 return
             self.command.addLogfile(self.name, data)
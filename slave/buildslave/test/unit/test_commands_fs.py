@@ -18,7 +18,7 @@ import os
 from twisted.trial import unittest
 
 from buildslave.test.util.command import CommandTestMixin
-from buildslave.commands import fs
+from buildslave.commands import fs, fsengine
 
 class TestRemoveDirectory(CommandTestMixin, unittest.TestCase):
 
@@ -42,6 +42,28 @@ class TestRemoveDirectory(CommandTestMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_background(self):
+        self.make_command(fs.RemoveDirectory, dict(
+            dir='workdir',
+            background=True,
+        ), True)
+        d = self.run_command()
+
+        def check(_):
+            self.assertFalse(os.path.exists(os.path.abspath(os.path.join(self.basedir,'workdir'))))
+            self.assertIn({'rc': 0},
+                    self.get_updates(),
+                    self.builder.show())
+        d.addCallback(check)
+        def waitForBackground(_):
+            # don't let tearDown race with the background removal
+            if fsengine.engine.background:
+                d = fsengine.engine._run(lambda : None)
+                d.addCallback(waitForBackground)
+                return d
+        d.addCallback(waitForBackground)
+        return d
+
 class TestCopyDirectory(CommandTestMixin, unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,226 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+import stat
+
+from twisted.trial import unittest
+from twisted.python import runtime
+
+from buildslave.test.util.misc import BasedirMixin
+from buildslave.commands import fsengine
+
+class TestFilesystemEngine(BasedirMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.setUpBasedir()
+        os.makedirs(self.basedir)
+        self.engine = fsengine.FilesystemEngine()
+        # use small batches, so that the parallel paths are exercised
+        self.engine.BATCH_SIZE = 3
+
+    def tearDown(self):
+        self.engine.stop()
+        self.tearDownBasedir()
+
+    def makeTree(self, name, nfiles=10):
+        top = os.path.join(self.basedir, name)
+        for sub in ('a', os.path.join('a', 'b'), 'c'):
+            os.makedirs(os.path.join(top, sub))
+            for i in range(nfiles):
+                open(os.path.join(top, sub, 'f%d' % i), 'w').write('%d' % i)
+        if runtime.platformType == 'posix':
+            os.symlink('a', os.path.join(top, 'link'))
+        return top
+
+    def test_makeDirectory(self):
+        path = os.path.join(self.basedir, 'x', 'y')
+        d = self.engine.makeDirectory(path)
+        d.addCallback(lambda _ : self.assertTrue(os.path.isdir(path)))
+        # doing it twice is not an error
+        d.addCallback(lambda _ : self.engine.makeDirectory(path))
+        return d
+
+    def test_statFile(self):
+        path = os.path.join(self.basedir, 'f')
+        open(path, 'w').write('abc')
+        d = self.engine.statFile(path)
+        def check(st):
+            self.assertEqual(st[stat.ST_SIZE], 3)
+        d.addCallback(check)
+        return d
+
+    def test_statFile_missing(self):
+        d = self.engine.statFile(os.path.join(self.basedir, 'nosuch'))
+        return self.assertFailure(d, OSError)
+
+    def test_removeDirectory(self):
+        top = self.makeTree('tree')
+        progress = []
+        self.engine.PROGRESS_INTERVAL = 0
+        d = self.engine.removeDirectory(top, progress=progress.append)
+        def check(count):
+            self.assertFalse(os.path.lexists(top))
+            self.assertTrue(os.path.isdir(self.basedir))
+            # 30 files, plus the symlink
+            self.assertEqual(count, 30 + (runtime.platformType == 'posix'))
+            self.assertTrue(progress)
+        d.addCallback(check)
+        return d
+
+    def test_removeDirectory_missing(self):
+        return self.engine.removeDirectory(os.path.join(self.basedir, 'nosuch'))
+
+    def test_removeDirectory_unwritable(self):
+        if runtime.platformType != 'posix':
+            raise unittest.SkipTest("chmod semantics differ")
+        top = self.makeTree('tree')
+        os.chmod(os.path.join(top, 'a', 'b'), 0500)
+        os.chmod(os.path.join(top, 'c'), 0)
+        d = self.engine.removeDirectory(top)
+        d.addCallback(lambda _ : self.assertFalse(os.path.lexists(top)))
+        return d
+
+    def test_removeDirectory_symlink_not_followed(self):
+        if runtime.platformType != 'posix':
+            raise unittest.SkipTest("no symlinks")
+        top = self.makeTree('tree')
+        os.symlink(os.path.abspath(os.path.join(top, 'c')),
+                   os.path.join(self.basedir, 'link'))
+        d = self.engine.removeDirectory(os.path.join(self.basedir, 'link'))
+        def check(_):
+            self.assertFalse(os.path.lexists(
+                                os.path.join(self.basedir, 'link')))
+            self.assertEqual(len(os.listdir(os.path.join(top, 'c'))), 10)
+        d.addCallback(check)
+        return d
+
+    def test_removeDirectoryInBackground(self):
+        top = self.makeTree('tree')
+        # a leftover from an earlier, interrupted background removal
+        self.makeTree('tree' + self.engine.DELETING_SUFFIX + '.1.1')
+        d = self.engine.removeDirectoryInBackground(top)
+        def check(_):
+            # the tree is gone from its original location immediately
+            self.assertFalse(os.path.lexists(top))
+        d.addCallback(check)
+        def checkGone(_):
+            # and the trees are eventually removed in the background
+            if self.engine.background:
+                return self.engine._run(lambda : None).addCallback(checkGone)
+            self.assertEqual(os.listdir(self.basedir), [])
+        d.addCallback(checkGone)
+        return d
+
+    def test_copyDirectory(self):
+        top = self.makeTree('tree')
+        os.chmod(os.path.join(top, 'c', 'f1'), 0600)
+        os.utime(os.path.join(top, 'a'), (1000000000, 1000000000))
+        copy = os.path.join(self.basedir, 'copy')
+        d = self.engine.copyDirectory(top, copy)
+        def check(count):
+            self.assertEqual(count, 30)
+            self.assertEqual(open(os.path.join(copy, 'a', 'b', 'f3')).read(),
+                             '3')
+            self.assertEqual(
+                stat.S_IMODE(os.stat(os.path.join(copy, 'c', 'f1')).st_mode),
+                0600)
+            self.assertEqual(int(os.stat(os.path.join(copy, 'a')).st_mtime),
+                             1000000000)
+            if runtime.platformType == 'posix':
+                self.assertEqual(os.readlink(os.path.join(copy, 'link')), 'a')
+        d.addCallback(check)
+        return d
+
+    def test_copyDirectory_exists(self):
+        top = self.makeTree('tree')
+        d = self.engine.copyDirectory(top, top)
+        return self.assertFailure(d, OSError)
+
+    def test_syncDirectory_new(self):
+        top = self.makeTree('tree')
+        copy = os.path.join(self.basedir, 'copy')
+        d = self.engine.syncDirectory(top, copy)
+        def check(count):
+            self.assertEqual(count, 30)
+            self.assertEqual(open(os.path.join(copy, 'a', 'b', 'f3')).read(),
+                             '3')
+            if runtime.platformType == 'posix':
+                self.assertEqual(os.readlink(os.path.join(copy, 'link')), 'a')
+        d.addCallback(check)
+        return d
+
+    def test_syncDirectory_incremental(self):
+        top = self.makeTree('tree')
+        copy = os.path.join(self.basedir, 'copy')
+        d = self.engine.syncDirectory(top, copy)
+        def modify(_):
+            # change a file in the pristine tree, add and remove some
+            open(os.path.join(top, 'a', 'f1'), 'w').write('changed')
+            open(os.path.join(top, 'c', 'new'), 'w').write('new')
+            os.remove(os.path.join(top, 'c', 'f2'))
+            # a directory replaced by a file
+            for f in os.listdir(os.path.join(top, 'a', 'b')):
+                os.remove(os.path.join(top, 'a', 'b', f))
+            os.rmdir(os.path.join(top, 'a', 'b'))
+            open(os.path.join(top, 'a', 'b'), 'w').write('b')
+            # and build products in the copy
+            open(os.path.join(copy, 'c', 'f3.o'), 'w').write('obj')
+            os.makedirs(os.path.join(copy, 'build', 'x'))
+            open(os.path.join(copy, 'build', 'x', 'y'), 'w').write('y')
+            return self.engine.syncDirectory(top, copy)
+        d.addCallback(modify)
+        def check(count):
+            # f1, new, and b
+            self.assertEqual(count, 3)
+            self.assertEqual(open(os.path.join(copy, 'a', 'f1')).read(),
+                             'changed')
+            self.assertEqual(open(os.path.join(copy, 'a', 'b')).read(), 'b')
+            self.assertEqual(open(os.path.join(copy, 'c', 'new')).read(),
+                             'new')
+            self.assertEqual(sorted(os.listdir(os.path.join(copy, 'c'))),
+                             sorted(os.listdir(os.path.join(top, 'c'))))
+            self.assertFalse(os.path.exists(os.path.join(copy, 'build')))
+        d.addCallback(check)
+        return d
+
+    def test_syncDirectory_unchanged(self):
+        top = self.makeTree('tree')
+        copy = os.path.join(self.basedir, 'copy')
+        d = self.engine.syncDirectory(top, copy)
+        d.addCallback(lambda _ : self.engine.syncDirectory(top, copy))
+        d.addCallback(lambda count : self.assertEqual(count, 0))
+        return d
+
+    def test_syncDirectory_hardlink(self):
+        if runtime.platformType != 'posix':
+            raise unittest.SkipTest("no hard links")
+        top = self.makeTree('tree')
+        copy = os.path.join(self.basedir, 'copy')
+        d = self.engine.syncDirectory(top, copy, method='hardlink')
+        def check(count):
+            self.assertEqual(count, 30)
+            self.assertEqual(os.stat(os.path.join(top, 'c', 'f1')).st_ino,
+                             os.stat(os.path.join(copy, 'c', 'f1')).st_ino)
+        d.addCallback(check)
+        # switching back to copies replaces the links
+        d.addCallback(lambda _ :
+                self.engine.syncDirectory(top, copy, method='copy'))
+        def checkCopy(count):
+            self.assertEqual(count, 30)
+            self.assertNotEqual(os.stat(os.path.join(top, 'c', 'f1')).st_ino,
+                                os.stat(os.path.join(copy, 'c', 'f1')).st_ino)
+        d.addCallback(checkCopy)
+        return d
@@ -142,6 +142,51 @@ class TestGit(SourceCommandTestMixin, unittest.TestCase):
         d.addCallback(self.check_sourcedata, "git://github.com/djmitche/buildbot.git master\n")
         return d
 
+    def test_run_mode_sync_update_sourcedir(self):
+        """test a sync, which updates the source directory and then
+        synchronizes the workdir with it, without clobbering"""
+        self.patch_getCommand('git', 'path/to/git')
+        self.clean_environ()
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='sync',
+            revision=None,
+            repourl='git://github.com/djmitche/buildbot.git',
+          ),
+            initial_sourcedata = "git://github.com/djmitche/buildbot.git master\n",
+        )
+        self.patch_sourcedirIsUpdateable(True)
+
+        expects = [
+            Expect([ 'path/to/git', 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git', '+master' ],
+                self.basedir_source,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + { 'stderr' : '' }
+                + 0,
+            Expect(['path/to/git', 'reset', '--hard', 'FETCH_HEAD'],
+                self.basedir_source,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect(['path/to/git', 'branch', '-M', 'master'],
+                self.basedir_source,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'rev-parse', 'HEAD' ],
+                self.basedir_source,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : '4026d33b0532b11f36b0875f63699adfa8ee8662\n' }
+                + 0,
+            Expect([ 'sync', 'source', 'workdir'],
+                self.basedir)
+                + 0,
+        ]
+        self.patch_runprocess(*expects)
+
+        d = self.run_command()
+        d.addCallback(self.check_sourcedata, "git://github.com/djmitche/buildbot.git master\n")
+        return d
+
     def test_run_mode_copy_nonexistant_ref(self):
         self.patch_getCommand('git', 'path/to/git')
         self.clean_environ()
@@ -439,6 +484,151 @@ class TestGit(SourceCommandTestMixin, unittest.TestCase):
         d.addCallback(self.check_sourcedata, "git://github.com/djmitche/buildbot.git master\n")
         return d
 
+    def patch_sharedCache(self):
+        self.patch(git, '_cacheLocks', {})
+        self.patch(git, '_cacheFetchTimes', {})
+        cachedir = os.path.join(os.path.dirname(self.basedir), 'git-cache',
+                git.sha1('git://github.com/djmitche/buildbot.git').hexdigest())
+        return os.path.dirname(cachedir), cachedir
+
+    def test_run_with_shared_cache(self):
+        self.patch_getCommand('git', 'path/to/git')
+        self.clean_environ()
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='update',
+            revision=None,
+            shared_cache=True,
+            shallow=True, # ignored with a shared cache
+            repourl='git://github.com/djmitche/buildbot.git',
+          ),
+            initial_sourcedata = "git://github.com/djmitche/buildbot.git master\n",
+        )
+        self.patch_sourcedirIsUpdateable(False)
+        cacheparent, cachedir = self.patch_sharedCache()
+
+        expects = [
+            Expect([ 'clobber', 'workdir' ],
+                self.basedir)
+                + 0,
+            Expect([ 'path/to/git', 'init'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'setFileContents',
+                     os.path.join(self.basedir_workdir,
+                                  *'.git/objects/info/alternates'.split('/')),
+                     os.path.join(cachedir, 'objects'), ],
+                self.basedir)
+                + 0,
+            Expect([ 'path/to/git', 'init', '--bare', cachedir ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', '--git-dir', cachedir, 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git',
+                     '+master:refs/buildbot/master' ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + { 'stderr' : '' }
+                + 0,
+            Expect([ 'path/to/git', 'fetch', '-t',
+                     cachedir, '+refs/buildbot/master' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + { 'stderr' : '' }
+                + 0,
+            Expect(['path/to/git', 'reset', '--hard', 'FETCH_HEAD'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect(['path/to/git', 'branch', '-M', 'master'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'rev-parse', 'HEAD' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : '4026d33b0532b11f36b0875f63699adfa8ee8662\n' }
+                + 0,
+        ]
+        self.patch_runprocess(*expects)
+
+        d = self.run_command()
+        d.addCallback(self.check_sourcedata, "git://github.com/djmitche/buildbot.git master\n")
+        return d
+
+    def test_run_with_shared_cache_failure(self):
+        self.patch_getCommand('git', 'path/to/git')
+        self.clean_environ()
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='update',
+            revision=None,
+            shared_cache=True,
+            repourl='git://github.com/djmitche/buildbot.git',
+          ),
+            initial_sourcedata = "git://github.com/djmitche/buildbot.git master\n",
+        )
+        self.patch_sourcedirIsUpdateable(True)
+        cacheparent, cachedir = self.patch_sharedCache()
+        os.makedirs(cachedir)
+
+        expects = [
+            Expect([ 'path/to/git', '--git-dir', cachedir, 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git',
+                     '+master:refs/buildbot/master' ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + { 'stderr' : 'fatal: error\n' }
+                + 128,
+            # the failure is ignored, and the fetch goes to the repository
+            Expect([ 'path/to/git', 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git', '+master' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + { 'stderr' : '' }
+                + 0,
+            Expect(['path/to/git', 'reset', '--hard', 'FETCH_HEAD'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect(['path/to/git', 'branch', '-M', 'master'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'rev-parse', 'HEAD' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : '4026d33b0532b11f36b0875f63699adfa8ee8662\n' }
+                + 0,
+        ]
+        self.patch_runprocess(*expects)
+
+        d = self.run_command()
+        def cleanup(res):
+            os.rmdir(cachedir)
+            return res
+        d.addBoth(cleanup)
+        return d
+
+    def test_shared_cache_fetch_coalesced(self):
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='update',
+            revision=None,
+            shared_cache=True,
+            repourl='git://github.com/djmitche/buildbot.git',
+          ))
+        cacheparent, cachedir = self.patch_sharedCache()
+        # another builder started a fetch after this one asked for it
+        refspec = '+master:refs/buildbot/master'
+        git._cacheFetchTimes[(cachedir, refspec)] = 10
+        d = self.cmd._doUpdateSharedCache(cachedir,
+                'git://github.com/djmitche/buildbot.git', refspec, 5)
+        d.addCallback(self.assertTrue)
+        return d
+
     def test_run_with_shallow_and_rev(self):
         self.patch_getCommand('git', 'path/to/git')
         self.clean_environ()
@@ -646,6 +836,170 @@ class TestGit(SourceCommandTestMixin, unittest.TestCase):
         d.addCallback(self.check_sourcedata, "git://github.com/djmitche/buildbot.git master\n")
         return d
 
+    def test_run_with_parallel_submodules(self):
+        self.patch_getCommand('git', 'path/to/git')
+        self.clean_environ()
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='update',
+            revision=None,
+            submodules=True,
+            submodule_jobs=4,
+            shared_cache=True,
+            repourl='git://github.com/djmitche/buildbot.git',
+          ),
+            initial_sourcedata = "git://github.com/djmitche/buildbot.git master\n",
+        )
+        self.patch_sourcedirIsUpdateable(True)
+        cacheparent, cachedir = self.patch_sharedCache()
+        os.makedirs(cachedir)
+        subcachedir = os.path.join(cacheparent,
+                git.sha1('git://example.com/lib.git').hexdigest())
+
+        expects = [
+            Expect([ 'path/to/git', '--git-dir', cachedir, 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git',
+                     '+master:refs/buildbot/master' ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + 0,
+            Expect([ 'path/to/git', 'fetch', '-t',
+                     cachedir, '+refs/buildbot/master' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + 0,
+            Expect(['path/to/git', 'reset', '--hard', 'FETCH_HEAD'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect(['path/to/git', 'branch', '-M', 'master'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'submodule', 'init' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'config', '-f', '.gitmodules',
+                     '--get-regexp', r'^submodule\..*\.path$' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : 'submodule.lib.path lib\n'
+                               'submodule.doc.v1.path doc\n' }
+                + 0,
+            Expect([ 'path/to/git', 'config',
+                     '--get-regexp', r'^submodule\..*\.url$' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : 'submodule.lib.url git://example.com/lib.git\n' }
+                + 0,
+            # lib has a url, so it goes through the shared cache
+            Expect([ 'path/to/git', 'init', '--bare', subcachedir ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', '--git-dir', subcachedir, 'fetch', '-t',
+                     'git://example.com/lib.git',
+                     '+refs/heads/*:refs/buildbot/heads/*' ],
+                cacheparent,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + 0,
+            Expect([ 'path/to/git', 'submodule', 'update',
+                     '--reference', subcachedir, '--', 'lib' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            # doc does not
+            Expect([ 'path/to/git', 'submodule', 'update', '--', 'doc' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'submodule', 'foreach',
+                                'git', 'clean', '-f', '-d', '-x'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'rev-parse', 'HEAD' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : '4026d33b0532b11f36b0875f63699adfa8ee8662\n' }
+                + 0,
+        ]
+        self.patch_runprocess(*expects)
+
+        d = self.run_command()
+        def check(_):
+            headers = [ u['header'] for u in self.get_updates()
+                        if 'header' in u ]
+            self.assertIn('updating 2 submodules, 4 at a time\n', headers)
+            self.assertIn('updating submodule lib\n', headers)
+            self.assertIn('updating submodule doc\n', headers)
+        d.addCallback(check)
+        def cleanup(res):
+            os.rmdir(cachedir)
+            return res
+        d.addBoth(cleanup)
+        return d
+
+    def test_run_with_parallel_submodules_failure(self):
+        self.patch_getCommand('git', 'path/to/git')
+        self.clean_environ()
+        self.make_command(git.Git, dict(
+            workdir='workdir',
+            mode='update',
+            revision=None,
+            submodules=True,
+            submodule_jobs=2,
+            repourl='git://github.com/djmitche/buildbot.git',
+          ),
+            initial_sourcedata = "git://github.com/djmitche/buildbot.git master\n",
+        )
+        self.patch_sourcedirIsUpdateable(False)
+
+        expects = [
+            Expect([ 'clobber', 'workdir' ],
+                self.basedir)
+                + 0,
+            Expect([ 'path/to/git', 'init'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'fetch', '-t',
+                     'git://github.com/djmitche/buildbot.git', '+master' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStderr=True)
+                + 0,
+            Expect(['path/to/git', 'reset', '--hard', 'FETCH_HEAD'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect(['path/to/git', 'branch', '-M', 'master'],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'submodule', 'init' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 0,
+            Expect([ 'path/to/git', 'config', '-f', '.gitmodules',
+                     '--get-regexp', r'^submodule\..*\.path$' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False, keepStdout=True)
+                + { 'stdout' : 'submodule.lib.path lib\n' }
+                + 0,
+            Expect([ 'path/to/git', 'submodule', 'update', '--', 'lib' ],
+                self.basedir_workdir,
+                sendRC=False, timeout=120, usePTY=False)
+                + 1,
+        ]
+        self.patch_runprocess(*expects)
+
+        d = self.run_command()
+        def check(_):
+            self.assertIn({'rc': 1}, self.get_updates())
+        d.addCallback(check)
+        return d
+
     def test_sourcedataMatches_no_file(self):
         self.make_command(git.Git, dict(
             workdir='workdir',
@@ -538,3 +538,60 @@ class TestLogFileWatcher(BasedirMixin, unittest.TestCase):
         st = lf.statFile()
         self.assertEqual(st and st[2], 2, "statfile.log exists and size is correct")
         os.remove('statfile.log')
+
+    def test_poll_reads_new_data(self):
+        rp = self.makeRP()
+        logs = []
+        rp.addLogfile = lambda name, data : logs.append((name, data))
+        lf = runprocess.LogFileWatcher(rp, 'test', 'poll.log', False)
+        open('poll.log', 'w').write('hello\n')
+        lf.poll()
+        self.assertEqual(logs, [('test', 'hello\n')])
+        lf.f.close()
+        os.remove('poll.log')
+
+    def test_start_polls_without_inotify(self):
+        rp = self.makeRP()
+        lf = runprocess.LogFileWatcher(rp, 'test', 'poll.log', False)
+        lf.USE_INOTIFY = False
+        lf.start()
+        self.assertEqual(lf.notifier, None)
+        self.assertTrue(lf.poller.running)
+        lf.stop()
+
+    def test_start_missing_directory_polls(self):
+        rp = self.makeRP()
+        lf = runprocess.LogFileWatcher(rp, 'test',
+                os.path.join('nosuchdir', 'poll.log'), False)
+        lf.start()
+        self.assertEqual(lf.notifier, None)
+        self.assertTrue(lf.poller.running)
+        lf.stop()
+
+    def test_inotify_reads_new_data(self):
+        if runprocess.inotify is None or not runtime.platform.isLinux():
+            raise unittest.SkipTest("inotify not available")
+        rp = self.makeRP()
+        logs = []
+        d = defer.Deferred()
+        def addLogfile(name, data):
+            logs.append((name, data))
+            if len(logs) == 1:
+                reactor.callLater(0, d.callback, None)
+        rp.addLogfile = addLogfile
+        lf = runprocess.LogFileWatcher(rp, 'test',
+                os.path.abspath('notify.log'), False)
+        lf.start()
+        if lf.notifier is None:
+            lf.stop()
+            raise unittest.SkipTest("could not create inotify watch")
+        self.assertEqual(lf.poller, None)
+        open('notify.log', 'w').write('hello\n')
+        def check(_):
+            lf.stop()
+            self.assertEqual(logs, [('test', 'hello\n')])
+            os.remove('notify.log')
+        d.addCallback(check)
+        # let the notifier's file descriptor be closed
+        d.addCallback(lambda _ : task.deferLater(reactor, 0, lambda : None))
+        return d
@@ -30,6 +30,7 @@ class SourceCommandTestMixin(command.CommandTestMixin):
         * readSourcedata - reads from self.sourcedata
         * doClobber - invokes RunProcess(['clobber', DIRECTORY])
         * doCopy - invokes RunProcess(['copy', cmd.srcdir, cmd.workdir])
+        * doSync - invokes RunProcess(['sync', cmd.srcdir, cmd.workdir])
         """
 
         cmd = command.CommandTestMixin.make_command(self, cmdclass, args, makedirs)
@@ -66,6 +67,13 @@ class SourceCommandTestMixin(command.CommandTestMixin):
             return r.start()
         cmd.doCopy = doCopy
 
+        def doSync(_):
+            r = runprocess.RunProcess(self.builder,
+                [ 'sync', cmd.srcdir, cmd.workdir ],
+                self.builder.basedir)
+            return r.start()
+        cmd.doSync = doSync
+
         def setFileContents(filename, contents):
             r = runprocess.RunProcess(self.builder,
                 [ 'setFileContents', filename, contents ],